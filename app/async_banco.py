@@ -0,0 +1,110 @@
+"""
+Fachada asyncio de Banco.
+
+AsyncBanco expone la API de Banco como corrutinas. Los aspectos de
+auditoría y notificación son las versiones async de los decoradores: el
+registro se encola sin esperar y el email se arma en el event loop y se
+encola en un hilo de E/S dedicado, así que miles de operaciones pueden
+estar en curso a la vez sin un hilo por solicitud.
+
+Las cuentas se bloquean con un asyncio.Lock por cuenta, en orden por
+número (mismo criterio que bloquear_cuentas), de modo que una
+transferencia es aislada aunque sus aspectos esperen E/S. Está pensado
+para usarse desde un solo event loop.
+
+    banco = AsyncBanco()
+    await banco.crear_cliente("Ana", "1")
+    await banco.crear_cuenta("1", "0001")
+    await banco.depositar("0001", 100)
+    await asyncio.gather(*(banco.transferir("0001", "0002", 1) for _ in range(50)))
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from .banco import Banco
+from .concurrency import bloquear_async
+from .decorators import log_data_changes, notify_by_email
+from .idempotencia import idempotente
+
+
+class AsyncBanco(Banco):
+
+    def __init__(self, ledger=None, libro=None):
+        super().__init__(ledger=ledger, libro=libro)
+        self._alocks: Dict[Any, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def _bloquear(self, *numeros):
+        """Tomar los locks asyncio de las cuentas en orden determinista"""
+        locks = [self._alocks.setdefault(numero, asyncio.Lock())
+                 for numero in sorted(set(numeros), key=str)]
+        tomados = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                tomados.append(lock)
+            yield
+        finally:
+            for lock in reversed(tomados):
+                lock.release()
+
+    def _cuenta(self, numero_cuenta):
+        cuenta = self.cuentas.get(numero_cuenta)
+        if cuenta is None:
+            raise ValueError(f"Cuenta {numero_cuenta} no encontrada")
+        return cuenta
+
+    @log_data_changes("crear_cliente")
+    async def crear_cliente(self, nombre, identificacion):
+        async with bloquear_async(self._lock):
+            return self._crear_cliente(nombre, identificacion)
+
+    @log_data_changes("crear_cuenta")
+    async def crear_cuenta(self, identificacion, numero_cuenta):
+        async with bloquear_async(self._lock):
+            return self._crear_cuenta(identificacion, numero_cuenta)
+
+    @idempotente
+    async def depositar(self, numero_cuenta, monto):
+        cuenta = self._cuenta(numero_cuenta)
+        async with self._bloquear(numero_cuenta):
+            await cuenta.depositar_async(monto)
+        return cuenta.saldo
+
+    @idempotente
+    async def retirar(self, numero_cuenta, monto):
+        cuenta = self._cuenta(numero_cuenta)
+        async with self._bloquear(numero_cuenta):
+            await cuenta.retirar_async(monto)
+        return cuenta.saldo
+
+    async def consultar_saldo(self, numero_cuenta):
+        return self._cuenta(numero_cuenta).saldo
+
+    @idempotente
+    @log_data_changes("transferencia")
+    @notify_by_email("transferencia", "transferencia")
+    async def transferir(self, origen, destino, monto):
+        c_origen = self.cuentas[origen]
+        c_destino = self.cuentas[destino]
+        async with self._bloquear(origen, destino):
+            consumo = self._consumir_limite(origen, monto)
+            try:
+                # El grupo del libro es por tarea: ambos movimientos llegan
+                # juntos a los suscriptores aunque haya awaits entre ellos
+                with self.ledger.agrupar():
+                    await c_origen.retirar_async(monto, contraparte=destino)
+                    await c_destino.depositar_async(monto, contraparte=origen)
+            except Exception:
+                self._devolver_limite(consumo)
+                raise
+
+    async def transferir_lote(self, transferencias, atomico=True):
+        """Banco.transferir_lote en un hilo, con las cuentas del lote bloqueadas"""
+        items = [self._normalizar_transferencia(t) for t in transferencias]
+        numeros = {numero for item in items for numero in item[:2]}
+        async with self._bloquear(*numeros):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, Banco.transferir_lote, self, items, atomico)
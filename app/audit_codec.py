@@ -0,0 +1,128 @@
+"""
+Codificación de las columnas de payload de audit_log.
+
+El payload de un registro son cinco valores: estado_antes, estado_despues,
+campos_modificados, args y kwargs. Un códec decide cómo se guardan:
+
+- JsonCodec (por defecto): formato histórico, cinco columnas de texto JSON.
+- BinaryCodec: un solo BLOB en la columna `payload`, JSON compacto de los
+  cinco valores comprimido con zlib a partir de cierto tamaño.
+  campos_modificados no se guarda cuando es el diff de los estados (se
+  recalcula al leer), así que los valores no quedan duplicados. Con
+  `diff_only=True` se guardan solo los campos modificados y los estados
+  se reconstruyen con ellos al leer (modo con pérdida).
+
+El primer byte del BLOB indica versión y opciones, de modo que una base
+puede mezclar filas de distintos códecs y configuraciones. Los BLOBs
+usan solo JSON y zlib, legibles con cualquier versión de Python.
+"""
+
+import json
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+Payload = Tuple[Any, Any, Any, Any, Any]
+# estado_antes, estado_despues, campos_modificados, args, kwargs, payload
+Columns = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[str],
+                Optional[bytes]]
+
+# Primer byte del BLOB: versión en el nibble alto, opciones en el bajo
+_VERSION = 0x20
+_ZLIB = 0x01
+_DIFF_ONLY = 0x02
+_CAMPOS_DERIVADOS = 0x04
+
+_COMPACTO = json.JSONEncoder(separators=(',', ':'), default=str, ensure_ascii=False)
+
+
+def _dumps(valor: Any) -> bytes:
+    return _COMPACTO.encode(valor).encode('utf-8')
+
+
+def _json(valor: Any) -> Optional[str]:
+    return json.dumps(valor, default=str)
+
+
+class JsonCodec:
+    """Cinco columnas de texto JSON (formato histórico)"""
+
+    name = "json"
+
+    def encode(self, estado_antes, estado_despues, campos_modificados, args, kwargs,
+               derivar: Callable[[Any, Any], Dict[str, Any]]) -> Columns:
+        if campos_modificados is None:
+            campos_modificados = derivar(estado_antes, estado_despues)
+        return (
+            _json(estado_antes),
+            _json(estado_despues),
+            _json(campos_modificados),
+            _json(list(args)) if args else None,
+            _json(kwargs) if kwargs else None,
+            None,
+        )
+
+
+class BinaryCodec:
+    """Un BLOB JSON compacto (+zlib) por fila; ver el docstring del módulo"""
+
+    name = "binary"
+
+    def __init__(self, diff_only: bool = False, compress_min: int = 512, level: int = 1):
+        self.diff_only = diff_only
+        self.compress_min = compress_min
+        self.level = level
+
+    def encode(self, estado_antes, estado_despues, campos_modificados, args, kwargs,
+               derivar: Callable[[Any, Any], Dict[str, Any]]) -> Columns:
+        flags = _VERSION
+        if self.diff_only:
+            if campos_modificados is None:
+                campos_modificados = derivar(estado_antes, estado_despues)
+            payload = (None, None, campos_modificados, args or None, kwargs or None)
+            flags |= _DIFF_ONLY
+        elif campos_modificados is None or campos_modificados == derivar(estado_antes, estado_despues):
+            # Redundante con los estados: se recalcula al leer
+            payload = (estado_antes, estado_despues, None, args or None, kwargs or None)
+            flags |= _CAMPOS_DERIVADOS
+        else:
+            payload = (estado_antes, estado_despues, campos_modificados, args or None, kwargs or None)
+
+        data = _dumps(payload)
+        if self.compress_min and len(data) >= self.compress_min:
+            comprimido = zlib.compress(data, self.level)
+            if len(comprimido) < len(data):
+                data = comprimido
+                flags |= _ZLIB
+        return None, None, None, None, None, bytes((flags,)) + data
+
+
+def decode_payload(blob: bytes, derivar: Callable[[Any, Any], Dict[str, Any]]) -> Payload:
+    """Decodificar un BLOB de BinaryCodec en los cinco valores del payload"""
+    flags = blob[0]
+    version = flags & 0xF0
+    if version != _VERSION:
+        raise ValueError(f"Versión de payload de auditoría desconocida: {flags >> 4}")
+    data = blob[1:]
+    if flags & _ZLIB:
+        data = zlib.decompress(data)
+    estado_antes, estado_despues, campos, args, kwargs = json.loads(data)
+
+    if flags & _DIFF_ONLY:
+        # Solo se conocen los campos que cambiaron
+        estado_antes = {k: v['antes'] for k, v in campos.items() if isinstance(v, dict) and 'antes' in v}
+        estado_despues = {k: v['despues'] for k, v in campos.items()
+                          if isinstance(v, dict) and 'despues' in v}
+    elif flags & _CAMPOS_DERIVADOS:
+        campos = derivar(estado_antes, estado_despues)
+
+    return (estado_antes, estado_despues, campos,
+            list(args) if args is not None else None, kwargs)
+
+
+def decode_columns(columns: Columns, derivar: Callable[[Any, Any], Dict[str, Any]]) -> Payload:
+    """Decodificar las columnas de payload de una fila, sea cual sea su códec"""
+    estado_antes, estado_despues, campos, args, kwargs, payload = columns
+    if payload is not None:
+        return decode_payload(payload, derivar)
+    return tuple(None if valor is None else json.loads(valor)
+                 for valor in (estado_antes, estado_despues, campos, args, kwargs))
@@ -0,0 +1,234 @@
+"""
+Log de auditoría en un archivo JSON lines con índice lateral.
+
+Cada registro es una línea JSON. Las líneas se acumulan en memoria y se
+agregan al archivo de a `flush_every` (o antes de leer), con una sola
+escritura. El índice (`<ruta>.idx`) guarda por registro 16 bytes:
+offset de la línea, crc32 de entity_id y crc32 de operation_type.
+
+- tail(): recorre el archivo hacia atrás con mmap desde el final, sin
+  leer el resto, así que cuesta lo mismo con un archivo de KB o de GB
+- query(): usa listas de posiciones por entidad y por operación (se arman
+  del índice la primera vez que se filtra) y solo decodifica las líneas
+  candidatas
+
+Si el índice quedó atrás del archivo (p. ej. tras una caída entre ambas
+escrituras) se completa al abrir. Pensado para un solo proceso escritor.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional
+
+_ENTRADA = struct.Struct('<QII')
+
+
+def _hash(valor: Any) -> int:
+    return zlib.crc32(str(valor).encode('utf-8'))
+
+
+def _parse(linea: bytes) -> Optional[Dict[str, Any]]:
+    # Las líneas que no son JSON (formato de texto anterior) se ignoran
+    if not linea.startswith(b'{'):
+        return None
+    try:
+        return json.loads(linea)
+    except ValueError:
+        return None
+
+
+class JsonLinesLog:
+    """Archivo JSON lines de solo agregado con índice de offsets (ver módulo)"""
+
+    def __init__(self, ruta: str, flush_every: int = 64):
+        self.ruta = ruta
+        self.ruta_indice = ruta + ".idx"
+        self.flush_every = flush_every
+
+        self._lock = threading.Lock()
+        self._pendientes: List[bytes] = []
+        self._bytes_pendientes = 0
+        self._entradas: List[bytes] = []
+        # Posiciones en el índice por hash de entidad / operación (carga diferida)
+        self._por_entidad: Optional[Dict[int, array]] = None
+        self._por_operacion: Optional[Dict[int, array]] = None
+
+        self._log = open(ruta, 'ab', buffering=0)
+        self._indice = open(self.ruta_indice, 'ab', buffering=0)
+        self._tamano = os.path.getsize(ruta)
+        if self._tamano and not self._termina_en_linea():
+            # Cerrar una línea cortada por una caída para no pegarle la siguiente
+            self._log.write(b'\n')
+            self._tamano += 1
+        self._total = self._recuperar_indice()
+
+    def append(self, record: Dict[str, Any]):
+        """Agregar un registro (queda en el buffer hasta el próximo flush)"""
+        linea = json.dumps(record, default=str, ensure_ascii=False).encode('utf-8') + b'\n'
+        hash_entidad = _hash(record.get('entity_id'))
+        hash_operacion = _hash(record.get('operation_type'))
+
+        with self._lock:
+            posicion = self._total
+            offset = self._tamano + self._bytes_pendientes
+            self._pendientes.append(linea)
+            self._bytes_pendientes += len(linea)
+            self._entradas.append(_ENTRADA.pack(offset, hash_entidad, hash_operacion))
+            self._total += 1
+            if self._por_entidad is not None:
+                self._por_entidad.setdefault(hash_entidad, array('Q')).append(posicion)
+                self._por_operacion.setdefault(hash_operacion, array('Q')).append(posicion)
+            if len(self._pendientes) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._log.close()
+            self._indice.close()
+
+    def tail(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Últimos `limit` registros, del más antiguo al más reciente"""
+        with self._lock:
+            self._flush()
+            tamano = self._tamano
+        if tamano == 0 or limit <= 0:
+            return []
+
+        records = []
+        with open(self.ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            fin = tamano
+            while fin > 0 and len(records) < limit:
+                inicio = mm.rfind(b'\n', 0, fin - 1) + 1
+                record = _parse(mm[inicio:fin])
+                if record is not None:
+                    records.append(record)
+                fin = inicio
+        records.reverse()
+        return records
+
+    def query(self, entity_id: Any = None, operation_type: Any = None,
+              limit: int = 10) -> List[Dict[str, Any]]:
+        """Últimos `limit` registros que cumplen los filtros, del más antiguo al más reciente"""
+        if entity_id is None and operation_type is None:
+            return self.tail(limit)
+
+        with self._lock:
+            self._flush()
+            if self._por_entidad is None:
+                self._cargar_claves()
+            listas = []
+            if entity_id is not None:
+                listas.append(self._por_entidad.get(_hash(entity_id), array('Q')))
+            if operation_type is not None:
+                listas.append(self._por_operacion.get(_hash(operation_type), array('Q')))
+            # Se recorre la lista más corta; el otro filtro se verifica en la línea
+            candidatas = min(listas, key=len)[:]
+            tamano = self._tamano
+        if not candidatas or limit <= 0:
+            return []
+
+        records = []
+        with open(self.ruta, 'rb') as f, mmap.mmap(f.fileno(), tamano, access=mmap.ACCESS_READ) as mm, \
+                open(self.ruta_indice, 'rb') as fi, \
+                mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as indice:
+            for posicion in reversed(candidatas):
+                offset = _ENTRADA.unpack_from(indice, posicion * _ENTRADA.size)[0]
+                fin = mm.find(b'\n', offset)
+                record = _parse(mm[offset:fin if fin >= 0 else tamano])
+                if record is None:
+                    continue
+                # Descarta colisiones de hash
+                if entity_id is not None and str(record.get('entity_id')) != str(entity_id):
+                    continue
+                if operation_type is not None and record.get('operation_type') != operation_type:
+                    continue
+                records.append(record)
+                if len(records) >= limit:
+                    break
+        records.reverse()
+        return records
+
+    def __len__(self):
+        return self._total
+
+    def _flush(self):
+        if not self._pendientes:
+            return
+        datos = b''.join(self._pendientes)
+        # Primero el log: un índice adelantado apuntaría a líneas inexistentes
+        self._log.write(datos)
+        self._indice.write(b''.join(self._entradas))
+        self._tamano += len(datos)
+        self._pendientes.clear()
+        self._entradas.clear()
+        self._bytes_pendientes = 0
+
+    def _termina_en_linea(self) -> bool:
+        with open(self.ruta, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _recuperar_indice(self) -> int:
+        """Descartar entradas incompletas e indexar las líneas que falten"""
+        tamano_indice = os.path.getsize(self.ruta_indice)
+        total = tamano_indice // _ENTRADA.size
+        if tamano_indice % _ENTRADA.size:
+            self._indice.truncate(total * _ENTRADA.size)
+
+        inicio = 0
+        if total:
+            with open(self.ruta_indice, 'rb') as f:
+                f.seek((total - 1) * _ENTRADA.size)
+                ultimo = _ENTRADA.unpack(f.read(_ENTRADA.size))[0]
+            if ultimo >= self._tamano:
+                # El log es más corto que el índice: reconstruirlo entero
+                self._indice.truncate(0)
+                total = 0
+            else:
+                with open(self.ruta, 'rb') as f:
+                    f.seek(ultimo)
+                    f.readline()
+                    inicio = f.tell()
+
+        if inicio >= self._tamano:
+            return total
+
+        entradas = []
+        with open(self.ruta, 'rb') as f:
+            f.seek(inicio)
+            offset = inicio
+            for linea in f:
+                record = _parse(linea) if linea.endswith(b'\n') else None
+                if record is not None:
+                    entradas.append(_ENTRADA.pack(offset, _hash(record.get('entity_id')),
+                                                  _hash(record.get('operation_type'))))
+                offset += len(linea)
+        self._indice.write(b''.join(entradas))
+        return total + len(entradas)
+
+    def _cargar_claves(self):
+        por_entidad: Dict[int, array] = {}
+        por_operacion: Dict[int, array] = {}
+        with open(self.ruta_indice, 'rb') as f:
+            datos = f.read(self._total * _ENTRADA.size)
+        for posicion, (_, hash_entidad, hash_operacion) in enumerate(_ENTRADA.iter_unpack(datos)):
+            lista = por_entidad.get(hash_entidad)
+            if lista is None:
+                lista = por_entidad[hash_entidad] = array('Q')
+            lista.append(posicion)
+            lista = por_operacion.get(hash_operacion)
+            if lista is None:
+                lista = por_operacion[hash_operacion] = array('Q')
+            lista.append(posicion)
+        self._por_entidad = por_entidad
+        self._por_operacion = por_operacion
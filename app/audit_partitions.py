@@ -0,0 +1,244 @@
+"""
+Particiones por tiempo de la auditoría.
+
+Con AuditService.PARTITION = "month" (o "day") cada período se guarda en
+su propia base SQLite junto a DB_PATH (audit_log.2026-10.db,
+audit_log.2026-11.db, ...) y se pasa a la siguiente según el timestamp de
+cada registro, sin intervención manual. Las particiones que quedan fuera
+de la ventana de retención se compactan y se comprimen con gzip en un
+archivo de solo lectura (audit_log.2026-10.db.gz); al consultarlas se
+descomprimen una sola vez por proceso en un directorio temporal. Los
+registros tardíos de un período archivado van a una partición viva que
+se lee junto al archivo y se fusiona con él al volver a archivar.
+
+Las consultas recorren solo las particiones cuyo período se cruza con el
+rango pedido, de la más reciente a la más antigua, así que leer lo
+reciente cuesta lo mismo con un mes o con cinco años de historia. Si
+DB_PATH ya existía sin particionar se sigue consultando como la
+partición más antigua.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Particion(NamedTuple):
+    clave: str          # '2026-10' o '2026-10-18'; '' para la base sin particionar
+    ruta: str
+    archivada: bool
+    fin: Optional[str]  # clave del período siguiente (límite exclusivo)
+
+    def cubre(self, desde: Optional[str], hasta: Optional[str]) -> bool:
+        """Si el período de la partición se cruza con [desde, hasta)"""
+        if not self.clave:
+            return True
+        if hasta is not None and self.clave >= hasta:
+            return False
+        if desde is not None and self.fin is not None and self.fin <= desde:
+            return False
+        return True
+
+
+class AuditPartitions:
+    """Nombres, descubrimiento y archivo de las particiones de una base"""
+
+    LARGO_CLAVE = {'month': 7, 'day': 10}
+
+    def __init__(self, db_path: str, granularidad: str):
+        if granularidad not in self.LARGO_CLAVE:
+            raise ValueError(f"Granularidad de partición no válida: {granularidad}")
+
+        self.db_path = db_path
+        self.granularidad = granularidad
+        self.largo = self.LARGO_CLAVE[granularidad]
+
+        raiz, ext = os.path.splitext(db_path)
+        self._raiz = raiz
+        self._ext = ext or ".db"
+        self._directorio = os.path.dirname(db_path) or "."
+        self._patron = re.compile(re.escape(os.path.basename(raiz)) + r"\.(\d{4}-\d{2}(?:-\d{2})?)"
+                                  + re.escape(self._ext) + r"(\.gz)?$")
+
+        self._lock = threading.Lock()
+        # Listado cacheado, se invalida cuando cambia el mtime del directorio
+        self._listado: Optional[Tuple[int, List[Particion]]] = None
+        self._cache_dir: Optional[str] = None
+        self._extraidas: Dict[str, str] = {}
+        # Último período en el que escribió este proceso
+        self.actual: Optional[str] = None
+
+    def clave(self, timestamp: str) -> str:
+        """Partición a la que pertenece un timestamp ISO"""
+        return timestamp[:self.largo]
+
+    def ruta(self, clave: str) -> str:
+        return f"{self._raiz}.{clave}{self._ext}"
+
+    def siguiente(self, clave: str) -> str:
+        if self.granularidad == 'day':
+            return (date.fromisoformat(clave) + timedelta(days=1)).isoformat()
+        anio, mes = int(clave[:4]), int(clave[5:7])
+        return f"{anio + mes // 12:04d}-{mes % 12 + 1:02d}"
+
+    def anterior(self, clave: str, periodos: int = 1) -> str:
+        if self.granularidad == 'day':
+            return (date.fromisoformat(clave) - timedelta(days=periodos)).isoformat()
+        indice = int(clave[:4]) * 12 + int(clave[5:7]) - 1 - periodos
+        return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+    def listar(self) -> List[Particion]:
+        """Particiones existentes, de la más reciente a la más antigua"""
+        try:
+            mtime = os.stat(self._directorio).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        listado = self._listado
+        if listado is not None and listado[0] == mtime:
+            return listado[1]
+
+        particiones = []
+        for nombre in os.listdir(self._directorio):
+            match = self._patron.match(nombre)
+            if match is None or len(match.group(1)) != self.largo:
+                continue
+            clave = match.group(1)
+            particiones.append(Particion(clave, os.path.join(self._directorio, nombre),
+                                         match.group(2) is not None, self.siguiente(clave)))
+        # Una partición archivada puede convivir con registros tardíos del mismo período
+        particiones.sort(key=lambda p: (p.clave, not p.archivada), reverse=True)
+
+        if os.path.exists(self.db_path):
+            particiones.append(Particion('', self.db_path, False, None))
+
+        self._listado = (mtime, particiones)
+        return particiones
+
+    def seleccionar(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Particion]:
+        """Particiones que pueden tener registros en [desde, hasta)"""
+        return [p for p in self.listar() if p.cubre(desde, hasta)]
+
+    def vencidas(self, actual: str, conservar: int) -> List[Particion]:
+        """Particiones vivas más antiguas que las `conservar` anteriores a `actual`"""
+        limite = self.anterior(actual, conservar)
+        return [p for p in self.listar() if p.clave and not p.archivada and p.clave < limite]
+
+    def archivar(self, particion: Particion) -> str:
+        """
+        Compactar y comprimir una partición en un .gz de solo lectura. Si el
+        período ya estaba archivado (registros tardíos) se fusiona con el
+        archivo existente: el .gz solo se reemplaza por uno que lo contiene.
+        No debe haber conexiones abiertas a la partición.
+        """
+        ruta = particion.ruta
+        destino = ruta + ".gz"
+
+        conn = sqlite3.connect(ruta, timeout=0)
+        try:
+            # Sin WAL, para poder abrir la copia extraída como inmutable.
+            # Falla si alguien más tiene la partición abierta.
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+        fuente = ruta
+        if os.path.exists(destino):
+            fuente = self._fusionar(ruta, destino)
+
+        temporal = destino + ".tmp"
+        try:
+            with open(fuente, 'rb') as origen, gzip.open(temporal, 'wb', compresslevel=6) as comprimido:
+                shutil.copyfileobj(origen, comprimido, 1 << 20)
+            with open(temporal, 'rb') as f:
+                os.fsync(f.fileno())
+            os.chmod(temporal, 0o444)
+            os.replace(temporal, destino)
+        finally:
+            if fuente != ruta:
+                os.remove(fuente)
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+        self._descartar_extraida(destino)
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+        return destino
+
+    def _fusionar(self, ruta: str, destino: str) -> str:
+        """
+        Copia descomprimida del archivo `destino` con los registros de la
+        partición viva `ruta` agregados; devuelve su ruta (el llamador la borra)
+        """
+        fusion = ruta + ".fusion"
+        with gzip.open(destino, 'rb') as origen, open(fusion, 'wb') as f:
+            shutil.copyfileobj(origen, f, 1 << 20)
+
+        conn = sqlite3.connect(fusion)
+        try:
+            conn.execute("ATTACH DATABASE ? AS tardia", (ruta,))
+            columnas = [fila[1] for fila in conn.execute("PRAGMA main.table_info(audit_log)")
+                        if fila[1] != 'id']
+            lista = ", ".join(columnas)
+            previos = conn.execute("SELECT COUNT(*) FROM main.audit_log").fetchone()[0]
+            tardios = conn.execute("SELECT COUNT(*) FROM tardia.audit_log").fetchone()[0]
+            with conn:
+                conn.execute(f"INSERT INTO main.audit_log ({lista}) "
+                             f"SELECT {lista} FROM tardia.audit_log ORDER BY id")
+                conn.execute(
+                    "INSERT INTO main.audit_summary (operation_type, status, bucket, count) "
+                    "SELECT operation_type, status, bucket, count FROM tardia.audit_summary "
+                    "WHERE true ON CONFLICT (operation_type, status, bucket) "
+                    "DO UPDATE SET count = count + excluded.count")
+            total = conn.execute("SELECT COUNT(*) FROM main.audit_log").fetchone()[0]
+            conn.execute("DETACH DATABASE tardia")
+            if total != previos + tardios:
+                raise RuntimeError(f"Fusión de {destino} incompleta: {total} registros, "
+                                   f"se esperaban {previos + tardios}")
+            conn.execute("VACUUM")
+        except BaseException:
+            conn.close()
+            os.remove(fusion)
+            raise
+        conn.close()
+        return fusion
+
+    def _descartar_extraida(self, destino: str):
+        """Olvidar la copia descomprimida de un archivo que cambió"""
+        with self._lock:
+            extraida = self._extraidas.pop(destino, None)
+        if extraida is not None and os.path.exists(extraida):
+            # Las conexiones abiertas a la copia siguen leyendo el archivo borrado
+            os.remove(extraida)
+
+    def abrir_archivada(self, particion: Particion) -> sqlite3.Connection:
+        """Conexión de solo lectura a una partición archivada (el llamador la cierra)"""
+        with self._lock:
+            extraida = self._extraidas.get(particion.ruta)
+            if extraida is None:
+                if self._cache_dir is None:
+                    self._cache_dir = tempfile.mkdtemp(prefix="audit-archivo-")
+                extraida = os.path.join(self._cache_dir, os.path.basename(particion.ruta)[:-3])
+                with gzip.open(particion.ruta, 'rb') as origen, open(extraida, 'wb') as f:
+                    shutil.copyfileobj(origen, f, 1 << 20)
+                self._extraidas[particion.ruta] = extraida
+
+        return sqlite3.connect(Path(extraida).as_uri() + "?mode=ro&immutable=1", uri=True,
+                               check_same_thread=False)
+
+    def limpiar(self):
+        """Borrar las copias descomprimidas de este proceso"""
+        with self._lock:
+            if self._cache_dir is not None:
+                shutil.rmtree(self._cache_dir, ignore_errors=True)
+            self._cache_dir = None
+            self._extraidas.clear()
@@ -1,95 +1,564 @@
+import asyncio
+import atexit
 import json
+import os
 import sqlite3
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple, List
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple, List, Union
+
+from .audit_codec import JsonCodec, decode_columns
+from .audit_jsonl import JsonLinesLog
+from .audit_partitions import AuditPartitions
+from .audit_writer import AuditWriter
+from .utils import ConnectionManager
 
 import logging
 logger = logging.getLogger(__name__)
 
+
+TimeBound = Optional[Union[str, datetime]]
+
+
+def _as_timestamp(value: Union[str, datetime]) -> str:
+    """Normalizar un límite de tiempo al formato ISO guardado en audit_log"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class AuditRecord(Sequence):
+    """
+    Fila de audit_log. Los campos de payload (estado_antes, estado_despues,
+    campos_modificados, args y kwargs) se decodifican recién cuando se
+    accede a alguno de ellos. Se indexa, desempaqueta y compara como una
+    tupla con los campos de `_fields`.
+    """
+
+    __slots__ = ('id', 'timestamp', 'operation_type', 'entity_type', 'entity_id', 'usuario',
+                 'status', 'error', '_columns', '_payload')
+
+    # Columnas que se leen de audit_log, en este orden
+    COLUMNS = ('id', 'timestamp', 'operation_type', 'entity_type', 'entity_id', 'usuario',
+               'status', 'error', 'estado_antes', 'estado_despues', 'campos_modificados',
+               'args', 'kwargs', 'payload')
+    _fields = ('id', 'timestamp', 'operation_type', 'entity_type', 'entity_id', 'usuario',
+               'estado_antes', 'estado_despues', 'campos_modificados', 'status', 'error',
+               'args', 'kwargs')
+
+    def __init__(self, row: tuple):
+        (self.id, self.timestamp, self.operation_type, self.entity_type, self.entity_id,
+         self.usuario, self.status, self.error) = row[:8]
+        self._columns = row[8:]
+        self._payload: Optional[tuple] = None
+
+    _make = classmethod(lambda cls, row: cls(row))
+
+    def _decoded(self) -> tuple:
+        if self._payload is None:
+            self._payload = decode_columns(self._columns, AuditService._get_modified_fields)
+            self._columns = None
+        return self._payload
+
+    estado_antes = property(lambda self: self._decoded()[0])
+    estado_despues = property(lambda self: self._decoded()[1])
+    campos_modificados = property(lambda self: self._decoded()[2])
+    args = property(lambda self: self._decoded()[3])
+    kwargs = property(lambda self: self._decoded()[4])
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return tuple(getattr(self, field) for field in self._fields[indice])
+        return getattr(self, self._fields[indice])
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __eq__(self, otro):
+        if isinstance(otro, (AuditRecord, tuple)):
+            return tuple(self) == tuple(otro)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"AuditRecord(id={self.id}, timestamp={self.timestamp!r}, "
+                f"operation_type={self.operation_type!r}, entity_id={self.entity_id!r}, "
+                f"status={self.status!r})")
+
+
 class AuditService:
     DB_PATH = "audit_log.db"
+    # Nivel de PRAGMA synchronous: OFF, NORMAL, FULL o EXTRA
+    SYNCHRONOUS = "NORMAL"
+    # Escritura en segundo plano con commit agrupado (ver AuditWriter)
+    ASYNC_WRITES = True
+    WRITER_OPTIONS: Dict[str, Any] = {
+        'batch_size': 500,
+        'flush_interval': 0.05,
+        'max_queue': 10000,
+        'backpressure': AuditWriter.BLOCK,
+    }
+    # Cómo se guardan las columnas de payload (ver audit_codec): texto JSON
+    # histórico, o BinaryCodec() para un BLOB compacto por fila
+    PAYLOAD_CODEC = JsonCodec()
+    # Particiones por tiempo (ver audit_partitions): None para una sola base,
+    # "month" o "day" para una base por período junto a DB_PATH
+    PARTITION: Optional[str] = None
+    # Particiones vivas que se conservan antes de la actual; las anteriores
+    # se archivan comprimidas al pasar a un período nuevo (None: nunca)
+    ARCHIVE_AFTER: Optional[int] = None
+
+    INSERT_SQL = '''
+        INSERT INTO audit_log 
+        (timestamp, operation_type, entity_type, entity_id, usuario,
+         estado_antes, estado_despues, campos_modificados, status, error, args, kwargs,
+         payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            operation_type TEXT NOT NULL,
+            entity_type TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            usuario TEXT NOT NULL,
+            estado_antes TEXT,
+            estado_despues TEXT,
+            campos_modificados TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            args TEXT,
+            kwargs TEXT,
+            payload BLOB
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_audit_entity_ts ON audit_log (entity_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_operation_ts ON audit_log (operation_type, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit_log (timestamp)",
+        # Contadores por (operación, estado, hora) mantenidos en cada inserción
+        '''
+        CREATE TABLE IF NOT EXISTS audit_summary (
+            operation_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (operation_type, status, bucket)
+        ) WITHOUT ROWID
+        ''',
+    )
+
+    SUMMARY_UPSERT_SQL = '''
+        INSERT INTO audit_summary (operation_type, status, bucket, count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (operation_type, status, bucket)
+        DO UPDATE SET count = count + excluded.count
+    '''
+
+    SUMMARY_REBUILD_SQL = '''
+        INSERT INTO audit_summary (operation_type, status, bucket, count)
+        SELECT operation_type, status, substr(timestamp, 1, 13), COUNT(*)
+        FROM audit_log
+        GROUP BY operation_type, status, substr(timestamp, 1, 13)
+    '''
+
+    _managers: Dict[Tuple[str, str], ConnectionManager] = {}
+    _managers_lock = threading.Lock()
+    _partitions: Dict[Tuple[str, str], AuditPartitions] = {}
+    _archive_lock = threading.Lock()
+    # Ruta de partición -> lock entre escrituras tardías y su archivo
+    _partition_locks: Dict[str, threading.Lock] = {}
+    _archiver: Optional[threading.Thread] = None
+    _writer: Optional[AuditWriter] = None
+    _writer_pid: Optional[int] = None
+    # Hilo para log_change_async cuando no se puede encolar sin esperar
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def _get_manager(cls, db_path: Optional[str] = None) -> ConnectionManager:
+        """Gestor de conexiones para la configuración actual (o una partición)"""
+        db_path = db_path or cls.DB_PATH
+        key = (db_path, cls.SYNCHRONOUS)
+        manager = cls._managers.get(key)
+        if manager is None:
+            with cls._managers_lock:
+                manager = cls._managers.get(key)
+                if manager is None:
+                    manager = ConnectionManager(db_path, cls.SCHEMA,
+                                                synchronous=cls.SYNCHRONOUS,
+                                                on_schema=cls._after_schema)
+                    cls._managers[key] = manager
+        return manager
+
+    @classmethod
+    def _get_connection(cls, db_path: Optional[str] = None) -> sqlite3.Connection:
+        return cls._get_manager(db_path).get_connection()
+    
+    @classmethod
+    def _get_partitions(cls) -> Optional[AuditPartitions]:
+        """Particiones para la configuración actual (None si no se particiona)"""
+        if cls.PARTITION is None:
+            return None
+        key = (cls.DB_PATH, cls.PARTITION)
+        particiones = cls._partitions.get(key)
+        if particiones is None:
+            with cls._managers_lock:
+                particiones = cls._partitions.get(key)
+                if particiones is None:
+                    particiones = AuditPartitions(cls.DB_PATH, cls.PARTITION)
+                    cls._partitions[key] = particiones
+        return particiones
     
+    @classmethod
+    def _connections(cls, since: TimeBound, until: TimeBound, archivadas: bool = True,
+                     oldest_first: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Conexiones a las bases que pueden tener registros en [since, until),
+        de la más reciente a la más antigua (o al revés con `oldest_first`)
+        """
+        particiones = cls._get_partitions()
+        if particiones is None:
+            yield cls._get_connection()
+            return
+        
+        desde = None if since is None else _as_timestamp(since)
+        hasta = None if until is None else _as_timestamp(until)
+        seleccion = particiones.seleccionar(desde, hasta)
+        actual = particiones.clave(datetime.now().isoformat())
+        for particion in (reversed(seleccion) if oldest_first else seleccion):
+            if not particion.archivada and (not particion.clave or particion.clave >= actual):
+                yield cls._get_connection(particion.ruta)
+                continue
+
+            if not particion.archivada:
+                # Una partición pasada puede archivarse en cualquier momento: se
+                # lee con una conexión propia que se cierra al terminar, y si ya
+                # no existe se lee su archivo (sin crear una base vacía)
+                try:
+                    conn = sqlite3.connect(Path(particion.ruta).as_uri() + "?mode=rw",
+                                           uri=True, timeout=5.0, check_same_thread=False)
+                except sqlite3.OperationalError:
+                    if not os.path.exists(particion.ruta + ".gz"):
+                        continue
+                    particion = particion._replace(ruta=particion.ruta + ".gz", archivada=True)
+                    if any(p.ruta == particion.ruta for p in seleccion):
+                        continue
+                else:
+                    try:
+                        yield conn
+                    finally:
+                        conn.close()
+                    continue
+
+            if archivadas:
+                conn = particiones.abrir_archivada(particion)
+                try:
+                    yield conn
+                finally:
+                    conn.close()
+
+    @classmethod
+    def _after_schema(cls, conn: sqlite3.Connection):
+        """Migrar bases anteriores y poblar los contadores si faltan"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(audit_log)")}
+        if 'payload' not in columns:
+            conn.execute("ALTER TABLE audit_log ADD COLUMN payload BLOB")
+        
+        has_summary = conn.execute("SELECT EXISTS (SELECT 1 FROM audit_summary)").fetchone()[0]
+        if not has_summary:
+            conn.execute(cls.SUMMARY_REBUILD_SQL)
+
     @classmethod
     def _init_db(cls):
         """Inicializar base de datos de auditoría"""
         try:
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    operation_type TEXT NOT NULL,
-                    entity_type TEXT NOT NULL,
-                    entity_id TEXT NOT NULL,
-                    usuario TEXT NOT NULL,
-                    estado_antes TEXT,
-                    estado_despues TEXT,
-                    campos_modificados TEXT,
-                    status TEXT NOT NULL,
-                    error TEXT,
-                    args TEXT,
-                    kwargs TEXT
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            
+            cls._get_connection()
         except Exception as e:
             logger.error(f"Error inicializando base de datos: {e}")
+
+    @classmethod
+    def _get_writer(cls) -> Optional[AuditWriter]:
+        """Escritor en segundo plano (se arranca con el primer registro)"""
+        if not cls.ASYNC_WRITES:
+            return None
+        writer = cls._writer
+        # Tras un fork el hilo escritor no existe en el proceso hijo
+        if writer is None or cls._writer_pid != os.getpid():
+            with cls._managers_lock:
+                if cls._writer is None or cls._writer_pid != os.getpid():
+                    cls._writer = AuditWriter(cls, **cls.WRITER_OPTIONS)
+                    cls._writer_pid = os.getpid()
+                writer = cls._writer
+        return writer
+
+    @classmethod
+    def flush(cls, timeout: Optional[float] = None) -> bool:
+        """Esperar a que los registros encolados queden confirmados"""
+        writer = cls._writer
+        if writer is None or cls._writer_pid != os.getpid():
+            return True
+        return writer.flush(timeout)
+
+    @classmethod
+    def close(cls):
+        """Vaciar el escritor y cerrar todas las conexiones de auditoría"""
+        archiver = cls._archiver
+        if archiver is not None:
+            archiver.join()
+            cls._archiver = None
+        
+        executor = cls._executor
+        cls._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        writer = cls._writer
+        if writer is not None and cls._writer_pid == os.getpid():
+            writer.close()
+        cls._writer = None
+        cls._writer_pid = None
+
+        with cls._managers_lock:
+            managers = list(cls._managers.values())
+            cls._managers.clear()
+        for manager in managers:
+            manager.close_all()
+        
+        with cls._managers_lock:
+            particiones = list(cls._partitions.values())
+            cls._partitions.clear()
+        for particion in particiones:
+            particion.limpiar()
+    
+    @classmethod
+    def _partition_lock(cls, db_path: str) -> threading.Lock:
+        lock = cls._partition_locks.get(db_path)
+        if lock is None:
+            with cls._managers_lock:
+                lock = cls._partition_locks.setdefault(db_path, threading.Lock())
+        return lock
+    
+    @classmethod
+    def _close_manager(cls, db_path: str):
+        with cls._managers_lock:
+            managers = [cls._managers.pop(key) for key in list(cls._managers) if key[0] == db_path]
+        for manager in managers:
+            manager.close_all()
+    
+    @classmethod
+    def archive_partitions(cls, conservar: Optional[int] = None) -> List[str]:
+        """
+        Comprimir en archivos de solo lectura las particiones anteriores a
+        las `conservar` (por defecto ARCHIVE_AFTER) que preceden a la actual.
+        Devuelve las rutas de los archivos creados.
+        """
+        particiones = cls._get_partitions()
+        conservar = cls.ARCHIVE_AFTER if conservar is None else conservar
+        if particiones is None or conservar is None:
+            return []
+        
+        archivos = []
+        with cls._archive_lock:
+            actual = particiones.clave(datetime.now().isoformat())
+            for particion in particiones.vencidas(actual, conservar):
+                try:
+                    # Solo el escritor usa conexiones persistentes a particiones
+                    # pasadas; los lectores abren la suya y el archivo falla si
+                    # alguno está leyendo (se reintenta en el próximo período)
+                    with cls._partition_lock(particion.ruta):
+                        cls._close_manager(particion.ruta)
+                        archivos.append(particiones.archivar(particion))
+                    logger.info("Partición de auditoría %s archivada", particion.clave)
+                except Exception as e:
+                    logger.error(f"Error archivando partición de auditoría {particion.clave}: {e}")
+        return archivos
     
     @classmethod
     def log_change(cls, operation_type: str, entity_type: str, entity_id: str,
                    estado_antes: Dict[str, Any], estado_despues: Dict[str, Any], 
                    usuario: str, status: str, error: Optional[str] = None, 
-                   args: Optional[Tuple] = None, kwargs: Optional[Dict] = None):
-        """Registrar cambio en la auditoría"""
+                   args: Optional[Tuple] = None, kwargs: Optional[Dict] = None,
+                   campos_modificados: Optional[Dict[str, Any]] = None):
+        """
+        Registrar cambio en la auditoría.
+        Si no se indica `campos_modificados` se calcula comparando los estados.
+        """
         
         try:
-            cls._init_db()
+            record = cls.make_record(operation_type, entity_type, entity_id, estado_antes,
+                                     estado_despues, usuario, status, error, args, kwargs,
+                                     campos_modificados)
             
-            # Identificar campos modificados
-            campos_modificados = cls._get_modified_fields(estado_antes, estado_despues)
-            
-            # Preparar datos para insertar
-            timestamp = datetime.now().isoformat()
-            
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO audit_log 
-                (timestamp, operation_type, entity_type, entity_id, usuario,
-                 estado_antes, estado_despues, campos_modificados, status, error, args, kwargs)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                timestamp, 
-                operation_type, 
-                entity_type, 
-                entity_id, 
-                usuario,
-                json.dumps(estado_antes), 
-                json.dumps(estado_despues),
-                json.dumps(campos_modificados), 
-                status, 
-                error,
-                json.dumps(list(args)) if args else None,
-                json.dumps(kwargs) if kwargs else None
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            # También log en archivo
-            logger.info(f"AUDIT: {operation_type} on {entity_type}({entity_id}) by {usuario} - {status}")
-            if campos_modificados:
-                logger.info(f"Modified fields: {campos_modificados}")
+            writer = cls._get_writer()
+            if writer is not None:
+                writer.submit(record)
+            else:
+                cls._write_records([record])
                 
         except Exception as e:
             logger.error(f"Error registrando en auditoría: {e}")
     
+    @classmethod
+    async def log_change_async(cls, operation_type: str, entity_type: str, entity_id: str,
+                               estado_antes: Dict[str, Any], estado_despues: Dict[str, Any],
+                               usuario: str, status: str, error: Optional[str] = None,
+                               args: Optional[Tuple] = None, kwargs: Optional[Dict] = None,
+                               campos_modificados: Optional[Dict[str, Any]] = None):
+        """
+        Versión para asyncio de log_change: encola el registro sin esperar;
+        si la cola está llena (o no hay escritor en segundo plano) la
+        escritura corre en un hilo aparte en vez de bloquear el event loop.
+        """
+        
+        try:
+            record = cls.make_record(operation_type, entity_type, entity_id, estado_antes,
+                                     estado_despues, usuario, status, error, args, kwargs,
+                                     campos_modificados)
+            
+            writer = cls._get_writer()
+            if writer is not None and writer.try_submit(record):
+                return
+            
+            with cls._managers_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-async")
+                executor = cls._executor
+            
+            loop = asyncio.get_running_loop()
+            if writer is not None:
+                # Aplica la política de contrapresión del escritor
+                await loop.run_in_executor(executor, writer.submit, record)
+            else:
+                await loop.run_in_executor(executor, cls._write_records, [record])
+                
+        except Exception as e:
+            logger.error(f"Error registrando en auditoría: {e}")
+    
+    @classmethod
+    def make_record(cls, operation_type: str, entity_type: str, entity_id: str,
+                    estado_antes: Dict[str, Any], estado_despues: Dict[str, Any],
+                    usuario: str, status: str, error: Optional[str] = None,
+                    args: Optional[Tuple] = None, kwargs: Optional[Dict] = None,
+                    campos_modificados: Optional[Dict[str, Any]] = None) -> tuple:
+        """Armar un registro de auditoría (mismos parámetros que log_change)"""
+        return (datetime.now().isoformat(), operation_type, entity_type, entity_id,
+                usuario, estado_antes, estado_despues, status, error, args, kwargs,
+                campos_modificados)
+    
+    @classmethod
+    def log_batch(cls, records: List[tuple]):
+        """
+        Registrar varios cambios (creados con make_record) en una sola
+        transacción, sin pasar por el escritor en segundo plano.
+        Lanza la excepción si la escritura falla.
+        """
+        if records:
+            cls._write_records(records, log_each=False)
+            logger.info("AUDIT: lote de %d registros", len(records))
+    
+    @classmethod
+    def _encode_record(cls, record: tuple) -> tuple:
+        """Convertir un registro en la fila que se inserta en audit_log"""
+        (timestamp, operation_type, entity_type, entity_id, usuario,
+         estado_antes, estado_despues, status, error, args, kwargs,
+         campos_modificados) = record
+        
+        (antes_col, despues_col, campos_col, args_col, kwargs_col,
+         payload) = cls.PAYLOAD_CODEC.encode(estado_antes, estado_despues, campos_modificados,
+                                             args, kwargs, cls._get_modified_fields)
+        
+        return (
+            timestamp, 
+            operation_type, 
+            entity_type, 
+            entity_id, 
+            usuario,
+            antes_col,
+            despues_col,
+            campos_col,
+            status, 
+            error,
+            args_col,
+            kwargs_col,
+            payload
+        )
+    
+    @classmethod
+    def _insert_rows(cls, rows: List[tuple]):
+        """Insertar filas ya codificadas (una transacción por partición)"""
+        particiones = cls._get_partitions()
+        if particiones is None:
+            cls._insert_into(cls._get_connection(), rows)
+            return
+        
+        grupos: Dict[str, List[tuple]] = {}
+        for row in rows:
+            grupos.setdefault(particiones.clave(row[0]), []).append(row)
+        actual = particiones.clave(datetime.now().isoformat())
+        for clave, grupo in grupos.items():
+            ruta = particiones.ruta(clave)
+            if clave >= actual:
+                cls._insert_into(cls._get_connection(ruta), grupo)
+                continue
+            # Registros tardíos: la partición no se archiva mientras se escriben
+            with cls._partition_lock(ruta):
+                cls._insert_into(cls._get_connection(ruta), grupo)
+        
+        ultima = max(grupos, default=None)
+        if ultima is not None and (particiones.actual is None or ultima > particiones.actual):
+            # Período nuevo (o primera escritura del proceso)
+            particiones.actual = ultima
+            if cls.ARCHIVE_AFTER is not None:
+                # VACUUM + gzip puede tardar: no demorar al escritor
+                cls._archiver = threading.Thread(target=cls.archive_partitions,
+                                                 name="audit-archiver", daemon=True)
+                cls._archiver.start()
+    
+    @classmethod
+    def _insert_into(cls, conn: sqlite3.Connection, rows: List[tuple]):
+        # Agregar los contadores del lote: (operación, estado, hora) -> cantidad
+        counters: Dict[Tuple[str, str, str], int] = {}
+        for row in rows:
+            key = (row[1], row[8], row[0][:13])
+            counters[key] = counters.get(key, 0) + 1
+        
+        with conn:
+            conn.executemany(cls.INSERT_SQL, rows)
+            conn.executemany(cls.SUMMARY_UPSERT_SQL,
+                             [key + (count,) for key, count in counters.items()])
+    
+    @classmethod
+    def _write_records(cls, records: List[tuple], log_each: bool = True):
+        """Codificar e insertar un lote de registros"""
+        rows = [cls._encode_record(record) for record in records]
+        cls._insert_rows(rows)
+        
+        if not log_each:
+            return
+        
+        # También log en archivo
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        for row in rows:
+            logger.info("AUDIT: %s on %s(%s) by %s - %s", row[1], row[2], row[3], row[4], row[8])
+            campos = row[7]
+            if campos is None:
+                campos = json.dumps(decode_columns(row[5:8] + row[10:], cls._get_modified_fields)[2],
+                                    default=str)
+            if campos != '{}':
+                logger.info("Modified fields: %s", campos)
+    
     @classmethod
     def _get_modified_fields(cls, antes: Dict[str, Any], despues: Dict[str, Any]) -> Dict[str, Any]:
         """Identificar campos que cambiaron"""
@@ -113,73 +582,243 @@ class AuditService:
             
         return modificados
     
+    @classmethod
+    def _history_query(cls, entity_id: Optional[str], operation_type: Optional[str],
+                       since: TimeBound, until: TimeBound,
+                       cursor: Optional[Tuple[str, int]] = None) -> Tuple[str, List[Any]]:
+        """Construir la consulta de historial (más reciente primero)"""
+        query = f"SELECT {', '.join(AuditRecord.COLUMNS)} FROM audit_log WHERE 1=1"
+        params: List[Any] = []
+        
+        if entity_id:
+            query += " AND entity_id = ?"
+            params.append(entity_id)
+            
+        if operation_type:
+            query += " AND operation_type = ?"
+            params.append(operation_type)
+        
+        if since is not None:
+            query += " AND timestamp >= ?"
+            params.append(_as_timestamp(since))
+        
+        if until is not None:
+            query += " AND timestamp < ?"
+            params.append(_as_timestamp(until))
+        
+        if cursor is not None:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend(cursor)
+        
+        query += " ORDER BY timestamp DESC, id DESC"
+        return query, params
+    
     @classmethod
     def get_audit_history(cls, entity_id: Optional[str] = None, 
-                         operation_type: Optional[str] = None) -> List[Tuple]:
+                         operation_type: Optional[str] = None,
+                         since: TimeBound = None, until: TimeBound = None,
+                         limit: Optional[int] = None) -> List[AuditRecord]:
         """Obtener historial de auditoría"""
         try:
-            cls._init_db()
+            cls.flush()
+            records: List[AuditRecord] = []
             
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
+            # Las particiones llegan de la más reciente a la más antigua, así
+            # que concatenar conserva el orden y el límite corta el recorrido
+            with closing(cls._connections(since, until)) as connections:
+                for conn in connections:
+                    query, params = cls._history_query(entity_id, operation_type, since, until)
+                    
+                    if limit is not None:
+                        query += " LIMIT ?"
+                        params.append(limit - len(records))
+                    
+                    records.extend(AuditRecord._make(row) for row in conn.execute(query, params))
+                    if limit is not None and len(records) >= limit:
+                        break
             
-            query = "SELECT * FROM audit_log WHERE 1=1"
-            params = []
+            return records
             
-            if entity_id:
-                query += " AND entity_id = ?"
-                params.append(entity_id)
-                
-            if operation_type:
-                query += " AND operation_type = ?"
-                params.append(operation_type)
+        except Exception as e:
+            logger.error(f"Error obteniendo historial de auditoría: {e}")
+            return []
+    
+    @classmethod
+    def get_audit_page(cls, entity_id: Optional[str] = None,
+                       operation_type: Optional[str] = None,
+                       since: TimeBound = None, until: TimeBound = None,
+                       page_size: int = 50, cursor: Optional[Tuple[str, int]] = None
+                       ) -> Tuple[List[AuditRecord], Optional[Tuple[str, int]]]:
+        """
+        Obtener una página del historial por cursor (keyset pagination).
+        Devuelve los registros y el cursor de la página siguiente, o None
+        si no hay más.
+        """
+        try:
+            cls.flush()
+            records: List[AuditRecord] = []
             
-            query += " ORDER BY timestamp DESC"
+            hasta = until
+            if cursor is not None and (until is None or cursor[0] < _as_timestamp(until)):
+                hasta = cursor[0]
             
-            cursor.execute(query, params)
-            results = cursor.fetchall()
+            with closing(cls._connections(since, hasta)) as connections:
+                for conn in connections:
+                    query, params = cls._history_query(entity_id, operation_type, since, until, cursor)
+                    query += " LIMIT ?"
+                    params.append(page_size + 1 - len(records))
+                    
+                    records.extend(AuditRecord._make(row) for row in conn.execute(query, params))
+                    if len(records) > page_size:
+                        break
             
-            conn.close()
-            return results
+            if len(records) > page_size:
+                records = records[:page_size]
+                last = records[-1]
+                return records, (last.timestamp, last.id)
+            return records, None
             
         except Exception as e:
-            logger.error(f"Error obteniendo historial de auditoría: {e}")
-            return []
+            logger.error(f"Error obteniendo página de auditoría: {e}")
+            return [], None
+    
+    @classmethod
+    def iter_audit_history(cls, entity_id: Optional[str] = None,
+                           operation_type: Optional[str] = None,
+                           since: TimeBound = None, until: TimeBound = None,
+                           batch_size: int = 500) -> Iterator[AuditRecord]:
+        """Recorrer el historial en streaming, sin cargarlo completo en memoria"""
+        cls.flush()
+        
+        with closing(cls._connections(since, until)) as connections:
+            for conn in connections:
+                query, params = cls._history_query(entity_id, operation_type, since, until)
+                cursor = conn.execute(query, params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield AuditRecord._make(row)
+                finally:
+                    cursor.close()
+    
+    @classmethod
+    def first_timestamp(cls, since: TimeBound = None) -> Optional[str]:
+        """Timestamp del registro más antiguo (desde `since`), o None si no hay"""
+        cls.flush()
+        query = "SELECT MIN(timestamp) FROM audit_log"
+        params: List[Any] = []
+        if since is not None:
+            query += " WHERE timestamp >= ?"
+            params.append(_as_timestamp(since))
+        
+        with closing(cls._connections(since, None, oldest_first=True)) as connections:
+            for conn in connections:
+                primero = conn.execute(query, params).fetchone()[0]
+                if primero is not None:
+                    return primero
+        return None
     
     @classmethod
-    def get_audit_summary(cls) -> Dict[str, Any]:
-        """Obtener resumen de auditoría"""
+    def get_audit_summary(cls, by_hour: bool = False,
+                          since: TimeBound = None, until: TimeBound = None) -> Dict[str, Any]:
+        """
+        Obtener resumen de auditoría.
+        `since` y `until` se redondean a la hora (la granularidad de los contadores).
+        """
         try:
-            cls._init_db()
+            cls.flush()
             
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
+            filtro = ""
+            params: List[Any] = []
+            if since is not None:
+                filtro += " AND bucket >= ?"
+                params.append(_as_timestamp(since)[:13])
+            if until is not None:
+                filtro += " AND bucket < ?"
+                params.append(_as_timestamp(until)[:13])
             
-            # Contar operaciones por tipo
-            cursor.execute('''
-                SELECT operation_type, COUNT(*) as count, status
-                FROM audit_log 
-                GROUP BY operation_type, status
-                ORDER BY count DESC
-            ''')
+            por_tipo: Dict[Tuple[str, str], int] = {}
+            por_hora: Dict[Tuple[str, str, str], int] = {}
             
-            operations = cursor.fetchall()
+            with closing(cls._connections(since, until)) as connections:
+                for conn in connections:
+                    # Contar operaciones por tipo
+                    for operation_type, status, count in conn.execute(f'''
+                        SELECT operation_type, status, SUM(count)
+                        FROM audit_summary 
+                        WHERE 1=1{filtro}
+                        GROUP BY operation_type, status
+                    ''', params):
+                        key = (operation_type, status)
+                        por_tipo[key] = por_tipo.get(key, 0) + count
+                    
+                    if by_hour:
+                        for bucket, operation_type, status, count in conn.execute(f'''
+                            SELECT bucket, operation_type, status, count
+                            FROM audit_summary
+                            WHERE 1=1{filtro}
+                        ''', params):
+                            key = (bucket, operation_type, status)
+                            por_hora[key] = por_hora.get(key, 0) + count
             
-            # Contar total de registros
-            cursor.execute('SELECT COUNT(*) FROM audit_log')
-            total = cursor.fetchone()[0]
+            operations = sorted(((operation_type, count, status)
+                                 for (operation_type, status), count in por_tipo.items()),
+                                key=lambda row: row[1], reverse=True)
             
-            conn.close()
-            
-            return {
-                'total_operations': total,
+            summary = {
+                'total_operations': sum(row[1] for row in operations),
                 'operations_by_type': operations,
                 'last_updated': datetime.now().isoformat()
             }
             
+            if by_hour:
+                summary['operations_by_hour'] = sorted(
+                    (key + (count,) for key, count in por_hora.items()),
+                    key=lambda row: (row[0], row[3]), reverse=True)
+            
+            return summary
+            
         except Exception as e:
             logger.error(f"Error obteniendo resumen de auditoría: {e}")
             return {'error': str(e)}
+    
+    @classmethod
+    def rebuild_audit_summary(cls) -> List[Tuple[str, str, str, int, int]]:
+        """
+        Recalcular los contadores desde audit_log (las particiones archivadas
+        son de solo lectura y no se tocan).
+        Devuelve las diferencias encontradas como
+        (operation_type, status, bucket, contador_anterior, contador_real).
+        """
+        cls.flush()
+        diferencias = []
+        
+        with closing(cls._connections(None, None, archivadas=False)) as connections:
+            for conn in connections:
+                with conn:
+                    # Tomar el lock de escritura antes de leer: ningún lote
+                    # puede colarse entre "antes" y el recálculo
+                    conn.execute("BEGIN IMMEDIATE")
+                    antes = {row[:3]: row[3] for row in conn.execute(
+                        "SELECT operation_type, status, bucket, count FROM audit_summary")}
+                    conn.execute("DELETE FROM audit_summary")
+                    conn.execute(cls.SUMMARY_REBUILD_SQL)
+                    despues = {row[:3]: row[3] for row in conn.execute(
+                        "SELECT operation_type, status, bucket, count FROM audit_summary")}
+                
+                diferencias.extend(key + (antes.get(key, 0), despues.get(key, 0))
+                                   for key in sorted(set(antes) | set(despues))
+                                   if antes.get(key, 0) != despues.get(key, 0))
+        
+        if diferencias:
+            logger.warning(f"Resumen de auditoría reconstruido con {len(diferencias)} diferencias")
+        return diferencias
+
+
+atexit.register(AuditService.close)
 
 # ===============================
 # VERSIÓN SIMPLIFICADA (SIN TYPE HINTS)
@@ -187,19 +826,36 @@ class AuditService:
 
 class SimpleAuditService:
     """
-    Versión simplificada sin type hints para evitar errores
+    Versión simplificada sin type hints: un registro JSON por línea en
+    DB_PATH, escrito con buffer, e índice de offsets lateral (ver audit_jsonl)
     """
     DB_PATH = "simple_audit.log"
+    # Registros que se acumulan antes de escribir en disco
+    FLUSH_EVERY = 64
+    # Mostrar cada registro en consola
+    ECHO = True
+    
+    _logs = {}
+    _logs_lock = threading.Lock()
+    
+    @classmethod
+    def _get_log(cls):
+        log = cls._logs.get(cls.DB_PATH)
+        if log is None:
+            with cls._logs_lock:
+                log = cls._logs.get(cls.DB_PATH)
+                if log is None:
+                    log = JsonLinesLog(cls.DB_PATH, flush_every=cls.FLUSH_EVERY)
+                    cls._logs[cls.DB_PATH] = log
+        return log
     
     @classmethod
     def log_change(cls, operation_type, entity_type, entity_id, 
                    estado_antes, estado_despues, usuario, status, 
                    error=None, args=None, kwargs=None):
-        """Registrar cambio en archivo de texto simple"""
+        """Registrar cambio en el archivo"""
         
         try:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
             # Identificar campos modificados
             modificados = {}
             if estado_antes and estado_despues:
@@ -209,45 +865,48 @@ class SimpleAuditService:
                     if antes != despues:
                         modificados[key] = f"{antes} -> {despues}"
             
-            # Escribir en archivo
-            with open(cls.DB_PATH, 'a', encoding='utf-8') as f:
-                f.write(f"\n{'='*80}\n")
-                f.write(f"TIMESTAMP: {timestamp}\n")
-                f.write(f"OPERATION: {operation_type}\n")
-                f.write(f"ENTITY: {entity_type}({entity_id})\n")
-                f.write(f"USER: {usuario}\n")
-                f.write(f"STATUS: {status}\n")
-                
-                if error:
-                    f.write(f"ERROR: {error}\n")
-                
-                if modificados:
-                    f.write("CHANGES:\n")
-                    for campo, cambio in modificados.items():
-                        f.write(f"  - {campo}: {cambio}\n")
-                
-                if args:
-                    f.write(f"ARGS: {args}\n")
-                
-                if kwargs:
-                    f.write(f"KWARGS: {kwargs}\n")
+            cls._get_log().append({
+                'timestamp': datetime.now().isoformat(),
+                'operation_type': operation_type,
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'usuario': usuario,
+                'status': status,
+                'error': error,
+                'changes': modificados,
+                'args': list(args) if args else None,
+                'kwargs': kwargs or None,
+            })
             
             # También mostrar en consola
-            print(f"\n📋 AUDIT LOG: {operation_type} on {entity_type}({entity_id}) - {status}")
-            if modificados:
-                print(f"🔄 Changes: {modificados}")
+            if cls.ECHO:
+                print(f"\n📋 AUDIT LOG: {operation_type} on {entity_type}({entity_id}) - {status}")
+                if modificados:
+                    print(f"🔄 Changes: {modificados}")
                 
         except Exception as e:
             print(f"❌ Error en audit log: {e}")
     
     @classmethod
-    def get_audit_history(cls, entity_id=None, operation_type=None):
-        """Leer historial desde archivo"""
+    def get_audit_history(cls, entity_id=None, operation_type=None, limit=10):
+        """Últimos `limit` registros (del más antiguo al más reciente), con filtros opcionales"""
         try:
-            with open(cls.DB_PATH, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return content.split('='*80)[-10:]  # Últimos 10 registros
-        except FileNotFoundError:
-            return ["No hay registros de auditoría aún"]
+            return cls._get_log().query(entity_id, operation_type, limit)
         except Exception as e:
-            return [f"Error leyendo auditoría: {e}"]
\ No newline at end of file
+            return [f"Error leyendo auditoría: {e}"]
+    
+    @classmethod
+    def flush(cls):
+        """Escribir en disco los registros acumulados"""
+        for log in list(cls._logs.values()):
+            log.flush()
+    
+    @classmethod
+    def close(cls):
+        with cls._logs_lock:
+            logs = list(cls._logs.values())
+            cls._logs.clear()
+        for log in logs:
+            log.close()
+
+atexit.register(SimpleAuditService.close)
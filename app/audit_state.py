@@ -0,0 +1,61 @@
+"""
+Protocolo de captura de estado para AOP.
+
+Una entidad declara qué rastrea la auditoría:
+- `_audit_fields`: atributos escalares (ej. 'saldo'), se guardan antes/después
+- `_audit_collections`: diccionarios que solo crecen (ej. 'cuentas'); se
+  guarda su tamaño y el delta reporta las claves agregadas
+
+La captura y el delta cuestan O(campos + elementos agregados), sin importar
+el tamaño de las colecciones. Las entidades que no declaran nada usan su
+`_get_current_state()` y el diff completo de AuditService.
+"""
+
+from itertools import islice
+from typing import Any, Dict
+
+
+def is_declarative(entity: Any) -> bool:
+    """La entidad declara sus campos auditables"""
+    cls = type(entity)
+    return hasattr(cls, '_audit_fields') or hasattr(cls, '_audit_collections')
+
+
+def capture_state(entity: Any) -> Dict[str, Any]:
+    """Capturar el estado compacto de una entidad"""
+    cls = type(entity)
+
+    if not is_declarative(entity):
+        return entity._get_current_state() if hasattr(entity, '_get_current_state') else {}
+
+    estado = {campo: getattr(entity, campo) for campo in getattr(cls, '_audit_fields', ())}
+    for coleccion in getattr(cls, '_audit_collections', ()):
+        estado[f'total_{coleccion}'] = len(getattr(entity, coleccion))
+    return estado
+
+
+def state_delta(entity: Any, antes: Dict[str, Any], despues: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcular el delta entre dos capturas de una entidad declarativa"""
+    cls = type(entity)
+    delta: Dict[str, Any] = {}
+
+    for campo in getattr(cls, '_audit_fields', ()):
+        valor_antes = antes.get(campo)
+        valor_despues = despues.get(campo)
+        if valor_antes != valor_despues:
+            delta[campo] = {'antes': valor_antes, 'despues': valor_despues}
+
+    for coleccion in getattr(cls, '_audit_collections', ()):
+        clave = f'total_{coleccion}'
+        total_antes = antes.get(clave, 0)
+        total_despues = despues.get(clave, 0)
+
+        if total_despues > total_antes:
+            # Los diccionarios conservan el orden de inserción: las claves
+            # nuevas están al final y se recorren desde ahí
+            nuevas = list(islice(reversed(getattr(entity, coleccion)), total_despues - total_antes))
+            delta[coleccion] = {'agregados': nuevas[::-1]}
+        elif total_despues < total_antes:
+            delta[coleccion] = {'eliminados': total_antes - total_despues}
+
+    return delta
@@ -0,0 +1,266 @@
+import base64
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _encode_blob(value: Any) -> Dict[str, str]:
+    # Columna payload binaria (ver audit_codec) dentro del archivo JSONL
+    if isinstance(value, bytes):
+        return {'b64': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Tipo no serializable en el derrame: {type(value).__name__}")
+
+
+def _decode_spilled_row(row: List[Any]) -> tuple:
+    row = [base64.b64decode(v['b64']) if isinstance(v, dict) else v for v in row]
+    if len(row) == 12:
+        # Derrames anteriores a la columna payload
+        row.append(None)
+    return tuple(row)
+
+
+class _Marker:
+    """Marca en la cola: el escritor la señala al confirmar todo lo anterior"""
+
+    def __init__(self, stop: bool = False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    """
+    Escritor de auditoría en segundo plano con commit agrupado.
+
+    Los registros se encolan en una cola acotada y un hilo escritor los
+    inserta por lotes (executemany dentro de una sola transacción) cada
+    `batch_size` registros o cada `flush_interval` segundos.
+
+    Políticas cuando la cola está llena:
+    - "block": el llamador espera a que haya espacio; si el hilo
+      escritor ya no existe, el registro se derrama a disco
+    - "drop": el registro se descarta y se incrementa `dropped`
+    - "spill": el registro se escribe en disco (JSON lines) y se
+      reingresa a la base de datos en cuanto el escritor queda libre
+    """
+
+    BLOCK = "block"
+    DROP = "drop"
+    SPILL = "spill"
+
+    def __init__(self, service, batch_size: int = 500, flush_interval: float = 0.05,
+                 max_queue: int = 10000, backpressure: str = BLOCK,
+                 spill_path: Optional[str] = None):
+        if backpressure not in (self.BLOCK, self.DROP, self.SPILL):
+            raise ValueError(f"Política de contrapresión no válida: {backpressure}")
+
+        self.service = service
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.spill_path = spill_path or f"{service.DB_PATH}.spill.jsonl"
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.batches = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: tuple):
+        """Encolar un registro aplicando la política de contrapresión"""
+        if self._closed:
+            raise RuntimeError("El escritor de auditoría está cerrado")
+
+        with self._stats_lock:
+            self.submitted += 1
+
+        if self.backpressure == self.BLOCK:
+            # Esperar por tramos: si el escritor murió nadie vaciaría la cola
+            while True:
+                try:
+                    self._queue.put(record, timeout=0.1)
+                    return
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        break
+            logger.error("Escritor de auditoría detenido: registro derramado a disco")
+            self._spill([self.service._encode_record(record)])
+            return
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.backpressure == self.DROP:
+                with self._stats_lock:
+                    self.dropped += 1
+            else:
+                self._spill([self.service._encode_record(record)])
+
+    def try_submit(self, record: tuple) -> bool:
+        """Encolar sin esperar; False si la cola está llena (no aplica la política)"""
+        if self._closed:
+            raise RuntimeError("El escritor de auditoría está cerrado")
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que todo lo encolado hasta ahora quede confirmado"""
+        if not self._thread.is_alive():
+            return True
+        marker = _Marker()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Vaciar la cola, reingresar lo derramado a disco y detener el hilo"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            marker = _Marker(stop=True)
+            self._queue.put(marker)
+            marker.done.wait(timeout)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del escritor"""
+        with self._stats_lock:
+            return {
+                'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'batches': self.batches,
+                'errors': self.errors,
+                'queued': self._queue.qsize(),
+            }
+
+    def _run(self):
+        # Recuperar lo que haya quedado en disco de una ejecución anterior
+        self._ingest_spill()
+
+        while True:
+            batch: List[tuple] = []
+            marker = None
+
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if isinstance(item, _Marker):
+                    marker = item
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+
+            if marker is not None or self._queue.empty():
+                self._ingest_spill()
+
+            if marker is not None:
+                marker.done.set()
+                if marker.stop:
+                    return
+
+    def _write(self, batch: List[tuple]):
+        try:
+            self.service._write_records(batch)
+            with self._stats_lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            # No perder el lote: se guarda en disco para reintentar luego
+            with self._stats_lock:
+                self.errors += 1
+            logger.error(f"Error escribiendo lote de auditoría ({len(batch)} registros): {e}")
+            try:
+                self._spill([self.service._encode_record(r) for r in batch])
+            except Exception as spill_error:
+                logger.error(f"Error derramando lote de auditoría a disco: {spill_error}")
+
+    def _spill(self, rows: List[tuple]):
+        with self._spill_lock:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_encode_blob))
+                    f.write('\n')
+        with self._stats_lock:
+            self.spilled += len(rows)
+
+    def _ingest_spill(self):
+        """
+        Reingresar el derrame por lotes. Después de cada lote confirmado se
+        guarda hasta qué byte se reingresó (`.offset`), así que tras un
+        error solo se reintenta lo que falta.
+        """
+        pending = self.spill_path + ".ingesting"
+        checkpoint = pending + ".offset"
+
+        with self._spill_lock:
+            if not os.path.exists(pending):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, pending)
+
+        try:
+            offset = 0
+            if os.path.exists(checkpoint):
+                with open(checkpoint, 'r', encoding='utf-8') as f:
+                    offset = int(f.read() or 0)
+
+            with open(pending, 'rb') as f:
+                f.seek(offset)
+                rows = []
+                for line in f:
+                    offset += len(line)
+                    if line.strip():
+                        rows.append(_decode_spilled_row(json.loads(line)))
+                    if len(rows) >= self.batch_size:
+                        self._ingest_rows(rows, checkpoint, offset)
+                        rows = []
+                if rows:
+                    self._ingest_rows(rows, checkpoint, offset)
+            os.remove(pending)
+            if os.path.exists(checkpoint):
+                os.remove(checkpoint)
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.error(f"Error reingresando auditoría derramada a disco: {e}")
+
+    def _ingest_rows(self, rows: List[tuple], checkpoint: str, offset: int):
+        self.service._insert_rows(rows)
+        with open(checkpoint + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+        os.replace(checkpoint + ".tmp", checkpoint)
+        with self._stats_lock:
+            self.written += len(rows)
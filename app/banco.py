@@ -1,40 +1,250 @@
+import math
+import threading
+from decimal import Decimal
+
 from app.cliente import Cliente
 from app.cuenta import Cuenta
+from .audit_service import AuditService
+from .concurrency import bloquear_cuentas, synchronized, synchronized_transfer
 from .decorators import log_data_changes, notify_by_email
+from .email_service import EmailService
+from .idempotencia import idempotente
+from .libro_cuentas import CuentaVista
+from .transaccion import Ledger
+from .utils import monto_compatible
 
 class Banco:
-    def __init__(self):
+    # AOP: la auditoría registra solo los clientes/cuentas agregados
+    _audit_collections = ('clientes', 'cuentas')
+
+    def __init__(self, ledger=None, libro=None):
         self.clientes = {}
         self.cuentas = {}
+        self.ledger = ledger if ledger is not None else Ledger()
+        # Motor columnar opcional: las cuentas son vistas sobre sus filas
+        self.libro = libro
+        # Persistencia opcional (ver BancoStore.adjuntar)
+        self.store = None
+        # Límites de velocidad opcionales (ver LimitesVelocidad.adjuntar)
+        self.limites = None
+        # Protege los diccionarios de clientes y cuentas; los saldos usan
+        # el lock de cada Cuenta
+        self._lock = threading.RLock()
 
-    def _get_current_state(self):
-        """Método para AOP - obtener estado actual"""
-        return {
-            'total_clientes': len(self.clientes),
-            'total_cuentas': len(self.cuentas),
-            'clientes': list(self.clientes.keys()),
-            'cuentas': list(self.cuentas.keys())
-        }
-
+    @synchronized
     @log_data_changes("crear_cliente")
     def crear_cliente(self, nombre, identificacion):
+        return self._crear_cliente(nombre, identificacion)
+
+    @synchronized
+    @log_data_changes("crear_cuenta")
+    def crear_cuenta(self, identificacion, numero_cuenta):
+        return self._crear_cuenta(identificacion, numero_cuenta)
+
+    def _crear_cliente(self, nombre, identificacion):
         cliente = Cliente(nombre, identificacion)
+        # Primero el store: si falla, el banco no cambia
+        if self.store is not None:
+            self.store.registrar_cliente(cliente)
         self.clientes[identificacion] = cliente
         return cliente
 
-    @log_data_changes("crear_cuenta")
-    def crear_cuenta(self, identificacion, numero_cuenta):
+    def _crear_cuenta(self, identificacion, numero_cuenta):
         if identificacion not in self.clientes:
             raise ValueError("Cliente no encontrado")
-        cuenta = Cuenta(numero_cuenta)
+        cuenta = self._nueva_cuenta(numero_cuenta)
+        if self.store is not None:
+            self.store.registrar_cuenta(identificacion, cuenta)
         self.clientes[identificacion].agregar_cuenta(cuenta)
         self.cuentas[numero_cuenta] = cuenta
+        if self.limites is not None:
+            self.limites.registrar_cuenta(identificacion, cuenta)
         return cuenta
 
+    def _nueva_cuenta(self, numero_cuenta, saldo_inicial=0):
+        if self.libro is not None:
+            return CuentaVista(numero_cuenta, self.libro, saldo_inicial, ledger=self.ledger)
+        return Cuenta(numero_cuenta, saldo_inicial, ledger=self.ledger)
+
+    @idempotente
+    @synchronized_transfer
     @log_data_changes("transferencia")
     @notify_by_email("transferencia", "transferencia")
     def transferir(self, origen, destino, monto):
         c_origen = self.cuentas[origen]
         c_destino = self.cuentas[destino]
-        c_origen.retirar(monto)
-        c_destino.depositar(monto)
+        consumo = self._consumir_limite(origen, monto)
+        try:
+            # Ambos movimientos llegan juntos a los suscriptores del libro
+            with self.ledger.agrupar():
+                c_origen.retirar(monto, contraparte=destino)
+                c_destino.depositar(monto, contraparte=origen)
+        except Exception:
+            self._devolver_limite(consumo)
+            raise
+
+    def _consumir_limite(self, origen, monto):
+        """Consumir el límite de velocidad de una transferencia (LimiteExcedido si no entra)"""
+        if self.limites is None:
+            return None
+        return self.limites.consumir('transferencia', origen, monto)
+
+    def _devolver_limite(self, consumo):
+        if consumo:
+            self.limites.devolver(consumo)
+
+    def transferir_lote(self, transferencias, atomico=True):
+        """
+        Ejecutar un lote de transferencias (origen, destino, monto).
+
+        Todo el lote se valida antes de aplicar nada, respetando el orden:
+        una transferencia puede usar fondos recibidos en otra anterior.
+        Con `atomico=True` un solo ítem inválido rechaza el lote completo
+        (ValueError); con `atomico=False` se aplican los válidos y el
+        resultado indica el estado de cada ítem.
+
+        Los registros de auditoría se escriben en una sola transacción y
+        se envía una única notificación por cuenta afectada.
+        """
+        items = [self._normalizar_transferencia(t) for t in transferencias]
+
+        with self._lock:
+            cuentas = [self.cuentas[numero] for numero in {n for item in items for n in item[:2]}
+                       if numero in self.cuentas]
+        with bloquear_cuentas(cuentas):
+            return self._transferir_lote(items, atomico)
+
+    def _transferir_lote(self, items, atomico):
+        # Validar simulando los saldos
+        saldos = {}
+        resultados = []
+        consumos = []
+        for indice, (origen, destino, monto) in enumerate(items):
+            resultado = {'indice': indice, 'origen': origen, 'destino': destino,
+                         'monto': monto, 'status': 'SUCCESS', 'error': None}
+            error = self._validar_transferencia(saldos, origen, destino, monto)
+            if not error:
+                try:
+                    consumos.append(self._consumir_limite(origen, monto))
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                resultado['status'], resultado['error'] = 'ERROR', error
+            else:
+                monto = monto_compatible(saldos[origen], monto)
+                antes = (saldos[origen], saldos[destino])
+                saldos[origen] -= monto
+                saldos[destino] += monto
+                resultado['antes'] = antes
+                resultado['despues'] = (saldos[origen], saldos[destino])
+            resultados.append(resultado)
+
+        errores = [r for r in resultados if r['status'] == 'ERROR']
+        if atomico and errores:
+            for consumo in consumos:
+                self._devolver_limite(consumo)
+            detalle = "; ".join(f"#{r['indice']}: {r['error']}" for r in errores[:10])
+            AuditService.log_change(
+                operation_type="transferencia_lote",
+                entity_type=self.__class__.__name__,
+                entity_id='unknown',
+                estado_antes={},
+                estado_despues={},
+                usuario="sistema",
+                status="ERROR",
+                error=f"{len(errores)} transferencias inválidas: {detalle}",
+                kwargs={'total': len(items)},
+                campos_modificados={}
+            )
+            raise ValueError(f"Lote rechazado, {len(errores)} transferencias inválidas: {detalle}")
+
+        # Auditar primero: si la escritura falla no se aplica nada
+        try:
+            self._auditar_lote(resultados)
+        except Exception:
+            for consumo in consumos:
+                self._devolver_limite(consumo)
+            raise
+
+        # Aplicar los ítems válidos sin pasar por los métodos decorados
+        saldos_iniciales = {numero: self.cuentas[numero].saldo for numero in saldos}
+        cuentas = self.cuentas
+        with self.ledger.agrupar():
+            for r in resultados:
+                if r['status'] == 'SUCCESS':
+                    cuentas[r['origen']]._aplicar_movimiento('transferencia', -r['monto'], r['destino'])
+                    cuentas[r['destino']]._aplicar_movimiento('transferencia', r['monto'], r['origen'])
+
+        self._notificar_lote(saldos_iniciales, saldos)
+
+        for resultado in resultados:
+            resultado.pop('antes', None)
+            resultado.pop('despues', None)
+        return resultados
+
+    @staticmethod
+    def _normalizar_transferencia(transferencia):
+        if isinstance(transferencia, dict):
+            return (transferencia['origen'], transferencia['destino'], transferencia['monto'])
+        origen, destino, monto = transferencia
+        return origen, destino, monto
+
+    def _validar_transferencia(self, saldos, origen, destino, monto):
+        """Validar un ítem del lote; devuelve el mensaje de error o None"""
+        for numero in (origen, destino):
+            if numero not in self.cuentas:
+                return f"Cuenta {numero} no encontrada"
+            if numero not in saldos:
+                saldos[numero] = self.cuentas[numero].saldo
+        if origen == destino:
+            return "Cuenta origen y destino son la misma"
+        if not self._monto_valido(monto):
+            return f"Monto inválido: {monto}"
+        if monto > saldos[origen]:
+            return "Fondos insuficientes"
+        return None
+
+    @staticmethod
+    def _monto_valido(monto):
+        """Número finito y positivo (bool no cuenta como número)"""
+        if isinstance(monto, bool) or not isinstance(monto, (int, float, Decimal)):
+            return False
+        finito = monto.is_finite() if isinstance(monto, Decimal) else math.isfinite(monto)
+        return finito and monto > 0
+
+    def _auditar_lote(self, resultados):
+        """Escribir la auditoría del lote en una sola transacción"""
+        registros = []
+        for r in resultados:
+            if r['status'] == 'SUCCESS':
+                estado_antes = {'saldo_origen': r['antes'][0], 'saldo_destino': r['antes'][1]}
+                estado_despues = {'saldo_origen': r['despues'][0], 'saldo_destino': r['despues'][1]}
+            else:
+                estado_antes, estado_despues = {}, {}
+            registros.append(AuditService.make_record(
+                operation_type="transferencia",
+                entity_type=self.__class__.__name__,
+                entity_id=r['origen'],
+                estado_antes=estado_antes,
+                estado_despues=estado_despues,
+                usuario="sistema",
+                status=r['status'],
+                error=r['error'],
+                args=(r['origen'], r['destino'], r['monto']),
+                kwargs={'lote': True}
+            ))
+        AuditService.log_batch(registros)
+
+    def _notificar_lote(self, saldos_iniciales, saldos_finales):
+        """Una notificación de saldo por cuenta afectada"""
+        for numero, saldo_final in saldos_finales.items():
+            saldo_inicial = saldos_iniciales[numero]
+            if saldo_final == saldo_inicial:
+                continue
+            EmailService.send_notification(
+                event_type="saldo_update",
+                entity=self.cuentas[numero],
+                template="saldo_update",
+                kwargs={'monto': saldo_final - saldo_inicial, 'saldo_anterior': saldo_inicial},
+                operacion="transferir_lote"
+            )
@@ -0,0 +1,76 @@
+"""
+Modelo de concurrencia del banco.
+
+Cada Cuenta tiene su propio RLock. Las operaciones que tocan varias
+cuentas toman sus locks siempre en el mismo orden (por numero_cuenta),
+con lo que no hay interbloqueos. Los decoradores de este módulo van por
+fuera de log_data_changes / notify_by_email para que el estado antes y
+después que registra la auditoría se capture con el lock tomado.
+
+Las corrutinas no esperan un lock de hilos con acquire(): bloquear_async
+lo intenta sin bloquear y, si está tomado, cede el event loop y reintenta.
+"""
+
+import asyncio
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Iterable, List
+
+from .utils import registrar_capa
+
+
+@contextmanager
+def bloquear_cuentas(cuentas: Iterable[Any]):
+    """Tomar los locks de varias cuentas en orden determinista"""
+    ordenadas = sorted({id(c): c for c in cuentas}.values(), key=lambda c: str(c.numero_cuenta))
+    tomados: List[Any] = []
+    try:
+        for cuenta in ordenadas:
+            cuenta._lock.acquire()
+            tomados.append(cuenta)
+        yield
+    finally:
+        for cuenta in reversed(tomados):
+            cuenta._lock.release()
+
+
+@asynccontextmanager
+async def bloquear_async(lock, espera_maxima: float = 0.005):
+    """
+    Tomar un lock de hilos desde una corrutina sin bloquear el event loop.
+    El bloque no debe tener awaits: con un RLock, otra tarea del mismo
+    hilo podría entrar mientras tanto.
+    """
+    espera = 0.0001
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, espera_maxima)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def synchronized(func):
+    """Ejecutar el método con el lock de la instancia (self._lock)"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return func(self, *args, **kwargs)
+    return registrar_capa(wrapper, synchronized)
+
+
+def synchronized_transfer(func):
+    """
+    Para métodos de Banco (origen, destino, ...): bloquear ambas cuentas
+    en orden. Si alguna no existe se ejecuta sin lock y el método
+    reporta el error.
+    """
+    @functools.wraps(func)
+    def wrapper(self, origen, destino, *args, **kwargs):
+        # El diccionario de cuentas se protege con el lock del banco
+        with self._lock:
+            cuentas = [self.cuentas[n] for n in (origen, destino) if n in self.cuentas]
+        with bloquear_cuentas(cuentas):
+            return func(self, origen, destino, *args, **kwargs)
+    return registrar_capa(wrapper, synchronized_transfer)
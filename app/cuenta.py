@@ -1,28 +1,88 @@
+import threading
+
+from .concurrency import bloquear_async, synchronized
 from .decorators import log_data_changes, notify_by_email
+from .idempotencia import idempotente
+from .transaccion import Ledger
 
 class Cuenta:
-    def __init__(self, numero_cuenta, saldo_inicial=0):
+    # AOP: campos que rastrea la auditoría
+    _audit_fields = ('saldo',)
+
+    def __init__(self, numero_cuenta, saldo_inicial=0, ledger=None):
         self.numero_cuenta = numero_cuenta
         self.saldo = saldo_inicial
+        self._lock = threading.RLock()
+        # Sin libro compartido (el del Banco), la cuenta lleva uno propio
+        self._ledger = ledger if ledger is not None else Ledger()
+        # Límites de velocidad opcionales (ver LimitesVelocidad.adjuntar)
+        self._limites = None
 
-    def _get_current_state(self):
-        """Método para AOP - obtener estado actual"""
-        return {
-            'numero_cuenta': self.numero_cuenta,
-            'saldo': self.saldo
-        }
-
+    @idempotente
+    @synchronized
     @log_data_changes("deposito")
     @notify_by_email("saldo_update", "saldo_update")
-    def depositar(self, monto):
-        self.saldo += monto
+    def depositar(self, monto, contraparte=None):
+        self._aplicar_movimiento('transferencia' if contraparte is not None else 'deposito',
+                                 monto, contraparte)
 
+    @idempotente
+    @synchronized
     @log_data_changes("retiro")
     @notify_by_email("saldo_update", "saldo_update")
-    def retirar(self, monto):
+    def retirar(self, monto, contraparte=None):
         if monto > self.saldo:
             raise ValueError("Fondos insuficientes")
-        self.saldo -= monto
+        self._retirar(monto, contraparte)
+
+    # Versiones asyncio: los aspectos no bloquean el event loop. El cuerpo
+    # no tiene await, así que el cambio es atómico para el loop; el lock
+    # (tomado sin bloquear el loop) lo protege de hilos que usen la API
+    # síncrona.
+    @log_data_changes("deposito")
+    @notify_by_email("saldo_update", "saldo_update")
+    async def depositar_async(self, monto, contraparte=None):
+        async with bloquear_async(self._lock):
+            self._aplicar_movimiento('transferencia' if contraparte is not None else 'deposito',
+                                     monto, contraparte)
+
+    @log_data_changes("retiro")
+    @notify_by_email("saldo_update", "saldo_update")
+    async def retirar_async(self, monto, contraparte=None):
+        async with bloquear_async(self._lock):
+            if monto > self.saldo:
+                raise ValueError("Fondos insuficientes")
+            self._retirar(monto, contraparte)
+
+    def _retirar(self, monto, contraparte):
+        # Con contraparte es parte de una transferencia, que ya consumió su límite
+        if self._limites is None or contraparte is not None:
+            self._aplicar_movimiento('transferencia' if contraparte is not None else 'retiro',
+                                     -monto, contraparte)
+            return
+        consumo = self._limites.consumir('retiro', self.numero_cuenta, monto)
+        try:
+            self._aplicar_movimiento('retiro', -monto)
+        except BaseException:
+            self._limites.devolver(consumo)
+            raise
+
+    def _aplicar_movimiento(self, tipo, monto, contraparte=None):
+        """Único punto de cambio del saldo: registra en el libro y actualiza"""
+        anterior = self.saldo
+        saldo = anterior + monto
+        # Primero el libro (y sus suscriptores): si falla, el saldo no cambia.
+        # Dentro de Ledger.agrupar() se escribe al cerrar el bloque y, si
+        # eso falla, el libro restaura el saldo anterior
+        self._ledger.registrar(tipo, self.numero_cuenta, monto, contraparte, saldo=saldo,
+                               deshacer=lambda: setattr(self, 'saldo', anterior))
+        self.saldo = saldo
+
+    def movimientos(self, desde=None, hasta=None):
+        return self._ledger.movimientos(self.numero_cuenta, desde, hasta)
+
+    def estado_de_cuenta(self, desde=None, hasta=None):
+        return self._ledger.estado_de_cuenta(self.numero_cuenta, desde, hasta)
 
     def consultar_saldo(self):
         return self.saldo
@@ -1,79 +1,229 @@
 import functools
+import inspect
 import logging
+import random
+import sys
+from contextvars import ContextVar
 from datetime import datetime
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from .email_service import EmailService
 from .audit_service import AuditService
+from .audit_state import capture_state, is_declarative, state_delta
+from .utils import capa_de, registrar_capa
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('banco_audit.log'),
-        logging.StreamHandler()
-    ]
-)
-
+# El logging se configura en el punto de entrada (ver logging_config)
 logger = logging.getLogger(__name__)
 
+# Hay una operación auditada en curso en este hilo / tarea
+_auditando: ContextVar[bool] = ContextVar('auditando', default=False)
+
+
+class AspectPolicy:
+    """
+    Política de los aspectos, configurable en tiempo de ejecución.
+
+    - disable("audit" | "email"): los métodos decorados se rearman sin ese
+      aspecto, así que la clase queda apuntando a la función original (o
+      al resto de la cadena) sin un marco extra por llamada; enable() lo
+      vuelve a poner. Afecta a las clases ya importadas.
+    - SAMPLING: fracción de operaciones que se auditan, por tipo de
+      operación ({'deposito': 0.1}); el resto corre sin auditoría.
+    - SUPPRESS_NESTED: operaciones que no se auditan cuando corren dentro
+      de otra operación auditada (True: todas). Con {'deposito', 'retiro'}
+      una transferencia deja un solo registro en vez de tres.
+
+    Los registros de deposito/retiro son los que usa reconstruccion para
+    los saldos: muestrearlos o suprimirlos la deja sin esos datos.
+    """
+    AUDIT = "audit"
+    EMAIL = "email"
+
+    SAMPLING: Dict[str, float] = {}
+    SUPPRESS_NESTED: Union[bool, Set[str]] = set()
+
+    _disabled: Set[str] = set()
+    # Métodos decorados: (módulo, qualname)
+    _targets: Set[Tuple[str, str]] = set()
+    # (clase, nombre) -> (función original, capas de afuera hacia adentro)
+    _recipes: Dict[Tuple[type, str], Tuple[Callable, List[Tuple[Optional[str], Callable]]]] = {}
+
+    @classmethod
+    def disable(cls, aspect: str):
+        cls._disabled.add(aspect)
+        cls._rebind()
+
+    @classmethod
+    def enable(cls, aspect: str):
+        cls._disabled.discard(aspect)
+        cls._rebind()
+
+    @classmethod
+    def is_enabled(cls, aspect: str) -> bool:
+        return aspect not in cls._disabled
+
+    @classmethod
+    def should_audit(cls, operation: str) -> bool:
+        """Si esta ejecución de `operation` se audita (muestreo y anidamiento)"""
+        suprimir = cls.SUPPRESS_NESTED
+        if suprimir and _auditando.get() and (suprimir is True or operation in suprimir):
+            return False
+        tasa = cls.SAMPLING.get(operation)
+        return tasa is None or random.random() < tasa
+
+    @classmethod
+    def _register(cls, func: Callable):
+        if '<locals>' not in func.__qualname__:
+            cls._targets.add((func.__module__, func.__qualname__))
+
+    @classmethod
+    def _rebind(cls):
+        """Rearmar cada método decorado con los aspectos habilitados"""
+        for modulo, qualname in list(cls._targets):
+            *ruta, nombre = qualname.split('.')
+            owner = sys.modules.get(modulo)
+            for parte in ruta:
+                owner = getattr(owner, parte, None)
+            if not isinstance(owner, type) or nombre not in owner.__dict__:
+                continue
+
+            clave = (owner, nombre)
+            if clave not in cls._recipes:
+                capas = []
+                func = owner.__dict__[nombre]
+                while (capa := capa_de(func)) is not None:
+                    capas.append(capa)
+                    func = func.__wrapped__
+                cls._recipes[clave] = (func, capas)
+
+            func, capas = cls._recipes[clave]
+            for aspecto, decorador in reversed(capas):
+                if aspecto is None or aspecto not in cls._disabled:
+                    func = decorador(func)
+            setattr(owner, nombre, func)
+
+
 def log_data_changes(operation_type: str = ""):
     """
-    Decorador para registrar cambios de datos automáticamente
+    Decorador para registrar cambios de datos automáticamente.
+    Con funciones async el registro se envía sin bloquear el event loop.
     """
     def decorator(func):
+        operacion = operation_type or func.__name__
+        AspectPolicy._register(func)
+        
+        def registro(self, args, kwargs, estado_antes, status, error=None):
+            # Obtener estado después de la operación; las entidades
+            # declarativas reportan solo su delta
+            estado_despues = capture_state(self)
+            campos_modificados = (state_delta(self, estado_antes, estado_despues)
+                                  if is_declarative(self) else None)
+            
+            return dict(
+                operation_type=operacion,
+                entity_type=self.__class__.__name__,
+                entity_id=getattr(self, 'numero_cuenta', getattr(self, 'identificacion', 'unknown')),
+                estado_antes=estado_antes,
+                estado_despues=estado_despues,
+                usuario="sistema",  # Aquí podrías obtener el usuario actual
+                status=status,
+                error=error,
+                args=args,
+                kwargs=kwargs,
+                campos_modificados=campos_modificados
+            )
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                if not AspectPolicy.should_audit(operacion):
+                    return await func(self, *args, **kwargs)
+                
+                estado_antes = capture_state(self)
+                token = _auditando.set(True)
+                try:
+                    resultado = await func(self, *args, **kwargs)
+                except Exception as e:
+                    await AuditService.log_change_async(
+                        **registro(self, args, kwargs, estado_antes, "ERROR", str(e)))
+                    raise
+                finally:
+                    _auditando.reset(token)
+                await AuditService.log_change_async(
+                    **registro(self, args, kwargs, estado_antes, "SUCCESS"))
+                return resultado
+            
+            return registrar_capa(async_wrapper, decorator, AspectPolicy.AUDIT)
+        
         @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
+            # Muestreo y operaciones anidadas (ver AspectPolicy)
+            if not AspectPolicy.should_audit(operacion):
+                return func(self, *args, **kwargs)
+            
             # Obtener estado antes de la operación
-            estado_antes = self._get_current_state() if hasattr(self, '_get_current_state') else {}
+            estado_antes = capture_state(self)
             
+            token = _auditando.set(True)
             try:
                 # Ejecutar la función original
                 resultado = func(self, *args, **kwargs)
                 
-                # Obtener estado después de la operación
-                estado_despues = self._get_current_state() if hasattr(self, '_get_current_state') else {}
-                
-                # Registrar la operación exitosa
-                AuditService.log_change(
-                    operation_type=operation_type or func.__name__,
-                    entity_type=self.__class__.__name__,
-                    entity_id=getattr(self, 'numero_cuenta', getattr(self, 'identificacion', 'unknown')),
-                    estado_antes=estado_antes,
-                    estado_despues=estado_despues,
-                    usuario="sistema",  # Aquí podrías obtener el usuario actual
-                    status="SUCCESS",
-                    args=args,
-                    kwargs=kwargs
-                )
-                
-                return resultado
-                
             except Exception as e:
-                # Registrar error
-                AuditService.log_change(
-                    operation_type=operation_type or func.__name__,
-                    entity_type=self.__class__.__name__,
-                    entity_id=getattr(self, 'numero_cuenta', getattr(self, 'identificacion', 'unknown')),
-                    estado_antes=estado_antes,
-                    estado_despues={},
-                    usuario="sistema",
-                    status="ERROR",
-                    error=str(e),
-                    args=args,
-                    kwargs=kwargs
-                )
+                # Registrar error (el estado posterior muestra si algo alcanzó a cambiar)
+                AuditService.log_change(**registro(self, args, kwargs, estado_antes, "ERROR", str(e)))
                 raise
+            
+            finally:
+                _auditando.reset(token)
+            
+            # Registrar la operación exitosa
+            AuditService.log_change(**registro(self, args, kwargs, estado_antes, "SUCCESS"))
+            return resultado
                 
-        return wrapper
+        return registrar_capa(wrapper, decorator, AspectPolicy.AUDIT)
     return decorator
 
 def notify_by_email(event_type: str = "", template: str = "default"):
     """
-    Decorador para envío automático de emails
+    Decorador para envío automático de emails.
+    Con funciones async el envío no bloquea el event loop.
     """
     def decorator(func):
+        AspectPolicy._register(func)
+        
+        if inspect.iscoroutinefunction(func):
+            # depositar_async -> depositar: la plantilla usa el nombre de la operación
+            operacion = func.__name__.removesuffix('_async')
+            
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                try:
+                    resultado = await func(self, *args, **kwargs)
+                except Exception as e:
+                    if event_type in ['transferencia', 'login', 'update_administrativo']:
+                        await EmailService.send_error_notification_async(
+                            event_type=event_type,
+                            entity=self,
+                            error=str(e),
+                            args=args,
+                            kwargs=kwargs
+                        )
+                    raise
+                
+                await EmailService.send_notification_async(
+                    event_type=event_type or operacion,
+                    entity=self,
+                    template=template,
+                    args=args,
+                    kwargs=kwargs,
+                    resultado=resultado,
+                    operacion=operacion
+                )
+                return resultado
+            
+            return registrar_capa(async_wrapper, decorator, AspectPolicy.EMAIL)
+        
         @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
             try:
@@ -87,7 +237,8 @@ def notify_by_email(event_type: str = "", template: str = "default"):
                     template=template,
                     args=args,
                     kwargs=kwargs,
-                    resultado=resultado
+                    resultado=resultado,
+                    operacion=func.__name__
                 )
                 
                 return resultado
@@ -104,5 +255,5 @@ def notify_by_email(event_type: str = "", template: str = "default"):
                     )
                 raise
                 
-        return wrapper
+        return registrar_capa(wrapper, decorator, AspectPolicy.EMAIL)
     return decorator
@@ -0,0 +1,123 @@
+import heapq
+import threading
+import time
+from numbers import Number
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .utils import monto_compatible
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Digest:
+    """Eventos agrupados de una cuenta dentro de una ventana"""
+
+    __slots__ = ('to_email', 'event_type', 'first', 'last', 'count',
+                 'total_monto', 'destinos', 'deadline')
+
+    def __init__(self, to_email: str, event_type: str, data: Dict[str, Any], deadline: float):
+        self.to_email = to_email
+        self.event_type = event_type
+        self.first = data
+        self.last = data
+        self.count = 0
+        self.total_monto = 0
+        self.destinos: List[Any] = []
+        self.deadline = deadline
+
+    def add(self, data: Dict[str, Any]):
+        self.last = data
+        self.count += 1
+        monto = data.get('monto')
+        # Decimal incluido (saldos de LibroCuentas); bool no es un monto
+        if isinstance(monto, Number) and not isinstance(monto, bool):
+            self.total_monto += monto_compatible(self.total_monto, monto)
+        destino = data.get('cuenta_destino')
+        if destino is not None and destino not in self.destinos:
+            self.destinos.append(destino)
+
+
+class NotificationCoalescer:
+    """
+    Agrupa notificaciones por clave (cuenta y tipo de evento).
+
+    El primer evento de una clave abre una ventana de `window` segundos;
+    los eventos que llegan dentro de ella se fusionan y, al cerrarse, se
+    entrega un único Digest a `emit`. Un hilo temporizador cierra las
+    ventanas vencidas.
+    """
+
+    def __init__(self, window: float, emit: Callable[[Digest], None]):
+        self.window = window
+        self.emit = emit
+
+        self._pending: Dict[Tuple, Digest] = {}
+        self._deadlines: List[Tuple[float, Tuple]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.events = 0
+        self.digests = 0
+
+        self._thread = threading.Thread(target=self._run, name="email-coalescer", daemon=True)
+        self._thread.start()
+
+    def add(self, key: Tuple, to_email: str, event_type: str, data: Dict[str, Any]):
+        """Agregar un evento a la ventana abierta de su clave (o abrir una)"""
+        with self._cond:
+            digest = self._pending.get(key)
+            if digest is None:
+                deadline = time.monotonic() + self.window
+                digest = Digest(to_email, event_type, data, deadline)
+                self._pending[key] = digest
+                heapq.heappush(self._deadlines, (deadline, key))
+                self._cond.notify()
+            digest.add(data)
+            self.events += 1
+
+    def flush(self):
+        """Entregar ya todas las ventanas abiertas"""
+        with self._cond:
+            digests = list(self._pending.values())
+            self._pending.clear()
+            self._deadlines.clear()
+        for digest in digests:
+            self._emit(digest)
+
+    def close(self):
+        """Entregar lo pendiente y detener el temporizador"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            due: List[Digest] = []
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    while self._deadlines and self._deadlines[0][0] <= now:
+                        _, key = heapq.heappop(self._deadlines)
+                        digest = self._pending.pop(key, None)
+                        if digest is not None:
+                            due.append(digest)
+                    if due:
+                        break
+                    timeout: Optional[float] = None
+                    if self._deadlines:
+                        timeout = self._deadlines[0][0] - now
+                    self._cond.wait(timeout)
+                if self._closed and not due:
+                    return
+            for digest in due:
+                self._emit(digest)
+
+    def _emit(self, digest: Digest):
+        try:
+            self.emit(digest)
+            self.digests += 1
+        except Exception as e:
+            logger.error(f"Error enviando resumen de notificaciones a {digest.to_email}: {e}")
@@ -0,0 +1,365 @@
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .utils import ConnectionManager
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LoggingTransport:
+    """Transporte de desarrollo: solo registra el email en el log"""
+
+    def send(self, to_email: str, subject: str, body: str):
+        logger.info("EMAIL TO: %s - %s", to_email, subject)
+        logger.debug("BODY: %s", body)
+
+    def close(self):
+        pass
+
+
+class SMTPTransport:
+    """
+    Transporte SMTP con conexión persistente.
+    La sesión (conexión, STARTTLS y login) se abre una vez y se reutiliza
+    para todos los mensajes; si el servidor la cierra se reconecta.
+    """
+
+    def __init__(self, host: str, port: int, sender: str,
+                 user: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._server: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        return server
+
+    def send(self, to_email: str, subject: str, body: str):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        text = msg.as_string()
+
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.sendmail(self.sender, to_email, text)
+        except smtplib.SMTPServerDisconnected:
+            # La sesión expiró del lado del servidor: reconectar una vez
+            self._server = self._connect()
+            self._server.sendmail(self.sender, to_email, text)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class EmailOutbox:
+    """
+    Bandeja de salida persistente para emails.
+
+    `enqueue` solo agrega el mensaje a una lista en memoria: el hilo
+    despachador lo guarda en SQLite (un commit por tanda de mensajes) y
+    reparte los vencidos entre `workers` hilos, cada uno con su propio
+    transporte (y conexión SMTP) de larga duración. Lo encolado que aún
+    no llegó a SQLite se guarda al cerrar; una caída del proceso antes de
+    eso lo pierde.
+    Los envíos fallidos se reintentan con backoff exponencial hasta
+    `max_attempts`; lo pendiente sobrevive a reinicios del proceso.
+    """
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            created_at REAL NOT NULL,
+            last_error TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON email_outbox (status, next_attempt)",
+    )
+
+    def __init__(self, db_path: str, transport_factory: Callable[[], Any],
+                 workers: int = 2, max_attempts: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 300.0,
+                 poll_interval: float = 1.0):
+        self.db_path = db_path
+        self.transport_factory = transport_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+
+        self._manager = ConnectionManager(db_path, self.SCHEMA)
+        self._work: queue.Queue = queue.Queue(maxsize=workers * 4)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._threads: List[threading.Thread] = []
+        # Encolados que el despachador todavía no guardó en SQLite
+        self._nuevos: List[Tuple[str, str, str, float, float]] = []
+        self._sin_guardar = 0  # incluye la tanda que se está guardando
+        self._nuevos_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'sent': 0,
+            'retried': 0,
+            'failed': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+        }
+
+    def start(self):
+        """Arrancar despachador y workers"""
+        if self._threads:
+            return
+
+        # Mensajes que quedaron "en envío" en una ejecución anterior
+        conn = self._manager.get_connection()
+        with conn:
+            conn.execute("UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'")
+
+        self._stop.clear()
+        dispatcher = threading.Thread(target=self._dispatch, name="email-dispatcher", daemon=True)
+        self._threads.append(dispatcher)
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker, name=f"email-worker-{i}",
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, to_email: str, subject: str, body: str):
+        """Agregar un email a la bandeja de salida (sin E/S en el hilo que llama)"""
+        now = time.time()
+        with self._nuevos_lock:
+            self._nuevos.append((to_email, subject, body, now, now))
+            self._sin_guardar += 1
+        with self._metrics_lock:
+            self._metrics['enqueued'] += 1
+        if not self._threads:
+            # Sin despachador nadie más lo guardaría
+            self._persist(self._manager.get_connection())
+        self._wakeup.set()
+
+    def _persist(self, conn):
+        """Guardar en SQLite lo encolado en memoria, en una sola transacción"""
+        with self._nuevos_lock:
+            nuevos, self._nuevos = self._nuevos, []
+        if not nuevos:
+            return
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO email_outbox (to_email, subject, body, next_attempt, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', nuevos)
+        except Exception:
+            # Se reintenta en la próxima vuelta
+            with self._nuevos_lock:
+                self._nuevos[:0] = nuevos
+            raise
+        with self._nuevos_lock:
+            self._sin_guardar -= len(nuevos)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que no queden mensajes vencidos pendientes ni en envío"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        conn = self._manager.get_connection()
+
+        while True:
+            with self._idle:
+                # Primero lo que está en memoria: se descuenta recién después del commit
+                with self._nuevos_lock:
+                    due = self._sin_guardar
+                due += conn.execute(
+                    "SELECT COUNT(*) FROM email_outbox WHERE status = 'pending' AND next_attempt <= ?",
+                    (time.time(),)).fetchone()[0]
+                if due == 0 and self._in_flight == 0 and self._work.empty():
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.set()
+                self._idle.wait(0.05 if remaining is None else min(0.05, remaining))
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Intentar enviar lo vencido y detener los hilos (lo demás queda persistido)"""
+        if self._threads:
+            self.flush(timeout)
+            self._stop.set()
+            self._wakeup.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            vivos = [t for t in self._threads if t.is_alive()]
+            self._threads = []
+        else:
+            vivos = []
+        try:
+            self._persist(self._manager.get_connection())
+        except Exception as e:
+            logger.error(f"Error guardando emails encolados al cerrar: {e}")
+        if vivos:
+            # Un worker sigue esperando al servidor SMTP: al terminar ese
+            # envío ve _stop y sale; su conexión a la base sigue siendo válida
+            logger.warning("%d hilos de email siguen activos al cerrar", len(vivos))
+            return
+        self._manager.close_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de entrega"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        conn = self._manager.get_connection()
+        for status, count in conn.execute(
+                "SELECT status, COUNT(*) FROM email_outbox GROUP BY status"):
+            metrics[f'queue_{status}'] = count
+        sent = metrics['sent']
+        metrics['avg_latency'] = metrics['total_latency'] / sent if sent else 0.0
+        return metrics
+
+    def _dispatch(self):
+        conn = self._manager.get_connection()
+
+        while not self._stop.is_set():
+            # Limpiar antes de consultar: un enqueue concurrente vuelve a
+            # activar el evento y no se pierde
+            self._wakeup.clear()
+            try:
+                self._persist(conn)
+            except Exception as e:
+                logger.error(f"Error guardando emails encolados: {e}")
+            try:
+                self._claim(conn)
+            except Exception as e:
+                # Base ocupada o con errores: reintentar en la próxima vuelta
+                logger.error(f"Error reclamando emails pendientes: {e}")
+                self._wakeup.wait(self.poll_interval)
+
+    def _claim(self, conn):
+        """Pasar los mensajes vencidos a los workers y esperar la próxima vuelta"""
+        free = self._work.maxsize - self._work.qsize()
+        rows: List[Tuple] = []
+        if free > 0:
+            # Reclamar y contar como "en vuelo" de forma atómica para flush()
+            with self._idle, conn:
+                rows = conn.execute('''
+                    SELECT id, to_email, subject, body, attempts, created_at
+                    FROM email_outbox
+                    WHERE status = 'pending' AND next_attempt <= ?
+                    ORDER BY next_attempt
+                    LIMIT ?
+                ''', (time.time(), free)).fetchall()
+                conn.executemany("UPDATE email_outbox SET status = 'sending' WHERE id = ?",
+                                 [(row[0],) for row in rows])
+                self._in_flight += len(rows)
+
+        for row in rows:
+            self._work.put(row)
+
+        if free == 0 or len(rows) < free:
+            # Nada más vencido (o workers ocupados): dormir hasta el
+            # próximo reintento, un enqueue o una entrega terminada
+            self._wakeup.wait(self._next_wait(conn) if free else self.poll_interval)
+
+    def _next_wait(self, conn) -> float:
+        row = conn.execute(
+            "SELECT MIN(next_attempt) FROM email_outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, row[0] - time.time()))
+
+    def _worker(self):
+        transport = self.transport_factory()
+        conn = self._manager.get_connection()
+
+        try:
+            while not self._stop.is_set():
+                try:
+                    row = self._work.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                try:
+                    self._deliver(conn, transport, row)
+                except Exception as e:
+                    # Falló el registro en la base: el mensaje queda 'sending'
+                    # y se reintenta al reiniciar (puede duplicarse si ya salió)
+                    logger.error(f"Error registrando la entrega del email {row[0]}: {e}")
+                finally:
+                    with self._idle:
+                        self._in_flight -= 1
+                        self._idle.notify_all()
+                    self._wakeup.set()
+        finally:
+            transport.close()
+
+    def _deliver(self, conn, transport, row):
+        message_id, to_email, subject, body, attempts, created_at = row
+        try:
+            transport.send(to_email, subject, body)
+        except Exception as e:
+            attempts += 1
+            # La conexión puede haber quedado inutilizable
+            transport.close()
+
+            if attempts >= self.max_attempts:
+                status, next_attempt = 'failed', time.time()
+                metric = 'failed'
+                logger.error(f"Email {message_id} a {to_email} descartado tras {attempts} intentos: {e}")
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                status, next_attempt = 'pending', time.time() + delay * random.uniform(0.8, 1.2)
+                metric = 'retried'
+                logger.warning(f"Reintentando email {message_id} a {to_email} en {delay:.1f}s: {e}")
+
+            with conn:
+                conn.execute('''
+                    UPDATE email_outbox
+                    SET status = ?, attempts = ?, next_attempt = ?, last_error = ?
+                    WHERE id = ?
+                ''', (status, attempts, next_attempt, str(e), message_id))
+            with self._metrics_lock:
+                self._metrics[metric] += 1
+            return
+
+        # Entregado: sale de la bandeja (las métricas guardan el histórico)
+        sent_at = time.time()
+        with conn:
+            conn.execute("DELETE FROM email_outbox WHERE id = ?", (message_id,))
+        latency = sent_at - created_at
+        with self._metrics_lock:
+            self._metrics['sent'] += 1
+            self._metrics['total_latency'] += latency
+            self._metrics['max_latency'] = max(self._metrics['max_latency'], latency)
@@ -1,11 +1,17 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, Tuple
 import json
 from datetime import datetime
 import logging
 
+from .email_digest import Digest, NotificationCoalescer
+from .email_outbox import EmailOutbox, LoggingTransport, SMTPTransport
+from .utils import monto_compatible
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
@@ -14,6 +20,34 @@ class EmailService:
     SMTP_PORT = 587
     EMAIL_USER = "tu_email@gmail.com"  # Configurar
     EMAIL_PASSWORD = "tu_password"      # Configurar
+    SMTP_USE_TLS = True
+    
+    # "log" solo registra los emails (desarrollo), "smtp" los envía
+    TRANSPORT = "log"
+    
+    # Bandeja de salida asíncrona: los emails se encolan y se entregan en
+    # segundo plano reutilizando conexiones SMTP (ver EmailOutbox)
+    USE_OUTBOX = True
+    OUTBOX_DB_PATH = "email_outbox.db"
+    OUTBOX_OPTIONS: Dict[str, Any] = {
+        'workers': 2,
+        'max_attempts': 5,
+        'backoff_base': 1.0,
+    }
+    
+    # Agrupación por cuenta: los eventos de COALESCE_EVENTS que ocurren
+    # dentro de la ventana (segundos) se envían como un solo resumen.
+    # 0 = desactivada. Los errores siempre se envían de inmediato.
+    COALESCE_WINDOW = 0.0
+    COALESCE_EVENTS = ('saldo_update', 'transferencia')
+    
+    _coalescer: Optional[NotificationCoalescer] = None
+    _outbox: Optional[EmailOutbox] = None
+    _outbox_pid: Optional[int] = None
+    _outbox_lock = threading.Lock()
+    _transport = None
+    # Hilo de E/S para las versiones async (send_notification_async)
+    _executor: Optional[ThreadPoolExecutor] = None
     
     # Templates de emails
     TEMPLATES = {
@@ -93,63 +127,180 @@ class EmailService:
     @classmethod
     def send_notification(cls, event_type: str, entity: Any, template: str = "default",
                          args: Optional[Tuple] = None, kwargs: Optional[Dict] = None, 
-                         resultado: Any = None):
+                         resultado: Any = None, operacion: Optional[str] = None):
         """Enviar notificación por email"""
         
         try:
-            # Obtener email del cliente (esto debe implementarse según tu lógica)
-            email_destino = cls._get_client_email(entity)
-            
-            if not email_destino:
-                logger.warning(f"No se pudo obtener email para notificación {event_type}")
+            mensaje = cls._compose_notification(event_type, entity, args, kwargs, resultado,
+                                                operacion)
+            if mensaje is None:
                 return
             
-            # Preparar contenido del email
-            template_data = cls._prepare_template_data(event_type, entity, args, kwargs, resultado)
+            email_destino, subject, body = mensaje
+            cls._send_email(email_destino, subject, body)
             
-            if event_type in cls.TEMPLATES:
-                template_info = cls.TEMPLATES[event_type]
-                subject = template_info['subject']
-                body = template_info['body'].format(**template_data)
-            else:
-                subject = f"Notificación - {event_type}"
-                body = f"Se ha ejecutado la operación: {event_type}\nDetalles: {json.dumps(template_data, indent=2)}"
+            logger.info("Email enviado para %s a %s", event_type, email_destino)
             
-            cls._send_email(email_destino, subject, body)
+        except Exception as e:
+            logger.error(f"Error enviando email para {event_type}: {str(e)}")
+    
+    @classmethod
+    async def send_notification_async(cls, event_type: str, entity: Any, template: str = "default",
+                                      args: Optional[Tuple] = None, kwargs: Optional[Dict] = None,
+                                      resultado: Any = None, operacion: Optional[str] = None):
+        """
+        Versión para asyncio: el email se arma en el event loop (con el estado
+        actual de la entidad) y solo el encolado o envío corre en el hilo de
+        EmailService.
+        """
+        
+        try:
+            mensaje = cls._compose_notification(event_type, entity, args, kwargs, resultado,
+                                                operacion)
+            if mensaje is None:
+                return
             
-            logger.info(f"Email enviado para {event_type} a {email_destino}")
+            email_destino, subject, body = mensaje
+            await cls._run_blocking(cls._send_email, email_destino, subject, body)
+            
+            logger.info("Email enviado para %s a %s", event_type, email_destino)
             
         except Exception as e:
             logger.error(f"Error enviando email para {event_type}: {str(e)}")
     
+    @classmethod
+    def _compose_notification(cls, event_type: str, entity: Any, args: Optional[Tuple],
+                              kwargs: Optional[Dict], resultado: Any,
+                              operacion: Optional[str]) -> Optional[Tuple[str, str, str]]:
+        """(destino, asunto, cuerpo); None si no hay destino o el evento quedó agrupado"""
+        # Obtener email del cliente (esto debe implementarse según tu lógica)
+        email_destino = cls._get_client_email(entity)
+        
+        if not email_destino:
+            logger.warning(f"No se pudo obtener email para notificación {event_type}")
+            return None
+        
+        # Preparar contenido del email
+        template_data = cls._prepare_template_data(event_type, entity, args, kwargs, resultado,
+                                                   operacion)
+        
+        if cls.COALESCE_WINDOW > 0 and event_type in cls.COALESCE_EVENTS:
+            cuenta = template_data.get('numero_cuenta', template_data.get('cuenta_origen'))
+            cls._get_coalescer().add((event_type, cuenta, email_destino),
+                                     email_destino, event_type, template_data)
+            return None
+        
+        subject, body = cls._render(event_type, template_data)
+        return email_destino, subject, body
+    
     @classmethod
     def send_error_notification(cls, event_type: str, entity: Any, error: str,
                                args: Optional[Tuple] = None, kwargs: Optional[Dict] = None):
         """Enviar notificación de error"""
         
         try:
-            email_destino = cls._get_client_email(entity)
-            
-            if not email_destino:
+            mensaje = cls._compose_error(event_type, entity, error)
+            if mensaje is None:
                 return
             
-            template_data = {
-                'operacion': event_type,
-                'error': error,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            cls._send_email(*mensaje)
             
-            template_info = cls.TEMPLATES['error']
-            subject = template_info['subject']
-            body = template_info['body'].format(**template_data)
+            logger.info("Email de error enviado para %s a %s", event_type, mensaje[0])
             
-            cls._send_email(email_destino, subject, body)
+        except Exception as e:
+            logger.error(f"Error enviando email de error: {str(e)}")
+    
+    @classmethod
+    async def send_error_notification_async(cls, event_type: str, entity: Any, error: str,
+                                            args: Optional[Tuple] = None,
+                                            kwargs: Optional[Dict] = None):
+        """Versión para asyncio de send_error_notification"""
+        
+        try:
+            mensaje = cls._compose_error(event_type, entity, error)
+            if mensaje is None:
+                return
+            
+            await cls._run_blocking(cls._send_email, *mensaje)
             
-            logger.info(f"Email de error enviado para {event_type} a {email_destino}")
+            logger.info("Email de error enviado para %s a %s", event_type, mensaje[0])
             
         except Exception as e:
             logger.error(f"Error enviando email de error: {str(e)}")
     
+    @classmethod
+    def _compose_error(cls, event_type: str, entity: Any,
+                       error: str) -> Optional[Tuple[str, str, str]]:
+        email_destino = cls._get_client_email(entity)
+        
+        if not email_destino:
+            return None
+        
+        template_data = {
+            'operacion': event_type,
+            'error': error,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        template_info = cls.TEMPLATES['error']
+        subject = template_info['subject']
+        body = template_info['body'].format(**template_data)
+        return email_destino, subject, body
+    
+    @classmethod
+    async def _run_blocking(cls, func, *args):
+        """Ejecutar E/S bloqueante en el hilo de EmailService sin bloquear el event loop"""
+        with cls._outbox_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-async")
+            executor = cls._executor
+        await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    
+    @classmethod
+    def _render(cls, event_type: str, template_data: Dict[str, Any]) -> Tuple[str, str]:
+        """Generar asunto y cuerpo a partir de TEMPLATES"""
+        if event_type in cls.TEMPLATES:
+            template_info = cls.TEMPLATES[event_type]
+            subject = template_info['subject']
+            body = template_info['body'].format(**template_data)
+        else:
+            subject = f"Notificación - {event_type}"
+            body = f"Se ha ejecutado la operación: {event_type}\nDetalles: {json.dumps(template_data, indent=2, default=str)}"
+        return subject, body
+    
+    @classmethod
+    def _get_coalescer(cls) -> NotificationCoalescer:
+        with cls._outbox_lock:
+            if cls._coalescer is None:
+                cls._coalescer = NotificationCoalescer(cls.COALESCE_WINDOW, cls._send_digest)
+            return cls._coalescer
+    
+    @classmethod
+    def _send_digest(cls, digest: Digest):
+        """Enviar el resumen de los eventos agrupados de una cuenta"""
+        if digest.count == 1:
+            subject, body = cls._render(digest.event_type, digest.last)
+            cls._send_email(digest.to_email, subject, body)
+            return
+        
+        first, last = digest.first, digest.last
+        data = dict(last)
+        data['timestamp'] = f"{first['timestamp']} - {last['timestamp']}"
+        
+        if digest.event_type == 'saldo_update':
+            neto = last['saldo_actual'] - first['saldo_anterior']
+            data['saldo_anterior'] = first['saldo_anterior']
+            data['operacion'] = f"{digest.count} movimientos, cambio neto {neto:+}"
+        elif digest.event_type == 'transferencia':
+            data['monto'] = digest.total_monto
+            data['cuenta_destino'] = ", ".join(str(d) for d in digest.destinos)
+        
+        subject, body = cls._render(digest.event_type, data)
+        cls._send_email(digest.to_email, f"{subject} ({digest.count} operaciones)", body)
+        
+        logger.info("Resumen de %d eventos %s enviado a %s", digest.count, digest.event_type,
+                    digest.to_email)
+    
     @classmethod
     def _get_client_email(cls, entity) -> str:
         """Obtener email del cliente - implementar según tu lógica"""
@@ -164,7 +315,7 @@ class EmailService:
     @classmethod
     def _prepare_template_data(cls, event_type: str, entity: Any, 
                               args: Optional[Tuple], kwargs: Optional[Dict], 
-                              resultado: Any) -> Dict[str, Any]:
+                              resultado: Any, operacion: Optional[str] = None) -> Dict[str, Any]:
         """Preparar datos para el template del email"""
         
         data = {
@@ -187,38 +338,87 @@ class EmailService:
                 'cuenta_destino': args[1] if len(args) > 1 else 'N/A',
                 'monto': args[2] if len(args) > 2 else 'N/A'
             })
+            cuentas = getattr(entity, 'cuentas', {})
+            if data['cuenta_origen'] in cuentas:
+                data['nuevo_saldo'] = cuentas[data['cuenta_origen']].saldo
+            else:
+                data['nuevo_saldo'] = 'N/A'
+        
+        if event_type == 'saldo_update' and 'saldo_actual' in data:
+            monto = monto_compatible(data['saldo_actual'],
+                                     args[0] if args else (kwargs or {}).get('monto', 0))
+            data['monto'] = monto
+            data['operacion'] = operacion or event_type
+            # El saldo anterior se deduce del movimiento ya aplicado
+            if kwargs and 'saldo_anterior' in kwargs:
+                data['saldo_anterior'] = kwargs['saldo_anterior']
+            elif operacion == 'retirar':
+                data['saldo_anterior'] = data['saldo_actual'] + monto
+            else:
+                data['saldo_anterior'] = data['saldo_actual'] - monto
         
         return data
     
+    @classmethod
+    def _create_transport(cls):
+        """Crear el transporte configurado en TRANSPORT"""
+        if cls.TRANSPORT == "smtp":
+            return SMTPTransport(cls.SMTP_SERVER, cls.SMTP_PORT, cls.EMAIL_USER,
+                                 user=cls.EMAIL_USER, password=cls.EMAIL_PASSWORD,
+                                 use_tls=cls.SMTP_USE_TLS)
+        return LoggingTransport()
+    
+    @classmethod
+    def get_outbox(cls) -> EmailOutbox:
+        """Bandeja de salida del proceso (se arranca la primera vez)"""
+        if cls._outbox is None or cls._outbox_pid != os.getpid():
+            with cls._outbox_lock:
+                if cls._outbox is None or cls._outbox_pid != os.getpid():
+                    outbox = EmailOutbox(cls.OUTBOX_DB_PATH, cls._create_transport,
+                                         **cls.OUTBOX_OPTIONS)
+                    outbox.start()
+                    cls._outbox = outbox
+                    cls._outbox_pid = os.getpid()
+        return cls._outbox
+    
+    @classmethod
+    def close(cls):
+        """Enviar resúmenes pendientes, detener la bandeja de salida y cerrar conexiones SMTP"""
+        coalescer = cls._coalescer
+        cls._coalescer = None
+        if coalescer is not None:
+            coalescer.close()
+        
+        executor = cls._executor
+        cls._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        
+        with cls._outbox_lock:
+            if cls._outbox is not None and cls._outbox_pid == os.getpid():
+                cls._outbox.close()
+            cls._outbox = None
+            cls._outbox_pid = None
+            if cls._transport is not None:
+                cls._transport.close()
+                cls._transport = None
+    
     @classmethod
     def _send_email(cls, to_email: str, subject: str, body: str):
-        """Enviar email usando SMTP"""
+        """Enviar email: se encola en la bandeja de salida o se entrega en línea"""
         
-        # En desarrollo, solo loggear el email
-        logger.info(f"EMAIL TO: {to_email}")
-        logger.info(f"SUBJECT: {subject}")
-        logger.info(f"BODY: {body}")
-        logger.info("=" * 50)
+        if cls.USE_OUTBOX:
+            cls.get_outbox().enqueue(to_email, subject, body)
+            return
         
-        # Para producción, descomentar el código SMTP:
-        """
+        if cls._transport is None:
+            cls._transport = cls._create_transport()
         try:
-            msg = MIMEMultipart()
-            msg['From'] = cls.EMAIL_USER
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(cls.SMTP_SERVER, cls.SMTP_PORT)
-            server.starttls()
-            server.login(cls.EMAIL_USER, cls.EMAIL_PASSWORD)
-            
-            text = msg.as_string()
-            server.sendmail(cls.EMAIL_USER, to_email, text)
-            server.quit()
-            
+            cls._transport.send(to_email, subject, body)
         except Exception as e:
             logger.error(f"Error enviando email SMTP: {str(e)}")
+            cls._transport.close()
             raise
-        """
\ No newline at end of file
+
+
+atexit.register(EmailService.close)
@@ -0,0 +1,260 @@
+"""
+Generación masiva de estados de cuenta.
+
+generar_extractos() escribe un estado de cuenta por cada cuenta del
+Banco, en texto (`<numero>.txt`) y/o CSV (`<numero>.csv`), para un período
+[desde, hasta). Las cuentas se ordenan por número y se reparten en lotes
+de rangos consecutivos; cada lote se procesa en un proceso del pool:
+
+- el proceso principal extrae del Ledger solo las columnas del período de
+  las cuentas del lote (Ledger.columnas) y se las envía al trabajador
+- el trabajador da formato y escribe los archivos en `lote-NNNNN/` y al
+  terminar deja la marca `lote-NNNNN.ok` con las cuentas que escribió
+
+Como mucho hay 2 lotes por proceso en vuelo, así que la memoria depende
+del tamaño del lote y no de la cantidad de cuentas. El manifiesto
+(`manifiesto.json`) guarda el período y los límites de los lotes: si la
+generación se interrumpe, volver a llamarla con el mismo directorio salta
+los lotes marcados y continúa con el resto; un lote marcado al que se le
+agregaron cuentas desde entonces se vuelve a generar.
+
+El Ledger solo tiene los movimientos desde que se creó el banco en este
+proceso (Ledger.inicio): en un banco cargado con BancoStore.cargar los
+anteriores no están. Si el período empieza antes, se avisa en el log, el
+resultado lo indica con `incompleto` y los estados muestran como inicio
+del período el del libro, con el saldo de ese momento.
+
+Para probarlo con un banco sintético: python -m benchmarks.extractos
+
+    generar_extractos(banco, "extractos/2026-10", desde=datetime(2026, 10, 1),
+                      hasta=datetime(2026, 11, 1))
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+import time
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .transaccion import Columnas, Fecha, Ledger, redondear_centavos, texto_centavos
+
+import logging
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('txt', 'csv')
+MANIFIESTO = "manifiesto.json"
+
+# (numero_cuenta, columnas del período)
+Extracto = Tuple[str, Columnas]
+
+
+def _epoch(fecha: Optional[Fecha]) -> Optional[float]:
+    if fecha is None:
+        return None
+    return fecha.timestamp() if isinstance(fecha, datetime) else float(fecha)
+
+
+def _texto_fecha(epoch: Optional[float]) -> str:
+    return "-" if epoch is None else time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch))
+
+
+def _escribir_texto(ruta: str, numero: str, columnas: Columnas,
+                    desde: Optional[float], hasta: Optional[float]):
+    saldo_inicial, fechas, montos, saldos, tipos, contrapartes = columnas
+    lineas = [f"Estado de cuenta {numero}",
+              f"Período: {_texto_fecha(desde)} a {_texto_fecha(hasta)}",
+              f"Saldo inicial: {texto_centavos(saldo_inicial)}", ""]
+
+    neto = 0
+    ultimo_segundo, texto_fecha = None, ""
+    for i, fecha in enumerate(fechas):
+        # Formatear la fecha una vez por segundo, no por movimiento
+        segundo = int(fecha)
+        if segundo != ultimo_segundo:
+            ultimo_segundo = segundo
+            texto_fecha = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(segundo))
+
+        monto = montos[i]
+        neto += monto
+        contraparte = contrapartes[i]
+        detalle = "" if contraparte is None else f" {'a' if monto < 0 else 'de'} {contraparte}"
+        lineas.append(f"{texto_fecha}  {Ledger.TIPOS[tipos[i]]:<13} "
+                      f"{texto_centavos(monto, True):>14} {texto_centavos(saldos[i]):>14}{detalle}")
+
+    lineas.append("")
+    lineas.append(f"Movimientos: {len(fechas)}  Neto: {texto_centavos(neto, True)}  "
+                  f"Saldo final: {texto_centavos(saldo_inicial + neto)}")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lineas))
+        f.write("\n")
+
+
+def _escribir_csv(ruta: str, columnas: Columnas):
+    _, fechas, montos, saldos, tipos, contrapartes = columnas
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(('fecha', 'tipo', 'monto', 'saldo', 'contraparte'))
+        tipos_texto = Ledger.TIPOS
+        escritor.writerows(
+            (datetime.fromtimestamp(fechas[i]).isoformat(timespec='seconds'),
+             tipos_texto[tipos[i]], texto_centavos(montos[i]), texto_centavos(saldos[i]),
+             contrapartes[i] or "")
+            for i in range(len(fechas)))
+
+
+def _generar_lote(directorio: str, lote: int, extractos: List[Extracto], formatos: Sequence[str],
+                  desde: Optional[float], hasta: Optional[float]) -> Tuple[int, int]:
+    """Escribir los estados de un lote (corre en el pool); devuelve (cuentas, movimientos)"""
+    carpeta = os.path.join(directorio, f"lote-{lote:05d}")
+    os.makedirs(carpeta, exist_ok=True)
+
+    movimientos = 0
+    for numero, columnas in extractos:
+        movimientos += len(columnas[1])
+        base = os.path.join(carpeta, str(numero))
+        if 'txt' in formatos:
+            _escribir_texto(base + ".txt", numero, columnas, desde, hasta)
+        if 'csv' in formatos:
+            _escribir_csv(base + ".csv", columnas)
+
+    # La marca se escribe al final: un lote sin marca se vuelve a generar
+    marca = os.path.join(directorio, f"lote-{lote:05d}.ok")
+    with open(marca + ".tmp", 'w') as f:
+        json.dump({'cuentas': len(extractos), 'movimientos': movimientos,
+                   'numeros': [str(numero) for numero, _ in extractos]}, f)
+    os.replace(marca + ".tmp", marca)
+    return len(extractos), movimientos
+
+
+def _manifiesto(directorio: str, numeros: List[str], cuentas_por_lote: int,
+                periodo: Dict[str, Any], reanudar: bool) -> List[str]:
+    """Límites de los lotes (primer número de cada uno), nuevos o del manifiesto previo"""
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if reanudar and os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            previo = json.load(f)
+        if previo['periodo'] != periodo:
+            raise ValueError(f"{directorio} tiene estados de otro período o formato; "
+                             f"usar otro directorio o reanudar=False")
+        return previo['limites']
+
+    for nombre in os.listdir(directorio):
+        if nombre.startswith("lote-") and nombre.endswith(".ok"):
+            os.remove(os.path.join(directorio, nombre))
+
+    limites = numeros[::cuentas_por_lote]
+    with open(ruta + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'periodo': periodo, 'limites': limites}, f)
+    os.replace(ruta + ".tmp", ruta)
+    return limites
+
+
+def _lote_completo(directorio: str, lote: int, numeros: List[Any]) -> bool:
+    """Si la marca del lote existe e incluye todas sus cuentas actuales"""
+    marca = os.path.join(directorio, f"lote-{lote:05d}.ok")
+    try:
+        with open(marca, encoding='utf-8') as f:
+            escritas = json.load(f).get('numeros')
+    except FileNotFoundError:
+        return False
+    # Marcas sin la lista de cuentas: no se puede saber, se regenera
+    return escritas is not None and {str(n) for n in numeros} <= set(escritas)
+
+
+def generar_extractos(banco, directorio: str, desde: Optional[Fecha] = None,
+                      hasta: Optional[Fecha] = None, formatos: Sequence[str] = FORMATOS,
+                      procesos: Optional[int] = None, cuentas_por_lote: int = 1000,
+                      reanudar: bool = True) -> Dict[str, Any]:
+    """
+    Escribir los estados de cuenta de todas las cuentas del banco en
+    `directorio` (ver módulo). Con procesos=1 todo corre en este proceso.
+    """
+    formatos = tuple(formatos)
+    if not formatos or set(formatos) - set(FORMATOS):
+        raise ValueError(f"Formatos no válidos: {formatos}")
+    if cuentas_por_lote < 1:
+        raise ValueError("cuentas_por_lote debe ser positivo")
+    procesos = procesos or os.cpu_count() or 1
+    os.makedirs(directorio, exist_ok=True)
+
+    desde_epoch, hasta_epoch = _epoch(desde), _epoch(hasta)
+    # Inicio del período en los estados: no antes de lo que tiene el libro
+    desde_texto = desde_epoch
+    libro_desde = banco.ledger.inicio
+    incompleto = libro_desde is not None and (desde_epoch is None or desde_epoch < libro_desde)
+    if incompleto:
+        logger.warning("El libro tiene movimientos desde %s y el período empieza en %s: "
+                       "los estados de cuenta empiezan en %s", _texto_fecha(libro_desde),
+                       _texto_fecha(desde_epoch), _texto_fecha(libro_desde))
+        desde_texto = libro_desde
+    with banco._lock:
+        cuentas = dict(banco.cuentas)
+    numeros = sorted(cuentas, key=str)
+    claves = [str(n) for n in numeros]
+
+    periodo = {'desde': desde_epoch, 'hasta': hasta_epoch, 'formatos': list(formatos)}
+    limites = _manifiesto(directorio, claves, cuentas_por_lote, periodo, reanudar)
+
+    # Repartir las cuentas actuales en los rangos del manifiesto
+    lotes: List[List[Any]] = [[] for _ in limites]
+    for numero, clave in zip(numeros, claves):
+        lotes[max(bisect_right(limites, clave) - 1, 0)].append(numero)
+    pendientes = [(i, lote) for i, lote in enumerate(lotes)
+                  if lote and not _lote_completo(directorio, i, lote)]
+
+    ledger = banco.ledger
+
+    def extraer(lote: List[Any]) -> List[Extracto]:
+        extractos = []
+        for numero in lote:
+            columnas = ledger.columnas(numero, desde_epoch, hasta_epoch)
+            if columnas is None:
+                # Sin movimientos en el libro: solo el saldo actual
+                columnas = (redondear_centavos(cuentas[numero].saldo), (), (), (), (), ())
+            extractos.append((numero, columnas))
+        return extractos
+
+    inicio = time.perf_counter()
+    total_cuentas = total_movimientos = 0
+    if procesos == 1:
+        for i, lote in pendientes:
+            cantidad, movimientos = _generar_lote(directorio, i, extraer(lote), formatos,
+                                                  desde_texto, hasta_epoch)
+            total_cuentas += cantidad
+            total_movimientos += movimientos
+    else:
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            en_vuelo = set()
+            for i, lote in pendientes:
+                if len(en_vuelo) >= 2 * procesos:
+                    listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for futuro in listos:
+                        cantidad, movimientos = futuro.result()
+                        total_cuentas += cantidad
+                        total_movimientos += movimientos
+                en_vuelo.add(pool.submit(_generar_lote, directorio, i, extraer(lote), formatos,
+                                         desde_texto, hasta_epoch))
+            for futuro in en_vuelo:
+                cantidad, movimientos = futuro.result()
+                total_cuentas += cantidad
+                total_movimientos += movimientos
+
+    duracion = time.perf_counter() - inicio
+    resultado = {
+        'cuentas': total_cuentas,
+        'movimientos': total_movimientos,
+        'lotes': len(pendientes),
+        'lotes_previos': sum(1 for lote in lotes if lote) - len(pendientes),
+        'incompleto': incompleto,
+        'segundos': duracion,
+        'cuentas_por_segundo': total_cuentas / duracion if duracion else 0.0,
+    }
+    logger.info("Estados de cuenta: %d cuentas, %d movimientos en %d lotes (%.1f s)",
+                total_cuentas, total_movimientos, len(pendientes), duracion)
+    return resultado
+
@@ -0,0 +1,300 @@
+"""
+Claves de idempotencia para las operaciones que mueven dinero.
+
+Los métodos decorados con @idempotente aceptan `idempotency_key=`. La
+primera llamada con una clave ejecuta la operación completa (locks,
+auditoría y email) y guarda su resultado; los reintentos con la misma
+clave devuelven ese resultado sin volver a ejecutar nada, y si la
+operación falló con ValueError (p. ej. fondos insuficientes) repiten el
+mismo error. Los errores transitorios (p. ej. LimiteExcedido) no se
+guardan: la clave queda libre para reintentar más tarde. Si llegan dos
+llamadas con la misma clave a la vez, la segunda espera a la primera y
+recibe su resultado.
+
+Las claves procesadas viven en un caché LRU en memoria (MAX_ENTRIES,
+búsqueda O(1)) respaldado por la tabla idempotency_keys de DB_PATH, así
+que un reintento después de reiniciar el proceso también se reconoce.
+Pasado TTL segundos una clave vence y puede reutilizarse. Los resultados
+se guardan como JSON conservando Decimal y tuplas, así que un reintento
+después de reiniciar recibe los mismos tipos; otros tipos no nativos de
+JSON se guardan como texto.
+
+Reutilizar una clave con otra operación u otros argumentos es un error
+del cliente y se rechaza con ValueError.
+
+    banco.transferir("0001", "0002", 100, idempotency_key="pago-8731")
+"""
+
+import asyncio
+import atexit
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from decimal import Decimal
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from .utils import ConnectionManager, registrar_capa
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Entrada(NamedTuple):
+    operacion: str
+    huella: str
+    status: str         # 'SUCCESS' o 'ERROR'
+    resultado: Any      # valor devuelto, o el mensaje del ValueError
+    creado: float
+
+
+class IdempotencyService:
+    DB_PATH = "idempotency.db"
+    # Claves que se mantienen en memoria y vigencia de una clave (segundos)
+    MAX_ENTRIES = 100000
+    TTL = 24 * 3600.0
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            clave TEXT PRIMARY KEY,
+            operacion TEXT NOT NULL,
+            huella TEXT NOT NULL,
+            status TEXT NOT NULL,
+            resultado TEXT,
+            creado REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_idempotency_creado ON idempotency_keys(creado)',
+    )
+
+    _cache: "OrderedDict[str, Entrada]" = OrderedDict()
+    # Clave -> Future de la ejecución en curso
+    _en_curso: Dict[str, Future] = {}
+    _lock = threading.Lock()
+    _managers: Dict[str, ConnectionManager] = {}
+
+    @classmethod
+    def _get_connection(cls):
+        manager = cls._managers.get(cls.DB_PATH)
+        if manager is None:
+            with cls._lock:
+                manager = cls._managers.setdefault(
+                    cls.DB_PATH, ConnectionManager(cls.DB_PATH, cls.SCHEMA))
+        return manager.get_connection()
+
+    @classmethod
+    def ejecutar(cls, clave: str, operacion: str, huella: str, funcion: Callable[[], Any]) -> Any:
+        """Ejecutar `funcion` una sola vez por clave (ver módulo)"""
+        entrada, futuro, propia = cls._reservar(clave)
+        if entrada is None and propia:
+            entrada = cls._cargar(clave)
+            if entrada is None:
+                try:
+                    resultado = funcion()
+                except ValueError as e:
+                    if getattr(e, 'transitorio', False):
+                        cls._abandonar(clave, futuro, e)
+                        raise
+                    entrada = Entrada(operacion, huella, 'ERROR', str(e), time.time())
+                except BaseException as e:
+                    cls._abandonar(clave, futuro, e)
+                    raise
+                else:
+                    entrada = Entrada(operacion, huella, 'SUCCESS', resultado, time.time())
+                cls._guardar(clave, entrada)
+            cls._completar(clave, futuro, entrada)
+        elif entrada is None:
+            entrada = futuro.result()
+        return cls._repetir(clave, entrada, operacion, huella)
+
+    @classmethod
+    async def ejecutar_async(cls, clave: str, operacion: str, huella: str,
+                             funcion: Callable[[], Any]) -> Any:
+        """Como ejecutar(), con `funcion` que devuelve una corrutina"""
+        entrada, futuro, propia = cls._reservar(clave)
+        if entrada is None and propia:
+            entrada = await asyncio.to_thread(cls._cargar, clave)
+            if entrada is None:
+                try:
+                    resultado = await funcion()
+                except ValueError as e:
+                    if getattr(e, 'transitorio', False):
+                        cls._abandonar(clave, futuro, e)
+                        raise
+                    entrada = Entrada(operacion, huella, 'ERROR', str(e), time.time())
+                except BaseException as e:
+                    cls._abandonar(clave, futuro, e)
+                    raise
+                else:
+                    entrada = Entrada(operacion, huella, 'SUCCESS', resultado, time.time())
+                await asyncio.to_thread(cls._guardar, clave, entrada)
+            cls._completar(clave, futuro, entrada)
+        elif entrada is None:
+            entrada = await asyncio.wrap_future(futuro)
+        return cls._repetir(clave, entrada, operacion, huella)
+
+    @classmethod
+    def _reservar(cls, clave: str) -> Tuple[Optional[Entrada], Optional[Future], bool]:
+        """
+        (entrada en memoria, None, False), (None, futuro ajeno, False) si
+        otra llamada la está ejecutando, o (None, futuro propio, True)
+        """
+        with cls._lock:
+            entrada = cls._cache.get(clave)
+            if entrada is not None:
+                if entrada.creado + cls.TTL > time.time():
+                    cls._cache.move_to_end(clave)
+                    return entrada, None, False
+                del cls._cache[clave]
+            futuro = cls._en_curso.get(clave)
+            if futuro is not None:
+                return None, futuro, False
+            futuro = cls._en_curso[clave] = Future()
+            return None, futuro, True
+
+    @classmethod
+    def _completar(cls, clave: str, futuro: Future, entrada: Entrada):
+        with cls._lock:
+            cls._cache[clave] = entrada
+            cls._cache.move_to_end(clave)
+            while len(cls._cache) > cls.MAX_ENTRIES:
+                cls._cache.popitem(last=False)
+            del cls._en_curso[clave]
+        futuro.set_result(entrada)
+
+    @classmethod
+    def _abandonar(cls, clave: str, futuro: Future, error: BaseException):
+        """Error no cacheable: las llamadas en espera lo reciben, la clave queda libre"""
+        with cls._lock:
+            del cls._en_curso[clave]
+        futuro.set_exception(error)
+
+    @staticmethod
+    def _repetir(clave: str, entrada: Entrada, operacion: str, huella: str) -> Any:
+        if entrada.operacion != operacion or entrada.huella != huella:
+            raise ValueError(f"Clave de idempotencia {clave} usada con otra operación")
+        if entrada.status == 'ERROR':
+            raise ValueError(entrada.resultado)
+        return entrada.resultado
+
+    @classmethod
+    def _cargar(cls, clave: str) -> Optional[Entrada]:
+        """Buscar una clave vigente en la tabla (tras un reinicio o un desalojo del LRU)"""
+        try:
+            fila = cls._get_connection().execute(
+                'SELECT operacion, huella, status, resultado, creado FROM idempotency_keys '
+                'WHERE clave = ? AND creado > ?', (clave, time.time() - cls.TTL)).fetchone()
+        except Exception as e:
+            logger.error("Error leyendo clave de idempotencia %s: %s", clave, e)
+            return None
+        if fila is None:
+            return None
+        operacion, huella, status, resultado, creado = fila
+        return Entrada(operacion, huella, status, _desde_json(resultado), creado)
+
+    @classmethod
+    def _guardar(cls, clave: str, entrada: Entrada):
+        try:
+            conn = cls._get_connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO idempotency_keys '
+                    '(clave, operacion, huella, status, resultado, creado) VALUES (?, ?, ?, ?, ?, ?)',
+                    (clave, entrada.operacion, entrada.huella, entrada.status,
+                     _a_json(entrada.resultado), entrada.creado))
+        except Exception as e:
+            # La operación ya se aplicó: queda al menos la protección en memoria
+            logger.error("Error guardando clave de idempotencia %s: %s", clave, e)
+
+    @classmethod
+    def purgar(cls) -> int:
+        """Borrar las claves vencidas de la tabla; devuelve cuántas"""
+        conn = cls._get_connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM idempotency_keys WHERE creado <= ?',
+                                  (time.time() - cls.TTL,))
+        return cursor.rowcount
+
+    @classmethod
+    def clear(cls):
+        """Vaciar el caché en memoria (la tabla se conserva)"""
+        with cls._lock:
+            cls._cache.clear()
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            managers = list(cls._managers.values())
+            cls._managers.clear()
+        for manager in managers:
+            manager.close_all()
+
+
+atexit.register(IdempotencyService.close)
+
+
+def _marcar_tipos(valor: Any) -> Any:
+    if isinstance(valor, Decimal):
+        return {'__decimal__': str(valor)}
+    if isinstance(valor, tuple):
+        return {'__tuple__': [_marcar_tipos(v) for v in valor]}
+    if isinstance(valor, list):
+        return [_marcar_tipos(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _marcar_tipos(v) for k, v in valor.items()}
+    return valor
+
+
+def _restaurar_tipos(objeto: Dict[str, Any]) -> Any:
+    if len(objeto) == 1:
+        if '__decimal__' in objeto:
+            return Decimal(objeto['__decimal__'])
+        if '__tuple__' in objeto:
+            return tuple(objeto['__tuple__'])
+    return objeto
+
+
+def _a_json(resultado: Any) -> str:
+    return json.dumps(_marcar_tipos(resultado), default=str)
+
+
+def _desde_json(texto: Optional[str]) -> Any:
+    return json.loads(texto, object_hook=_restaurar_tipos)
+
+
+def _huella(self, args, kwargs) -> str:
+    entidad = getattr(self, 'numero_cuenta', None)
+    return repr((entidad, args, sorted(kwargs.items())))
+
+
+def idempotente(func):
+    """
+    Aceptar `idempotency_key=` (ver módulo). Va por fuera de los demás
+    decoradores para que un reintento no tome locks ni audite ni notifique.
+    """
+    operacion = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, idempotency_key=None, **kwargs):
+            if idempotency_key is None:
+                return await func(self, *args, **kwargs)
+            return await IdempotencyService.ejecutar_async(
+                idempotency_key, operacion, _huella(self, args, kwargs),
+                lambda: func(self, *args, **kwargs))
+
+        return registrar_capa(async_wrapper, idempotente)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, idempotency_key=None, **kwargs):
+        if idempotency_key is None:
+            return func(self, *args, **kwargs)
+        return IdempotencyService.ejecutar(
+            idempotency_key, operacion, _huella(self, args, kwargs),
+            lambda: func(self, *args, **kwargs))
+
+    return registrar_capa(wrapper, idempotente)
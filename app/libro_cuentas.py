@@ -0,0 +1,227 @@
+"""
+Motor columnar de cuentas: saldos en un arreglo NumPy contiguo.
+
+LibroCuentas guarda el saldo de cada cuenta como centavos enteros (int64)
+en una fila de un arreglo, con un índice numero_cuenta -> fila. Las
+CuentaVista son Cuentas livianas cuyo saldo se lee y escribe en su fila,
+así que depositar, retirar y transferir siguen funcionando igual (con
+auditoría y notificación por operación), mientras que las operaciones
+masivas (intereses, comisiones, controles y reportes) se calculan de una
+vez sobre todo el arreglo y dejan un único registro de auditoría.
+
+Los saldos se exponen como Decimal con dos decimales; los montos con más
+de dos decimales se rechazan.
+
+    libro = LibroCuentas()
+    banco = Banco(libro=libro)
+    ...
+    libro.aplicar_interes("0.005")
+    libro.reporte()
+"""
+
+import threading
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+from typing import Any, Callable, Dict, List, Optional
+
+from .audit_service import AuditService
+from .cuenta import Cuenta
+from .transaccion import desde_centavos
+
+try:
+    import numpy as np
+except ImportError:  # dependencia opcional: solo la necesita este motor
+    np = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+CENTAVO = Decimal("0.01")
+
+
+def a_centavos(valor: Any) -> int:
+    """Convertir un monto (int, float, str o Decimal) a centavos exactos"""
+    if type(valor) is int:
+        return valor * 100
+    try:
+        decimal = Decimal(str(valor)) if isinstance(valor, float) else Decimal(valor)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Monto inválido: {valor}")
+    centavos = decimal.scaleb(2)
+    if centavos != centavos.to_integral_value():
+        raise ValueError(f"Monto con más de dos decimales: {valor}")
+    return int(centavos)
+
+
+class LibroCuentas:
+    """Saldos de todas las cuentas en un arreglo de centavos (ver módulo)"""
+
+    def __init__(self, capacidad: int = 1024):
+        if np is None:
+            raise ImportError("LibroCuentas requiere numpy (pip install numpy)")
+        self._centavos = np.zeros(max(capacidad, 1), dtype=np.int64)
+        self._numeros: List[Any] = []
+        self._filas: Dict[Any, int] = {}
+        # Compartido por todas las CuentaVista del libro: una operación
+        # masiva no puede intercalarse con un depósito a mitad de camino
+        self._lock = threading.RLock()
+        self._suscriptores: List[Callable[[List[Any], List[Decimal]], None]] = []
+
+    def __len__(self):
+        return len(self._numeros)
+
+    def __contains__(self, numero_cuenta):
+        return numero_cuenta in self._filas
+
+    # ---- filas individuales (usadas por CuentaVista) -------------------
+
+    def agregar(self, numero_cuenta, saldo_inicial: Any = 0) -> int:
+        """Reservar la fila de una cuenta nueva; devuelve su índice"""
+        with self._lock:
+            if numero_cuenta in self._filas:
+                raise ValueError(f"La cuenta {numero_cuenta} ya existe en el libro")
+            fila = len(self._numeros)
+            if fila == len(self._centavos):
+                # Crecer al doble: agregar cuentas es O(1) amortizado
+                self._centavos = np.concatenate([self._centavos, np.zeros_like(self._centavos)])
+            self._centavos[fila] = a_centavos(saldo_inicial)
+            self._numeros.append(numero_cuenta)
+            self._filas[numero_cuenta] = fila
+            return fila
+
+    def fila(self, numero_cuenta) -> int:
+        return self._filas[numero_cuenta]
+
+    def saldo(self, fila: int) -> Decimal:
+        return desde_centavos(self._centavos[fila])
+
+    def fijar_saldo(self, fila: int, valor: Any):
+        self._centavos[fila] = a_centavos(valor)
+
+    def suscribir(self, callback: Callable[[List[Any], List[Decimal]], None]):
+        """Recibir (numeros_cuenta, saldos_nuevos) de cada operación masiva, antes de aplicarla"""
+        self._suscriptores.append(callback)
+
+    # ---- operaciones masivas -------------------------------------------
+
+    def aplicar_interes(self, tasa: Any, saldo_minimo: Any = 0) -> Dict[str, Any]:
+        """
+        Acreditar `tasa` (p. ej. "0.005") sobre el saldo de las cuentas con
+        saldo mayor a `saldo_minimo`. El interés de cada cuenta se
+        redondea al centavo (mitad hacia arriba) con aritmética entera.
+        """
+        fraccion = Fraction(Decimal(str(tasa)) if isinstance(tasa, float) else Decimal(tasa))
+        if fraccion < 0:
+            raise ValueError(f"Tasa inválida: {tasa}")
+        minimo = a_centavos(saldo_minimo)
+
+        with self._lock:
+            saldos = self._centavos[:len(self._numeros)]
+            filas = np.flatnonzero(saldos > minimo)
+            base = saldos[filas]
+            if len(base) and int(base.max()) * fraccion.numerator > np.iinfo(np.int64).max:
+                raise ValueError("La tasa produce valores fuera de rango")
+            interes = (base * fraccion.numerator + fraccion.denominator // 2) // fraccion.denominator
+            return self._aplicar("interes_masivo", filas, interes,
+                                 {'tasa': str(tasa), 'saldo_minimo': str(saldo_minimo)})
+
+    def cobrar_comision(self, comision: Any, saldo_menor_a: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Debitar `comision` de todas las cuentas (o solo de las que tienen
+        saldo menor a `saldo_menor_a`). Nunca deja un saldo negativo: si
+        no alcanza se cobra lo disponible.
+        """
+        monto = a_centavos(comision)
+        if monto <= 0:
+            raise ValueError(f"Comisión inválida: {comision}")
+
+        with self._lock:
+            saldos = self._centavos[:len(self._numeros)]
+            seleccion = saldos > 0
+            if saldo_menor_a is not None:
+                seleccion &= saldos < a_centavos(saldo_menor_a)
+            filas = np.flatnonzero(seleccion)
+            cobro = -np.minimum(saldos[filas], monto)
+            return self._aplicar("comision_masiva", filas, cobro,
+                                 {'comision': str(comision), 'saldo_menor_a': str(saldo_menor_a)})
+
+    def cuentas_con_saldo_menor(self, minimo: Any = 0) -> List[Any]:
+        """Control masivo: números de cuenta con saldo menor a `minimo`"""
+        with self._lock:
+            filas = np.flatnonzero(self._centavos[:len(self._numeros)] < a_centavos(minimo))
+            return [self._numeros[fila] for fila in filas]
+
+    def reporte(self) -> Dict[str, Any]:
+        """Agregados de todas las cuentas"""
+        with self._lock:
+            saldos = self._centavos[:len(self._numeros)]
+            if not len(saldos):
+                return {'cuentas': 0, 'total': Decimal("0.00")}
+            total = int(saldos.sum(dtype=np.int64))
+            return {
+                'cuentas': len(saldos),
+                'total': desde_centavos(total),
+                'promedio': (desde_centavos(total) / len(saldos)).quantize(CENTAVO),
+                'minimo': desde_centavos(saldos.min()),
+                'maximo': desde_centavos(saldos.max()),
+                'mediana': desde_centavos(int(np.median(saldos))),
+                'sin_fondos': int((saldos == 0).sum()),
+                'negativas': int((saldos < 0).sum()),
+            }
+
+    def _aplicar(self, operacion: str, filas, deltas, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        """Sumar `deltas` a `filas`, auditar un resumen y avisar a los suscriptores"""
+        saldos = self._centavos[:len(self._numeros)]
+        if self._suscriptores and len(filas):
+            # Los suscriptores (p. ej. el WAL) reciben los saldos antes del cambio
+            numeros = [self._numeros[fila] for fila in filas]
+            nuevos = [desde_centavos(c) for c in saldos[filas] + deltas]
+            for callback in self._suscriptores:
+                callback(numeros, nuevos)
+
+        total_antes = int(saldos.sum(dtype=np.int64))
+        saldos[filas] += deltas
+        total_despues = int(saldos.sum(dtype=np.int64))
+
+        resumen = {
+            'cuentas': int(len(filas)),
+            'monto_total': desde_centavos(total_despues - total_antes),
+            'total_antes': desde_centavos(total_antes),
+            'total_despues': desde_centavos(total_despues),
+        }
+        AuditService.log_change(
+            operation_type=operacion,
+            entity_type=self.__class__.__name__,
+            entity_id='*',
+            estado_antes={'total': resumen['total_antes'], 'cuentas': len(saldos)},
+            estado_despues={'total': resumen['total_despues'], 'cuentas': len(saldos)},
+            usuario="sistema",
+            status="SUCCESS",
+            kwargs={**parametros, 'afectadas': resumen['cuentas']},
+            campos_modificados={'total': {'antes': resumen['total_antes'],
+                                          'despues': resumen['total_despues']}}
+        )
+
+        logger.info("%s: %d cuentas, monto total %s", operacion, resumen['cuentas'], resumen['monto_total'])
+        return resumen
+
+
+class CuentaVista(Cuenta):
+    """Cuenta cuyo saldo vive en una fila de un LibroCuentas"""
+
+    def __init__(self, numero_cuenta, libro: LibroCuentas, saldo_inicial=0, ledger=None):
+        self._libro = libro
+        self._fila = libro.agregar(numero_cuenta, saldo_inicial)
+        super().__init__(numero_cuenta, saldo_inicial, ledger=ledger)
+        self._lock = libro._lock
+
+    @property
+    def saldo(self) -> Decimal:
+        return self._libro.saldo(self._fila)
+
+    @saldo.setter
+    def saldo(self, valor):
+        self._libro.fijar_saldo(self._fila, valor)
+
+    def _aplicar_movimiento(self, tipo, monto, contraparte=None):
+        super()._aplicar_movimiento(tipo, desde_centavos(a_centavos(monto)), contraparte)
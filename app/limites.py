@@ -0,0 +1,257 @@
+"""
+Límites de velocidad por cuenta y por cliente.
+
+Una Regla limita la cantidad de operaciones y/o el monto total de
+retiros y transferencias en una ventana deslizante (p. ej. 5 retiros por
+minuto por cuenta, 10.000 por día por cliente). Cada ventana se divide en
+`buckets` intervalos con un contador y un total por intervalo; al avanzar
+el tiempo se descartan los intervalos vencidos y se mantienen los totales
+de la ventana, así que verificar una operación es O(1) (a lo sumo
+`buckets` pasos) sin consultar la auditoría. La ventana es aproximada a
+la duración de un intervalo.
+
+Retirar (Cuenta.retirar) y transferir (Banco.transferir y los lotes)
+consumen del límite antes de aplicar el movimiento; si se excede lanzan
+LimiteExcedido, que log_data_changes registra como ERROR y que no queda
+guardado como resultado de una clave de idempotencia. Una operación que
+falla después de consumir (p. ej. fondos insuficientes) devuelve lo
+consumido.
+
+Las ventanas de cuentas sin actividad reciente se liberan. Al adjuntar
+el limitador a un Banco se reconstruyen desde la auditoría con las
+operaciones exitosas todavía dentro de la ventana más larga.
+
+    limites = LimitesVelocidad([
+        Regla('cuenta', 60, max_operaciones=5),
+        Regla('cliente', 24 * 3600, max_monto=10000),
+    ])
+    limites.adjuntar(banco)
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .audit_service import AuditService
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LimiteExcedido(ValueError):
+    """La operación superaría un límite de velocidad"""
+
+    # Reintentar más tarde puede funcionar: @idempotente no guarda el rechazo
+    transitorio = True
+
+
+class Regla(NamedTuple):
+    alcance: str                    # 'cuenta' o 'cliente'
+    ventana: float                  # segundos
+    max_operaciones: Optional[int] = None
+    max_monto: Optional[float] = None
+    operaciones: Tuple[str, ...] = ('retiro', 'transferencia')
+
+
+class _Ventana:
+    """Contadores por intervalo de una regla para una cuenta o cliente"""
+
+    __slots__ = ('ultimo', 'conteos', 'montos', 'conteo', 'monto')
+
+    def __init__(self, buckets: int, intervalo: int):
+        self.ultimo = intervalo
+        self.conteos = [0] * buckets
+        self.montos = [0.0] * buckets
+        self.conteo = 0
+        self.monto = 0.0
+
+    def avanzar(self, intervalo: int):
+        """Descartar los intervalos que salieron de la ventana"""
+        buckets = len(self.conteos)
+        pasos = intervalo - self.ultimo
+        if pasos <= 0:
+            return
+        if pasos >= buckets:
+            self.conteos = [0] * buckets
+            self.montos = [0.0] * buckets
+            self.conteo = 0
+            self.monto = 0.0
+        else:
+            for i in range(self.ultimo + 1, intervalo + 1):
+                slot = i % buckets
+                self.conteo -= self.conteos[slot]
+                self.monto -= self.montos[slot]
+                self.conteos[slot] = 0
+                self.montos[slot] = 0.0
+        self.ultimo = intervalo
+
+    def sumar(self, intervalo: int, conteo: int, monto: float):
+        """Sumar (o restar) en un intervalo que sigue dentro de la ventana"""
+        if self.ultimo - intervalo >= len(self.conteos) or intervalo > self.ultimo:
+            return
+        slot = intervalo % len(self.conteos)
+        self.conteos[slot] += conteo
+        self.montos[slot] += monto
+        self.conteo += conteo
+        self.monto += monto
+
+
+# Lo consumido por una operación: (regla, clave, intervalo, monto) por regla
+Consumo = List[Tuple[int, Any, int, float]]
+
+
+class LimitesVelocidad:
+    """Ventanas deslizantes por cuenta y por cliente (ver módulo)"""
+
+    ALCANCES = ('cuenta', 'cliente')
+
+    def __init__(self, reglas: Sequence[Regla], buckets: int = 10):
+        for regla in reglas:
+            if regla.alcance not in self.ALCANCES:
+                raise ValueError(f"Alcance de regla no válido: {regla.alcance}")
+            if regla.ventana <= 0 or (regla.max_operaciones is None and regla.max_monto is None):
+                raise ValueError(f"Regla sin ventana o sin límite: {regla}")
+        if buckets < 1:
+            raise ValueError("buckets debe ser positivo")
+
+        self.reglas = list(reglas)
+        self.buckets = buckets
+        self._anchos = [regla.ventana / buckets for regla in self.reglas]
+        self._ventanas: Dict[Tuple[int, Any], _Ventana] = {}
+        self._clientes: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self._max_ventana = max((regla.ventana for regla in self.reglas), default=0.0)
+        self._ultimo_barrido = time.time()
+
+    def __len__(self):
+        return len(self._ventanas)
+
+    def adjuntar(self, banco, reconstruir: bool = True):
+        """Aplicar los límites a las cuentas del banco (y a las que se creen)"""
+        with banco._lock:
+            banco.limites = self
+            for identificacion, cliente in banco.clientes.items():
+                for cuenta in cliente.cuentas:
+                    self.registrar_cuenta(identificacion, cuenta)
+        if reconstruir:
+            self.cargar_auditoria()
+
+    def registrar_cuenta(self, identificacion, cuenta):
+        self._clientes[str(cuenta.numero_cuenta)] = identificacion
+        cuenta._limites = self
+
+    def consumir(self, operacion: str, numero_cuenta, monto,
+                 ahora: Optional[float] = None) -> Consumo:
+        """
+        Registrar una operación si entra en todos los límites; si no, lanzar
+        LimiteExcedido sin registrar nada.
+        """
+        ahora = time.time() if ahora is None else ahora
+        monto = float(monto)
+        numero_cuenta = str(numero_cuenta)
+        cliente = self._clientes.get(numero_cuenta)
+
+        with self._lock:
+            aplicables = []
+            for indice, regla in enumerate(self.reglas):
+                if operacion not in regla.operaciones:
+                    continue
+                clave = numero_cuenta if regla.alcance == 'cuenta' else cliente
+                if clave is None:
+                    continue
+                intervalo = int(ahora // self._anchos[indice])
+                ventana = self._ventanas.get((indice, clave))
+                if ventana is None:
+                    ventana = self._ventanas[(indice, clave)] = _Ventana(self.buckets, intervalo)
+                ventana.avanzar(intervalo)
+
+                if regla.max_operaciones is not None and ventana.conteo + 1 > regla.max_operaciones:
+                    raise LimiteExcedido(f"Límite de {regla.max_operaciones} operaciones en "
+                                         f"{regla.ventana:g}s excedido para {regla.alcance} {clave}")
+                if regla.max_monto is not None and ventana.monto + monto > regla.max_monto + 1e-9:
+                    raise LimiteExcedido(f"Límite de monto {regla.max_monto} en "
+                                         f"{regla.ventana:g}s excedido para {regla.alcance} {clave}")
+                aplicables.append((indice, clave, intervalo, ventana))
+
+            consumo = []
+            for indice, clave, intervalo, ventana in aplicables:
+                ventana.sumar(intervalo, 1, monto)
+                consumo.append((indice, clave, intervalo, monto))
+
+            if ahora - self._ultimo_barrido > self._max_ventana:
+                self._barrer(ahora)
+        return consumo
+
+    def devolver(self, consumo: Consumo):
+        """Deshacer lo consumido por una operación que finalmente no se aplicó"""
+        with self._lock:
+            for indice, clave, intervalo, monto in consumo:
+                ventana = self._ventanas.get((indice, clave))
+                if ventana is not None:
+                    ventana.sumar(intervalo, -1, -monto)
+
+    def _barrer(self, ahora: float):
+        """Liberar las ventanas sin operaciones dentro de su período"""
+        vencidas = [clave for clave, ventana in self._ventanas.items()
+                    if int(ahora // self._anchos[clave[0]]) - ventana.ultimo >= self.buckets]
+        for clave in vencidas:
+            del self._ventanas[clave]
+        self._ultimo_barrido = ahora
+        if vencidas:
+            logger.debug("Límites: %d ventanas inactivas liberadas", len(vencidas))
+
+    def cargar_auditoria(self, ahora: Optional[float] = None) -> int:
+        """
+        Reconstruir las ventanas con los retiros y transferencias exitosos de
+        la auditoría dentro de la ventana más larga. Devuelve cuántos cargó.
+        """
+        ahora = time.time() if ahora is None else ahora
+        if not self.reglas:
+            return 0
+        desde = datetime.fromtimestamp(ahora - self._max_ventana)
+
+        operaciones = []
+        for tipo in ('retiro', 'transferencia'):
+            for record in AuditService.iter_audit_history(operation_type=tipo, since=desde):
+                if record.status != "SUCCESS":
+                    continue
+                args = record.args or []
+                kwargs = record.kwargs or {}
+                if tipo == 'retiro':
+                    # Los retiros con contraparte son la mitad de una transferencia
+                    if kwargs.get('contraparte') is not None or len(args) > 1:
+                        continue
+                    numero = record.entity_id
+                    monto = args[0] if args else kwargs.get('monto')
+                else:
+                    numero = args[0] if args else kwargs.get('origen')
+                    monto = args[2] if len(args) > 2 else kwargs.get('monto')
+                if numero is None or monto is None:
+                    continue
+                operaciones.append((datetime.fromisoformat(record.timestamp).timestamp(),
+                                    tipo, str(numero), monto))
+
+        # En orden cronológico y sin rechazar: ya se aplicaron
+        operaciones.sort(key=lambda operacion: operacion[0])
+        with self._lock:
+            for momento, tipo, numero, monto in operaciones:
+                self._cargar(tipo, numero, float(monto), momento)
+            self._barrer(ahora)
+        logger.info("Límites reconstruidos con %d operaciones de la auditoría", len(operaciones))
+        return len(operaciones)
+
+    def _cargar(self, operacion: str, numero_cuenta, monto: float, momento: float):
+        cliente = self._clientes.get(numero_cuenta)
+        for indice, regla in enumerate(self.reglas):
+            if operacion not in regla.operaciones:
+                continue
+            clave = numero_cuenta if regla.alcance == 'cuenta' else cliente
+            if clave is None:
+                continue
+            intervalo = int(momento // self._anchos[indice])
+            ventana = self._ventanas.get((indice, clave))
+            if ventana is None:
+                ventana = self._ventanas[(indice, clave)] = _Ventana(self.buckets, intervalo)
+            ventana.avanzar(intervalo)
+            ventana.sumar(intervalo, 1, monto)
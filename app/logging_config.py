@@ -0,0 +1,122 @@
+"""
+Configuración del logging de la aplicación.
+
+Importar los módulos de app no configura nada: el punto de entrada llama
+a configurar_logging(). El hilo que loguea solo encola el registro
+(QueueHandler, sin esperar: si la cola está llena el registro se descarta
+y se cuenta) y un QueueListener en segundo plano lo formatea y escribe en:
+- un archivo con rotación por tamaño (`max_bytes`, `backups`) o por
+  tiempo (`rotacion="midnight"`, "H", ... como TimedRotatingFileHandler)
+- la consola, opcionalmente
+
+Con `formato_json=True` cada línea del archivo es un objeto JSON.
+
+Los módulos usan formato perezoso con %: logger.info("x %s", valor) no
+arma el texto si el nivel está deshabilitado.
+
+    configurar_logging(nivel=logging.WARNING, formato_json=True)
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional
+
+FORMATO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            datos['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos['exception'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _ColaSinBloqueo(QueueHandler):
+    """QueueHandler que nunca bloquea al llamador: descarta si la cola está llena"""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_handler: Optional[_ColaSinBloqueo] = None
+_listener: Optional[QueueListener] = None
+
+
+def configurar_logging(archivo: Optional[str] = "banco_audit.log", nivel: int = logging.INFO,
+                       consola: bool = True, formato_json: bool = False,
+                       max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                       rotacion: Optional[str] = None, max_cola: int = 10000) -> QueueListener:
+    """
+    Instalar el pipeline de logging en el logger raíz (reemplaza una
+    configuración anterior hecha con esta función).
+    """
+    global _handler, _listener
+    detener_logging()
+
+    destinos = []
+    if archivo:
+        if rotacion:
+            destino = TimedRotatingFileHandler(archivo, when=rotacion, backupCount=backups,
+                                               encoding='utf-8')
+        else:
+            destino = RotatingFileHandler(archivo, maxBytes=max_bytes, backupCount=backups,
+                                          encoding='utf-8')
+        destino.setFormatter(JsonFormatter() if formato_json else logging.Formatter(FORMATO))
+        destinos.append(destino)
+    if consola:
+        destino = logging.StreamHandler(sys.stderr)
+        destino.setFormatter(logging.Formatter(FORMATO))
+        destinos.append(destino)
+
+    _handler = _ColaSinBloqueo(queue.Queue(max_cola))
+    _listener = QueueListener(_handler.queue, *destinos, respect_handler_level=True)
+    _listener.start()
+
+    raiz = logging.getLogger()
+    raiz.addHandler(_handler)
+    raiz.setLevel(nivel)
+    return _listener
+
+
+def detener_logging():
+    """Escribir lo encolado, cerrar los destinos y quitar el handler del logger raíz"""
+    global _handler, _listener
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+        for destino in _listener.handlers:
+            destino.close()
+    _handler = None
+    _listener = None
+
+
+def descartados() -> int:
+    """Registros descartados por cola llena desde la última configuración"""
+    return _handler.descartados if _handler is not None else 0
+
+
+atexit.register(detener_logging)
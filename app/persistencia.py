@@ -0,0 +1,577 @@
+"""
+Persistencia de Banco: snapshot compacto + registro de escritura anticipada.
+
+- WAL: segmentos `wal-<primer_seq>.log` con registros
+  [longitud u32][crc32 u32][JSON [seq, op, ...]]. Cada cambio de saldo se
+  escribe y se sincroniza antes de que la operación devuelva, y si la
+  escritura falla el saldo en memoria queda como estaba:
+  - un movimiento suelto se escribe antes de aplicarse: el libro avisa a
+    sus suscriptores antes de que la cuenta (o el LibroCuentas) cambie
+    el saldo
+  - los movimientos de `Ledger.agrupar()` (una transferencia) se
+    escriben juntos al cerrar el bloque, todavía con los locks de las
+    cuentas tomados; si el bloque o la escritura fallan no se escriben y
+    el libro restaura el saldo anterior de cada cuenta
+- Con sync="grupo" (por defecto) quien escribe espera el fsync, pero un
+  solo fsync cubre a todos los hilos que esperan a la vez. sync="siempre"
+  hace un fsync por registro y sync="diferido" sincroniza en segundo
+  plano cada `intervalo_sync` segundos (más rápido; una caída puede
+  perder lo último ya aplicado).
+- Snapshot: `snapshot-<seq>.bin`, formato binario por columnas que se
+  carga con unas pocas operaciones en bloque (ver Snapshot).
+  `seq` es el último registro del WAL incluido.
+- Los registros de saldo guardan el saldo absoluto resultante, así que
+  reaplicarlos es idempotente: el snapshot puede tomarse en línea sin
+  detener las operaciones y el arranque solo reaplica la cola del WAL.
+
+El historial de movimientos (Ledger) no se persiste aquí; la auditoría
+conserva ese detalle.
+"""
+
+import gc
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .banco import Banco
+from .cliente import Cliente
+from .cuenta import Cuenta
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class WriteAheadLog:
+    """Registro de escritura anticipada por segmentos con fsync agrupado"""
+
+    FRAME = struct.Struct('<II')
+    SEGMENTO = re.compile(r'^wal-(\d{16})\.log$')
+    MODOS = ("grupo", "siempre", "diferido")
+
+    def __init__(self, directorio: str, sync: str = "grupo", intervalo_sync: float = 0.005):
+        if sync not in self.MODOS:
+            raise ValueError(f"Modo de sync no válido: {sync}")
+        self.directorio = directorio
+        self.sync_mode = sync
+        self.intervalo_sync = intervalo_sync
+
+        self.seq = 0
+        self._file = None
+        self._pendiente: List[bytes] = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        # Último seq en disco y si hay un hilo haciendo fsync por los demás
+        self._sincronizado = 0
+        self._sincronizando = False
+        self._cond = threading.Condition()
+        # Tras un error de escritura no se sabe qué llegó al disco: el
+        # registro deja de aceptar operaciones
+        self._fallo: Optional[BaseException] = None
+        self._cerrado = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def abrir(self, ultimo_seq: int):
+        """Abrir un segmento nuevo a continuación de `ultimo_seq`"""
+        self.seq = self._sincronizado = ultimo_seq
+        self._file = open(self._ruta(ultimo_seq + 1), 'ab')
+        _fsync_directorio(self.directorio)
+        if self.sync_mode == "diferido":
+            self._cerrado.clear()
+            self._thread = threading.Thread(target=self._sincronizar, name="wal-sync", daemon=True)
+            self._thread.start()
+
+    def append(self, *registro: Any) -> int:
+        """
+        Agregar un registro; devuelve su número de secuencia cuando ya está
+        en disco (salvo con sync="diferido")
+        """
+        with self._lock:
+            if self._fallo is not None:
+                raise OSError(f"WAL inutilizable tras un error de escritura: {self._fallo}")
+            self.seq += 1
+            seq = self.seq
+            payload = json.dumps([seq, *registro], separators=(',', ':')).encode('utf-8')
+            self._pendiente.append(self.FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        if self.sync_mode == "siempre":
+            self.sync()
+        elif self.sync_mode == "grupo":
+            self.esperar(seq)
+        return seq
+
+    def esperar(self, seq: int):
+        """
+        Esperar a que `seq` esté en disco. El primer hilo que llega hace el
+        fsync de todo lo pendiente; los que llegan mientras tanto esperan y
+        quedan cubiertos por ese fsync o por el siguiente.
+        """
+        with self._cond:
+            while self._sincronizado < seq:
+                if self._fallo is not None:
+                    raise OSError(f"WAL inutilizable tras un error de escritura: {self._fallo}")
+                if not self._sincronizando:
+                    self._sincronizando = True
+                    break
+                self._cond.wait()
+            else:
+                return
+        try:
+            self.sync()
+        finally:
+            with self._cond:
+                self._sincronizando = False
+                self._cond.notify_all()
+
+    def sync(self):
+        """Escribir y hacer fsync de todo lo pendiente"""
+        with self._io_lock:
+            with self._lock:
+                pendiente, self._pendiente = self._pendiente, []
+                hasta = self.seq
+            if pendiente and self._file is not None:
+                try:
+                    self._file.write(b''.join(pendiente))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except BaseException as e:
+                    self._fallo = e
+                    raise
+            self._marcar(hasta)
+
+    def _marcar(self, hasta: int):
+        with self._cond:
+            if hasta > self._sincronizado:
+                self._sincronizado = hasta
+
+    def rotar(self) -> int:
+        """Cerrar el segmento actual y abrir otro; devuelve el último seq del anterior"""
+        with self._io_lock:
+            with self._lock:
+                pendiente, self._pendiente = self._pendiente, []
+                ultimo = self.seq
+                anterior = self._file
+                self._file = open(self._ruta(ultimo + 1), 'ab')
+            if anterior is not None:
+                anterior.write(b''.join(pendiente))
+                anterior.flush()
+                os.fsync(anterior.fileno())
+                anterior.close()
+            self._marcar(ultimo)
+        _fsync_directorio(self.directorio)
+        return ultimo
+
+    def cerrar(self):
+        self._cerrado.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def segmentos(self) -> List[Tuple[int, str]]:
+        """Segmentos existentes como (primer_seq, ruta), en orden"""
+        encontrados = []
+        for nombre in os.listdir(self.directorio):
+            match = self.SEGMENTO.match(nombre)
+            if match:
+                encontrados.append((int(match.group(1)), os.path.join(self.directorio, nombre)))
+        return sorted(encontrados)
+
+    @classmethod
+    def leer(cls, ruta: str) -> Iterator[list]:
+        """Leer los registros de un segmento; se detiene en un registro incompleto o corrupto"""
+        with open(ruta, 'rb') as f:
+            while True:
+                cabecera = f.read(cls.FRAME.size)
+                if len(cabecera) < cls.FRAME.size:
+                    return
+                longitud, crc = cls.FRAME.unpack(cabecera)
+                payload = f.read(longitud)
+                if len(payload) < longitud or zlib.crc32(payload) != crc:
+                    logger.warning(f"WAL {ruta}: registro incompleto o corrupto, se ignora la cola")
+                    return
+                yield json.loads(payload)
+
+    def _ruta(self, primer_seq: int) -> str:
+        return os.path.join(self.directorio, f"wal-{primer_seq:016d}.log")
+
+    def _sincronizar(self):
+        while not self._cerrado.wait(self.intervalo_sync):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Error sincronizando WAL: {e}")
+
+
+class Snapshot:
+    """
+    Formato binario del snapshot, por columnas:
+
+        cabecera  magic, versión, seq, n_clientes, n_cuentas
+        bloque    identificacion y nombre de cada cliente, separados por NUL
+        bloque    numero_cuenta y titular de cada cuenta, separados por NUL
+        arreglo   tipo de saldo por cuenta (0 entero, 1 real, 2 texto)
+        arreglo   saldos enteros (int64)
+        arreglo   saldos reales (float64)
+        bloque    saldos exactos (Decimal) como texto, separados por NUL
+
+    Cada bloque va precedido de su largo en bytes (u64). Las columnas se
+    leen del archivo mapeado en memoria con una sola operación cada una.
+    """
+
+    MAGIC = b'BSNP'
+    VERSION = 2
+    CABECERA = struct.Struct('<4sHQQQ')
+    LARGO = struct.Struct('<Q')
+    PATRON = re.compile(r'^snapshot-(\d{16})\.bin$')
+
+    ENTERO, REAL, TEXTO = 0, 1, 2
+
+    @classmethod
+    def escribir(cls, ruta: str, seq: int, clientes: List[Tuple[str, str]],
+                 cuentas: List[Tuple[str, str, Any]]):
+        """
+        Escribir el snapshot de forma atómica (temporal + fsync + rename).
+        `clientes` son (identificacion, nombre) y `cuentas` (numero, titular,
+        saldo); el titular es '' para una cuenta sin cliente.
+        """
+        textos_clientes: List[str] = []
+        textos_cuentas: List[str] = []
+        tipos = array('b')
+        enteros = array('q')
+        reales = array('d')
+        exactos: List[str] = []
+
+        for identificacion, nombre in clientes:
+            textos_clientes.append(identificacion)
+            textos_clientes.append(nombre)
+        for numero, titular, saldo in cuentas:
+            textos_cuentas.append(numero)
+            textos_cuentas.append(titular)
+            if isinstance(saldo, int):
+                tipos.append(cls.ENTERO)
+                enteros.append(saldo)
+                reales.append(0.0)
+            elif isinstance(saldo, float):
+                tipos.append(cls.REAL)
+                enteros.append(0)
+                reales.append(saldo)
+            else:
+                tipos.append(cls.TEXTO)
+                enteros.append(0)
+                reales.append(0.0)
+                exactos.append(str(saldo))
+
+        temporal = ruta + ".tmp"
+        with open(temporal, 'wb') as f:
+            f.write(cls.CABECERA.pack(cls.MAGIC, cls.VERSION, seq, len(clientes), len(tipos)))
+            for bloque in (cls._unir(textos_clientes), cls._unir(textos_cuentas),
+                           tipos.tobytes(), enteros.tobytes(), reales.tobytes(),
+                           cls._unir(exactos)):
+                f.write(cls.LARGO.pack(len(bloque)))
+                f.write(bloque)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temporal, ruta)
+        _fsync_directorio(os.path.dirname(ruta) or '.')
+
+    @classmethod
+    def leer(cls, ruta: str) -> Tuple[int, Iterator[Tuple[str, str]], Iterator[Tuple[str, str, Any]]]:
+        """Devuelve (seq, clientes, cuentas); clientes y cuentas son iteradores de tuplas"""
+        with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            magic, version, seq, n_clientes, n_cuentas = cls.CABECERA.unpack_from(datos, 0)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"Snapshot no válido: {ruta}")
+
+            bloques = []
+            posicion = cls.CABECERA.size
+            for _ in range(6):
+                (largo,) = cls.LARGO.unpack_from(datos, posicion)
+                posicion += cls.LARGO.size
+                bloques.append(datos[posicion:posicion + largo])
+                posicion += largo
+
+        textos_clientes, textos_cuentas = cls._separar(bloques[0]), cls._separar(bloques[1])
+        tipos, enteros, reales = array('b'), array('q'), array('d')
+        tipos.frombytes(bloques[2])
+        enteros.frombytes(bloques[3])
+        reales.frombytes(bloques[4])
+        exactos = iter(cls._separar(bloques[5]))
+
+        if len(textos_clientes) != 2 * n_clientes or len(tipos) != n_cuentas:
+            raise ValueError(f"Snapshot incompleto: {ruta}")
+
+        def saldos():
+            for tipo, entero, real in zip(tipos, enteros, reales):
+                if tipo == cls.ENTERO:
+                    yield entero
+                elif tipo == cls.REAL:
+                    yield real
+                else:
+                    yield Decimal(next(exactos))
+
+        clientes = zip(textos_clientes[0::2], textos_clientes[1::2])
+        cuentas = zip(textos_cuentas[0::2], textos_cuentas[1::2], saldos())
+        return seq, clientes, cuentas
+
+    @staticmethod
+    def _unir(textos: List[Any]) -> bytes:
+        texto = '\0'.join(map(str, textos))
+        if texto.count('\0') != max(len(textos) - 1, 0):
+            raise ValueError("Los textos del snapshot no pueden contener NUL")
+        return texto.encode('utf-8')
+
+    @staticmethod
+    def _separar(bloque: bytes) -> List[str]:
+        return bloque.decode('utf-8').split('\0') if bloque else []
+
+
+class BancoStore:
+    """
+    Almacenamiento durable de clientes y cuentas de un Banco.
+
+        store = BancoStore("data")
+        banco = store.cargar()      # último snapshot + cola del WAL
+        ...
+        store.snapshot()            # en línea; compacta el WAL
+        store.cerrar()
+    """
+
+    def __init__(self, directorio: str = "data", sync: str = "grupo",
+                 intervalo_sync: float = 0.005, snapshot_cada: int = 1_000_000):
+        self.directorio = directorio
+        self.snapshot_cada = snapshot_cada
+        os.makedirs(directorio, exist_ok=True)
+
+        self.wal = WriteAheadLog(directorio, sync=sync, intervalo_sync=intervalo_sync)
+        self.banco: Optional[Banco] = None
+        self._seq_snapshot = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    # ---- arranque -------------------------------------------------------
+
+    def cargar(self, libro=None) -> Banco:
+        """
+        Reconstruir el Banco desde el último snapshot y la cola del WAL
+        (con `libro`, sobre un LibroCuentas columnar)
+        """
+        banco = Banco(libro=libro)
+        inicio = time.perf_counter()
+        seq = 0
+
+        # Se crean millones de objetos sin ciclos: las pasadas del GC solo
+        # agregarían tiempo
+        gc_activo = gc.isenabled()
+        gc.disable()
+        try:
+            ruta = self._ultimo_snapshot()
+            if ruta is not None:
+                seq, clientes, cuentas = Snapshot.leer(ruta)
+                for identificacion, nombre in clientes:
+                    banco.clientes[identificacion] = Cliente(nombre, identificacion)
+                for numero, titular, saldo in cuentas:
+                    self._crear_cuenta(banco, titular, numero, saldo)
+            self._seq_snapshot = seq
+
+            reaplicados = 0
+            ultimo = seq
+            for _, segmento in self.wal.segmentos():
+                for registro in WriteAheadLog.leer(segmento):
+                    if registro[0] <= seq:
+                        continue
+                    self._aplicar(banco, registro)
+                    ultimo = registro[0]
+                    reaplicados += 1
+        finally:
+            if gc_activo:
+                gc.enable()
+
+        logger.info(f"Banco cargado: {len(banco.clientes)} clientes, {len(banco.cuentas)} cuentas, "
+                    f"{reaplicados} registros del WAL en {time.perf_counter() - inicio:.2f}s")
+
+        # Los movimientos anteriores a la carga no están en el libro
+        banco.ledger.inicio = time.time()
+        self._adjuntar(banco, ultimo)
+        return banco
+
+    def adjuntar(self, banco: Banco):
+        """Empezar a persistir un Banco nuevo (directorio vacío)"""
+        if self._ultimo_snapshot() is not None or self.wal.segmentos():
+            raise ValueError(f"El directorio {self.directorio} ya tiene datos; use cargar()")
+        self._adjuntar(banco, 0)
+        # Estado inicial completo como primer snapshot
+        self.snapshot()
+
+    def _adjuntar(self, banco: Banco, ultimo_seq: int):
+        self.banco = banco
+        banco.store = self
+        banco.ledger.suscribir(self._registrar_movimientos)
+        if banco.libro is not None:
+            banco.libro.suscribir(self._registrar_saldos)
+        self.wal.abrir(ultimo_seq)
+
+    # ---- registro de operaciones ---------------------------------------
+
+    def registrar_cliente(self, cliente: Cliente):
+        self._append('c', cliente.identificacion, cliente.nombre)
+
+    def registrar_cuenta(self, identificacion: str, cuenta: Cuenta):
+        self._append('a', identificacion, cuenta.numero_cuenta, _serializable(cuenta.saldo))
+
+    def _registrar_movimientos(self, movimientos: list):
+        # Saldo absoluto por cuenta (solo el último de cada una en el grupo)
+        saldos = {}
+        for _, _, numero, _, _, _, saldo in movimientos:
+            saldos[numero] = _serializable(saldo)
+        self._append('s', [[numero, saldo] for numero, saldo in saldos.items()])
+
+    def _registrar_saldos(self, numeros: List[Any], saldos: List[Any]):
+        # Operaciones masivas del LibroCuentas
+        self._append('s', [[numero, _serializable(saldo)] for numero, saldo in zip(numeros, saldos)])
+
+    def _append(self, *registro: Any):
+        seq = self.wal.append(*registro)
+        if self.snapshot_cada and seq - self._seq_snapshot >= self.snapshot_cada:
+            self._snapshot_en_segundo_plano()
+
+    def _aplicar(self, banco: Banco, registro: list):
+        op = registro[1]
+        if op == 's':
+            for numero, saldo in registro[2]:
+                cuenta = banco.cuentas.get(numero)
+                if cuenta is not None:
+                    cuenta.saldo = _desde_serializable(saldo)
+        elif op == 'a':
+            _, _, identificacion, numero, saldo = registro
+            if numero not in banco.cuentas:
+                self._crear_cuenta(banco, identificacion, numero, _desde_serializable(saldo))
+        elif op == 'c':
+            _, _, identificacion, nombre = registro
+            if identificacion not in banco.clientes:
+                banco.clientes[identificacion] = Cliente(nombre, identificacion)
+        else:
+            logger.warning(f"Operación desconocida en el WAL: {op}")
+
+    @staticmethod
+    def _crear_cuenta(banco: Banco, identificacion: str, numero: str, saldo: Any):
+        cuenta = banco._nueva_cuenta(numero, saldo)
+        banco.cuentas[numero] = cuenta
+        cliente = banco.clientes.get(identificacion)
+        if cliente is not None:
+            cliente.agregar_cuenta(cuenta)
+
+    # ---- snapshots y compactación --------------------------------------
+
+    def snapshot(self) -> str:
+        """
+        Tomar un snapshot en línea y borrar los segmentos del WAL y
+        snapshots que dejan de ser necesarios.
+        """
+        if self.banco is None:
+            raise ValueError("No hay un Banco adjunto")
+
+        with self._snapshot_lock:
+            banco = self.banco
+            # Con el lock del banco no se crean clientes ni cuentas mientras
+            # se rota el WAL y se copia la estructura
+            with banco._lock:
+                seq = self.wal.rotar()
+                clientes = [(c.identificacion, c.nombre) for c in banco.clientes.values()]
+                titulares = {cuenta.numero_cuenta: c.identificacion
+                             for c in banco.clientes.values() for cuenta in c.cuentas}
+                cuentas = list(banco.cuentas.values())
+
+            ruta = os.path.join(self.directorio, f"snapshot-{seq:016d}.bin")
+            Snapshot.escribir(ruta, seq, clientes, self._saldos(cuentas, titulares))
+            self._seq_snapshot = seq
+            self._compactar(seq, ruta)
+            return ruta
+
+    def _saldos(self, cuentas: List[Cuenta], titulares: dict) -> List[Tuple[str, str, Any]]:
+        """
+        (numero, titular, saldo) de cada cuenta, incluidas las que no tienen
+        cliente. Cada saldo se lee con el lock de su cuenta: una operación
+        que escribió en el WAL antes de la rotación ya terminó de aplicarse,
+        y las posteriores se reaplican desde el WAL (saldos absolutos).
+        """
+        if self.banco.libro is not None:
+            # Las CuentaVista comparten el lock del libro
+            with self.banco.libro._lock:
+                return [(c.numero_cuenta, titulares.get(c.numero_cuenta, ''), c.saldo)
+                        for c in cuentas]
+        saldos = []
+        for cuenta in cuentas:
+            with cuenta._lock:
+                saldo = cuenta.saldo
+            saldos.append((cuenta.numero_cuenta, titulares.get(cuenta.numero_cuenta, ''), saldo))
+        return saldos
+
+    def _snapshot_en_segundo_plano(self):
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._snapshot_thread = threading.Thread(target=self._snapshot_seguro, name="banco-snapshot",
+                                                 daemon=True)
+        self._snapshot_thread.start()
+
+    def _snapshot_seguro(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            logger.error(f"Error tomando snapshot: {e}")
+
+    def _compactar(self, seq: int, vigente: str):
+        segmentos = self.wal.segmentos()
+        for i, (primer_seq, ruta) in enumerate(segmentos):
+            siguiente = segmentos[i + 1][0] if i + 1 < len(segmentos) else None
+            # Un segmento es prescindible si todos sus registros son <= seq
+            if siguiente is not None and siguiente - 1 <= seq:
+                os.remove(ruta)
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if Snapshot.PATRON.match(nombre) and ruta != vigente:
+                os.remove(ruta)
+
+    def _ultimo_snapshot(self) -> Optional[str]:
+        nombres = sorted(n for n in os.listdir(self.directorio) if Snapshot.PATRON.match(n))
+        return os.path.join(self.directorio, nombres[-1]) if nombres else None
+
+    def sync(self):
+        """Forzar fsync del WAL"""
+        self.wal.sync()
+
+    def cerrar(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.wal.cerrar()
+
+
+def _serializable(saldo: Any) -> Any:
+    return saldo if isinstance(saldo, (int, float)) else str(saldo)
+
+
+def _desde_serializable(saldo: Any) -> Any:
+    return Decimal(saldo) if isinstance(saldo, str) else saldo
+
+
+def _fsync_directorio(directorio: str):
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,424 @@
+"""
+Reconstrucción del estado de las cuentas en un instante desde la auditoría.
+
+Los registros de Cuenta guardan el saldo absoluto después de cada
+operación (estado_despues), igual que los de transferencias en lote
+(saldo_origen y saldo_destino). El saldo de una cuenta en el instante T es
+el del último registro con timestamp <= T, así que alcanza con recorrer
+los registros posteriores al checkpoint más cercano: el costo depende del
+intervalo entre checkpoints, no del largo de la historia.
+
+Un checkpoint guarda clientes, cuentas (con su titular) y saldos de todo
+el banco, en una base SQLite aparte:
+- checkpoint(banco) lo toma de un Banco en memoria; adjuntar(banco) lo
+  repite cada `intervalo` en un hilo
+- generar_checkpoints() los materializa desde la auditoría misma, para la
+  historia ya escrita
+
+Las operaciones masivas de LibroCuentas dejan un solo registro de
+auditoría; con adjuntar(banco) los saldos que producen se guardan como
+ajustes por cuenta y la reconstrucción los incluye.
+
+Los números de cuenta e identificaciones se manejan como texto.
+
+    reconstructor = Reconstructor()
+    reconstructor.adjuntar(banco)
+    ...
+    reconstructor.saldo_en("0001", datetime(2026, 10, 17, 14, 32))
+    reconstructor.saldos_en(ayer, cuentas, hilos=8)
+    banco = reconstructor.reconstruir_banco(ayer)
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .audit_service import AuditRecord, AuditService
+from .banco import Banco
+from .utils import ConnectionManager
+
+import logging
+logger = logging.getLogger(__name__)
+
+Instante = Union[str, datetime]
+
+# Origen de los intervalos de generar_checkpoints
+_ORIGEN = datetime(2000, 1, 1)
+
+
+class EstadoBanco(NamedTuple):
+    clientes: Dict[str, str]    # identificacion -> nombre
+    cuentas: Dict[str, str]     # numero_cuenta -> identificacion del titular
+    saldos: Dict[str, Any]      # numero_cuenta -> saldo
+
+
+def _instante(valor: Instante) -> datetime:
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+
+
+def _hasta(momento: datetime) -> str:
+    # Límite exclusivo que incluye los registros con timestamp == momento
+    return (momento + timedelta(microseconds=1)).isoformat()
+
+
+def _a_columna(saldo: Any) -> Any:
+    return str(saldo) if isinstance(saldo, Decimal) else saldo
+
+
+def _desde_columna(valor: Any) -> Any:
+    # Los códecs de auditoría guardan los Decimal como texto
+    return Decimal(valor) if isinstance(valor, str) else valor
+
+
+def _argumentos(record: AuditRecord, *nombres: str) -> List[Any]:
+    """Argumentos de la operación por posición o por nombre"""
+    args = record.args or []
+    kwargs = record.kwargs or {}
+    return [args[i] if i < len(args) else kwargs.get(nombre) for i, nombre in enumerate(nombres)]
+
+
+def _saldos_de(record: AuditRecord) -> List[Tuple[str, Any]]:
+    """Saldos absolutos (numero_cuenta, saldo) que deja un registro"""
+    despues = record.estado_despues
+    if not despues:
+        return []
+    if 'saldo' in despues:
+        return [(record.entity_id, _desde_columna(despues['saldo']))]
+    if 'saldo_origen' in despues:
+        # Transferencia en lote: el registro es de la cuenta origen
+        origen, destino = _argumentos(record, 'origen', 'destino')
+        return [(str(origen), _desde_columna(despues['saldo_origen'])),
+                (str(destino), _desde_columna(despues['saldo_destino']))]
+    return []
+
+
+class Reconstructor:
+    """Checkpoints de saldos y consultas de estado en un instante (ver módulo)"""
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            inicio TEXT NOT NULL,
+            fin TEXT NOT NULL,
+            cuentas INTEGER NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_checkpoints_fin ON checkpoints (fin)",
+        '''
+        CREATE TABLE IF NOT EXISTS checkpoint_clientes (
+            checkpoint_id INTEGER NOT NULL,
+            identificacion TEXT NOT NULL,
+            nombre TEXT,
+            PRIMARY KEY (checkpoint_id, identificacion)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS checkpoint_cuentas (
+            checkpoint_id INTEGER NOT NULL,
+            numero TEXT NOT NULL,
+            identificacion TEXT,
+            saldo,
+            PRIMARY KEY (checkpoint_id, numero)
+        ) WITHOUT ROWID
+        ''',
+        # Saldos resultantes de operaciones masivas (un registro de auditoría para todas)
+        '''
+        CREATE TABLE IF NOT EXISTS ajustes (
+            timestamp TEXT NOT NULL,
+            numero TEXT NOT NULL,
+            saldo
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_ajustes_numero_ts ON ajustes (numero, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_ajustes_ts ON ajustes (timestamp)",
+    )
+
+    def __init__(self, ruta: Optional[str] = None, intervalo: timedelta = timedelta(hours=1)):
+        if ruta is None:
+            ruta = f"{os.path.splitext(AuditService.DB_PATH)[0]}.checkpoints.db"
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._db = ConnectionManager(ruta, self.SCHEMA)
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    # ---- checkpoints -----------------------------------------------------
+
+    def checkpoint(self, banco: Banco) -> int:
+        """
+        Guardar clientes, cuentas y saldos actuales del banco.
+        Se toma sin detener las operaciones: lo que cambie mientras se copia
+        tiene un registro de auditoría posterior a `inicio` y se reaplica.
+        """
+        inicio = datetime.now().isoformat()
+        with banco._lock:
+            clientes = list(banco.clientes.values())
+            cuentas = dict(banco.cuentas)
+
+        titulares = {str(cuenta.numero_cuenta): str(cliente.identificacion)
+                     for cliente in clientes for cuenta in cliente.cuentas}
+        estado = EstadoBanco(
+            {str(cliente.identificacion): cliente.nombre for cliente in clientes},
+            {str(numero): titulares.get(str(numero)) for numero in cuentas},
+            {str(numero): cuenta.saldo for numero, cuenta in cuentas.items()},
+        )
+        return self._guardar(inicio, datetime.now().isoformat(), estado)
+
+    def adjuntar(self, banco: Banco):
+        """Tomar un checkpoint cada `intervalo` y registrar las operaciones masivas del libro"""
+        if banco.libro is not None:
+            banco.libro.suscribir(self._registrar_ajustes)
+
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._periodico, args=(banco,),
+                                      name="checkpoints-auditoria", daemon=True)
+        self._hilo.start()
+
+    def cerrar(self):
+        """Detener los checkpoints periódicos y cerrar la base"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self._db.close_all()
+
+    def generar_checkpoints(self, hasta: Optional[Instante] = None) -> int:
+        """
+        Materializar checkpoints desde la auditoría, uno por cada intervalo
+        con actividad desde el último existente hasta `hasta` (por defecto
+        ahora). Devuelve cuántos se crearon.
+        """
+        hasta = _instante(hasta).isoformat() if hasta is not None else datetime.now().isoformat()
+
+        ultimo = self._ultimo_checkpoint(hasta)
+        if ultimo is None:
+            desde, estado = None, EstadoBanco({}, {}, {})
+        else:
+            # Desde `inicio`: un checkpoint en línea puede no incluir todo lo
+            # ocurrido mientras se copiaba
+            desde, estado = ultimo[1], self._cargar(ultimo[0])
+
+        creados = 0
+        while True:
+            siguiente = AuditService.first_timestamp(since=desde)
+            if siguiente is None or siguiente >= hasta:
+                return creados
+
+            # Ventana alineada al intervalo que contiene el próximo registro
+            momento = datetime.fromisoformat(siguiente)
+            fin = _ORIGEN + ((momento - _ORIGEN) // self.intervalo + 1) * self.intervalo
+            fin = min(fin.isoformat(), hasta)
+
+            cambios = self._ventana(desde, fin)
+            for actual, nuevo in zip(estado, cambios):
+                actual.update(nuevo)
+            self._guardar(fin, fin, estado)
+            creados += 1
+            desde = fin
+
+    # ---- consultas -------------------------------------------------------
+
+    def estado_en(self, momento: Instante) -> EstadoBanco:
+        """Clientes, cuentas y saldos de todo el banco en `momento`"""
+        hasta = _hasta(_instante(momento))
+        base = self._ultimo_checkpoint(hasta)
+
+        estado = self._ventana(base[1] if base else None, hasta)
+        if base is not None:
+            for actual, anterior in zip(estado, self._cargar(base[0])):
+                for clave, valor in anterior.items():
+                    actual.setdefault(clave, valor)
+        return estado
+
+    def saldos_en(self, momento: Instante, cuentas: Optional[Iterable[Any]] = None,
+                  hilos: int = 1) -> Dict[str, Any]:
+        """
+        Saldos en `momento`: de todas las cuentas, o solo de `cuentas`
+        consultando cada una por índice (en paralelo con `hilos` > 1).
+        Las cuentas que aún no existían no aparecen en el resultado.
+        """
+        if cuentas is None:
+            return self.estado_en(momento).saldos
+
+        hasta = _hasta(_instante(momento))
+        base = self._ultimo_checkpoint(hasta)
+        checkpoint_id, desde = (base[0], base[1]) if base else (None, None)
+
+        # Registros de Banco de la ventana, compartidos por todas las cuentas:
+        # altas y transferencias en lote (que también fijan el saldo destino)
+        creadas = set()
+        for record in AuditService.iter_audit_history(operation_type="crear_cuenta",
+                                                      since=desde, until=hasta):
+            if record.status == "SUCCESS":
+                creadas.add(str(_argumentos(record, 'identificacion', 'numero_cuenta')[1]))
+        lotes: Dict[str, Tuple[str, Any]] = {}
+        for record in AuditService.iter_audit_history(operation_type="transferencia",
+                                                      since=desde, until=hasta):
+            for numero, saldo in _saldos_de(record):
+                lotes.setdefault(numero, (record.timestamp, saldo))
+
+        def saldo_de(numero: str) -> Optional[Tuple[str, Any]]:
+            candidatos = []
+            if numero in lotes:
+                candidatos.append(lotes[numero])
+            for record in AuditService.iter_audit_history(entity_id=numero, since=desde, until=hasta):
+                saldos = dict(_saldos_de(record))
+                if numero in saldos:
+                    candidatos.append((record.timestamp, saldos[numero]))
+                    break
+            ajuste = self._ajuste(numero, desde, hasta)
+            if ajuste is not None:
+                candidatos.append(ajuste)
+
+            if candidatos:
+                return max(candidatos, key=lambda candidato: candidato[0])
+            if checkpoint_id is not None:
+                saldo = self._saldo_checkpoint(checkpoint_id, numero)
+                if saldo is not None:
+                    return saldo
+            return ('', 0) if numero in creadas else None
+
+        numeros = [str(numero) for numero in cuentas]
+        if hilos > 1:
+            with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="reconstruccion") as executor:
+                resultados = list(executor.map(saldo_de, numeros))
+        else:
+            resultados = [saldo_de(numero) for numero in numeros]
+
+        return {numero: resultado[1] for numero, resultado in zip(numeros, resultados)
+                if resultado is not None}
+
+    def saldo_en(self, numero_cuenta: Any, momento: Instante) -> Optional[Any]:
+        """Saldo de una cuenta en `momento` (None si aún no existía)"""
+        return self.saldos_en(momento, [numero_cuenta]).get(str(numero_cuenta))
+
+    def reconstruir_banco(self, momento: Instante, libro=None) -> Banco:
+        """Armar un Banco nuevo con los clientes, cuentas y saldos de `momento`"""
+        estado = self.estado_en(momento)
+        banco = Banco(libro=libro)
+        for identificacion, nombre in estado.clientes.items():
+            banco._crear_cliente(nombre, identificacion)
+        for numero, titular in estado.cuentas.items():
+            if titular not in banco.clientes:
+                logger.warning(f"Cuenta {numero} sin titular conocido, se omite")
+                continue
+            cuenta = banco._crear_cuenta(titular, numero)
+            cuenta.saldo = estado.saldos.get(numero, 0)
+        banco.ledger.inicio = time.time()
+        return banco
+
+    # ---- internos --------------------------------------------------------
+
+    def _ventana(self, desde: Optional[str], hasta: str) -> EstadoBanco:
+        """Último valor de cada cliente, cuenta y saldo cambiado en [desde, hasta)"""
+        clientes: Dict[str, str] = {}
+        cuentas: Dict[str, str] = {}
+        saldos: Dict[str, Any] = {}
+        tiempos: Dict[str, str] = {}
+
+        # Del más reciente al más antiguo: gana el primer valor visto
+        for record in AuditService.iter_audit_history(since=desde, until=hasta):
+            if record.status == "SUCCESS" and record.operation_type == "crear_cliente":
+                nombre, identificacion = _argumentos(record, 'nombre', 'identificacion')
+                clientes.setdefault(str(identificacion), nombre)
+            elif record.status == "SUCCESS" and record.operation_type == "crear_cuenta":
+                identificacion, numero = _argumentos(record, 'identificacion', 'numero_cuenta')
+                cuentas.setdefault(str(numero), str(identificacion))
+                saldos.setdefault(str(numero), 0)
+                tiempos.setdefault(str(numero), record.timestamp)
+            else:
+                for numero, saldo in _saldos_de(record):
+                    if numero not in tiempos:
+                        saldos[numero] = saldo
+                        tiempos[numero] = record.timestamp
+
+        conn = self._db.get_connection()
+        query = "SELECT timestamp, numero, saldo FROM ajustes WHERE timestamp < ?"
+        params: List[Any] = [hasta]
+        if desde is not None:
+            query += " AND timestamp >= ?"
+            params.append(desde)
+        for timestamp, numero, saldo in conn.execute(query + " ORDER BY timestamp DESC", params):
+            if numero not in tiempos or timestamp > tiempos[numero]:
+                saldos[numero] = _desde_columna(saldo)
+                tiempos[numero] = timestamp
+
+        return EstadoBanco(clientes, cuentas, saldos)
+
+    def _guardar(self, inicio: str, fin: str, estado: EstadoBanco) -> int:
+        conn = self._db.get_connection()
+        with conn:
+            checkpoint_id = conn.execute(
+                "INSERT INTO checkpoints (inicio, fin, cuentas) VALUES (?, ?, ?)",
+                (inicio, fin, len(estado.saldos))).lastrowid
+            conn.executemany(
+                "INSERT INTO checkpoint_clientes (checkpoint_id, identificacion, nombre) VALUES (?, ?, ?)",
+                [(checkpoint_id, identificacion, nombre)
+                 for identificacion, nombre in estado.clientes.items()])
+            conn.executemany(
+                "INSERT INTO checkpoint_cuentas (checkpoint_id, numero, identificacion, saldo) "
+                "VALUES (?, ?, ?, ?)",
+                [(checkpoint_id, numero, estado.cuentas.get(numero), _a_columna(saldo))
+                 for numero, saldo in estado.saldos.items()])
+        logger.info("Checkpoint %d de auditoría: %d cuentas al %s", checkpoint_id, len(estado.saldos), fin)
+        return checkpoint_id
+
+    def _cargar(self, checkpoint_id: int) -> EstadoBanco:
+        conn = self._db.get_connection()
+        clientes = dict(conn.execute(
+            "SELECT identificacion, nombre FROM checkpoint_clientes WHERE checkpoint_id = ?",
+            (checkpoint_id,)))
+        cuentas: Dict[str, str] = {}
+        saldos: Dict[str, Any] = {}
+        for numero, identificacion, saldo in conn.execute(
+                "SELECT numero, identificacion, saldo FROM checkpoint_cuentas WHERE checkpoint_id = ?",
+                (checkpoint_id,)):
+            if identificacion is not None:
+                cuentas[numero] = identificacion
+            saldos[numero] = _desde_columna(saldo)
+        return EstadoBanco(clientes, cuentas, saldos)
+
+    def _ultimo_checkpoint(self, hasta: str) -> Optional[Tuple[int, str, str]]:
+        """(id, inicio, fin) del checkpoint más reciente que termina antes de `hasta`"""
+        return self._db.get_connection().execute(
+            "SELECT id, inicio, fin FROM checkpoints WHERE fin < ? ORDER BY fin DESC LIMIT 1",
+            (hasta,)).fetchone()
+
+    def _saldo_checkpoint(self, checkpoint_id: int, numero: str) -> Optional[Tuple[str, Any]]:
+        fila = self._db.get_connection().execute(
+            "SELECT saldo FROM checkpoint_cuentas WHERE checkpoint_id = ? AND numero = ?",
+            (checkpoint_id, numero)).fetchone()
+        return None if fila is None else ('', _desde_columna(fila[0]))
+
+    def _ajuste(self, numero: str, desde: Optional[str], hasta: str) -> Optional[Tuple[str, Any]]:
+        query = "SELECT timestamp, saldo FROM ajustes WHERE numero = ? AND timestamp < ?"
+        params: List[Any] = [numero, hasta]
+        if desde is not None:
+            query += " AND timestamp >= ?"
+            params.append(desde)
+        fila = self._db.get_connection().execute(
+            query + " ORDER BY timestamp DESC LIMIT 1", params).fetchone()
+        return None if fila is None else (fila[0], _desde_columna(fila[1]))
+
+    def _registrar_ajustes(self, numeros: List[Any], saldos: List[Decimal]):
+        timestamp = datetime.now().isoformat()
+        try:
+            conn = self._db.get_connection()
+            with conn:
+                conn.executemany("INSERT INTO ajustes (timestamp, numero, saldo) VALUES (?, ?, ?)",
+                                 [(timestamp, str(numero), _a_columna(saldo))
+                                  for numero, saldo in zip(numeros, saldos)])
+        except Exception as e:
+            logger.error(f"Error registrando ajustes de saldo masivos: {e}")
+
+    def _periodico(self, banco: Banco):
+        while not self._detener.wait(self.intervalo.total_seconds()):
+            try:
+                self.checkpoint(banco)
+            except Exception as e:
+                logger.error(f"Error tomando checkpoint de auditoría: {e}")
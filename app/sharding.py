@@ -0,0 +1,563 @@
+"""
+Banco particionado en procesos.
+
+BancoDistribuido reparte las cuentas entre N procesos trabajadores según
+un hash estable de numero_cuenta. Cada trabajador tiene su propio Banco,
+sus Cuentas, su base de auditoría y su estado durable (ShardStore, en
+SQLite). Los clientes se replican en todos los shards.
+
+- Transferencia dentro de un shard: Banco.transferir local, en una sola
+  transacción del ShardStore.
+- Transferencia entre shards: commit en dos fases coordinado por el
+  proceso router.
+    1. preparar: el shard origen debita la cuenta y guarda la reserva;
+       el destino valida la cuenta y guarda la acreditación pendiente.
+       Cada preparación es durable y atómica con el cambio de saldo.
+    2. si ambos votan sí, la decisión se registra en coordinador.db
+       (punto de compromiso) y se confirma en los dos shards; si alguno
+       vota no o no responde, se aborta (el origen devuelve la reserva).
+  Sin decisión registrada se presume aborto. Si un trabajador muere, se
+  reinicia desde su ShardStore y las transacciones preparadas que quedan
+  en duda se resuelven con coordinador.db; confirmar y abortar son
+  idempotentes.
+
+    banco = BancoDistribuido(shards=4)
+    banco.crear_cliente("Ana", "1")
+    banco.crear_cuenta("1", "0001")
+    banco.depositar("0001", 100)
+    banco.transferir("0001", "0002", 10)
+    banco.cerrar()
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from .logging_config import configurar_logging
+from .persistencia import _desde_serializable, _serializable
+from .utils import ConnectionManager
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def shard_de(numero_cuenta, shards: int) -> int:
+    """Shard dueño de una cuenta (estable entre procesos, a diferencia de hash())"""
+    return zlib.crc32(str(numero_cuenta).encode('utf-8')) % shards
+
+
+class ShardCaido(ConnectionError):
+    """El proceso trabajador terminó antes de responder"""
+
+
+# ---- lado del trabajador ------------------------------------------------
+
+class ShardStore:
+    """
+    Estado durable de un shard: clientes, cuentas con su saldo y
+    transacciones preparadas. Se conecta al Banco como su `store` y como
+    suscriptor del Ledger; cada solicitud se confirma en una transacción.
+    Saldos y montos Decimal se guardan como texto (columnas sin afinidad,
+    para que SQLite no los convierta a REAL) y se leen como Decimal.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS clientes (identificacion TEXT PRIMARY KEY, nombre TEXT NOT NULL)",
+        '''
+        CREATE TABLE IF NOT EXISTS cuentas (
+            numero_cuenta TEXT PRIMARY KEY,
+            identificacion TEXT NOT NULL,
+            saldo NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS preparadas (
+            txid TEXT PRIMARY KEY,
+            rol TEXT NOT NULL,
+            numero_cuenta TEXT NOT NULL,
+            contraparte TEXT NOT NULL,
+            monto NOT NULL
+        )
+        ''',
+    )
+
+    def __init__(self, db_path: str):
+        self._manager = ConnectionManager(db_path, self.SCHEMA)
+
+    @property
+    def conn(self):
+        return self._manager.get_connection()
+
+    def cargar(self):
+        """Reconstruir el Banco del shard y sus transacciones preparadas"""
+        from .banco import Banco
+        from .cliente import Cliente
+
+        banco = Banco()
+        for identificacion, nombre in self.conn.execute("SELECT identificacion, nombre FROM clientes"):
+            banco.clientes[identificacion] = Cliente(nombre, identificacion)
+        for numero, identificacion, saldo in self.conn.execute(
+                "SELECT numero_cuenta, identificacion, saldo FROM cuentas"):
+            cuenta = banco._nueva_cuenta(numero, _desde_serializable(saldo))
+            banco.cuentas[numero] = cuenta
+            banco.clientes[identificacion].agregar_cuenta(cuenta)
+
+        preparadas = {txid: (rol, numero, contraparte, _desde_serializable(monto))
+                      for txid, rol, numero, contraparte, monto
+                      in self.conn.execute("SELECT * FROM preparadas")}
+
+        banco.store = self
+        banco.ledger.suscribir(self._registrar_movimientos)
+        return banco, preparadas
+
+    def registrar_cliente(self, cliente):
+        self.conn.execute("INSERT INTO clientes VALUES (?, ?)", (cliente.identificacion, cliente.nombre))
+
+    def registrar_cuenta(self, identificacion, cuenta):
+        self.conn.execute("INSERT INTO cuentas VALUES (?, ?, ?)",
+                          (cuenta.numero_cuenta, identificacion, _serializable(cuenta.saldo)))
+
+    def registrar_preparada(self, txid, rol, numero, contraparte, monto):
+        self.conn.execute("INSERT INTO preparadas VALUES (?, ?, ?, ?, ?)",
+                          (txid, rol, numero, contraparte, _serializable(monto)))
+
+    def borrar_preparada(self, txid):
+        self.conn.execute("DELETE FROM preparadas WHERE txid = ?", (txid,))
+
+    def _registrar_movimientos(self, movimientos):
+        self.conn.executemany("UPDATE cuentas SET saldo = ? WHERE numero_cuenta = ?",
+                              [(_serializable(saldo), numero)
+                               for _, _, numero, _, _, _, saldo in movimientos])
+
+    def cerrar(self):
+        self._manager.close_all()
+
+
+class Shard:
+    """Operaciones que atiende un trabajador; cada una es una transacción"""
+
+    def __init__(self, directorio: str):
+        self.store = ShardStore(os.path.join(directorio, "shard.db"))
+        self.banco, self.preparadas = self.store.cargar()
+
+    def ejecutar(self, metodo: str, args: tuple):
+        operacion = getattr(self, f"op_{metodo}")
+        # Si la operación falla se revierte lo escrito. Cada operación
+        # escribe en el store antes de tocar la memoria (los saldos pasan
+        # por los suscriptores del libro antes de aplicarse), así que la
+        # memoria solo cambia cuando la operación no lanza excepción
+        with self.store.conn:
+            return operacion(*args)
+
+    def op_crear_cliente(self, nombre, identificacion):
+        if identificacion not in self.banco.clientes:
+            self.banco.crear_cliente(nombre, identificacion)
+        return identificacion
+
+    def op_crear_cuenta(self, identificacion, numero_cuenta):
+        if numero_cuenta in self.banco.cuentas:
+            raise ValueError(f"La cuenta {numero_cuenta} ya existe")
+        return self.banco.crear_cuenta(identificacion, numero_cuenta).numero_cuenta
+
+    def op_depositar(self, numero_cuenta, monto):
+        cuenta = self._cuenta(numero_cuenta)
+        cuenta.depositar(monto)
+        return cuenta.saldo
+
+    def op_retirar(self, numero_cuenta, monto):
+        cuenta = self._cuenta(numero_cuenta)
+        cuenta.retirar(monto)
+        return cuenta.saldo
+
+    def op_consultar_saldo(self, numero_cuenta):
+        return self._cuenta(numero_cuenta).saldo
+
+    def op_transferir(self, origen, destino, monto):
+        for numero in (origen, destino):
+            self._cuenta(numero)
+        self.banco.transferir(origen, destino, monto)
+
+    def op_preparar_debito(self, txid, numero_cuenta, contraparte, monto):
+        if txid in self.preparadas:
+            return
+        cuenta = self._cuenta(numero_cuenta)
+        # Primero la fila: si el INSERT falla la memoria no cambió. Si
+        # después falla el débito, el rollback de ejecutar() la borra
+        self.store.registrar_preparada(txid, 'debito', numero_cuenta, contraparte, monto)
+        cuenta.retirar(monto, contraparte=contraparte)
+        self.preparadas[txid] = ('debito', numero_cuenta, contraparte, monto)
+
+    def op_preparar_credito(self, txid, numero_cuenta, contraparte, monto):
+        if txid in self.preparadas:
+            return
+        self._cuenta(numero_cuenta)
+        self.store.registrar_preparada(txid, 'credito', numero_cuenta, contraparte, monto)
+        self.preparadas[txid] = ('credito', numero_cuenta, contraparte, monto)
+
+    def op_confirmar(self, txid):
+        preparada = self.preparadas.get(txid)
+        if preparada is None:
+            return
+        rol, numero, contraparte, monto = preparada
+        self.store.borrar_preparada(txid)
+        if rol == 'credito':
+            self._cuenta(numero).depositar(monto, contraparte=contraparte)
+        del self.preparadas[txid]
+
+    def op_abortar(self, txid):
+        preparada = self.preparadas.get(txid)
+        if preparada is None:
+            return
+        rol, numero, contraparte, monto = preparada
+        self.store.borrar_preparada(txid)
+        if rol == 'debito':
+            # Devolver la reserva
+            self._cuenta(numero).depositar(monto, contraparte=contraparte)
+        del self.preparadas[txid]
+
+    def op_preparadas(self):
+        return list(self.preparadas)
+
+    def op_total(self):
+        """Dinero del shard, incluidas las reservas de débitos preparados"""
+        reservado = sum(monto for rol, _, _, monto in self.preparadas.values() if rol == 'debito')
+        return sum(c.saldo for c in self.banco.cuentas.values()) + reservado
+
+    def _cuenta(self, numero_cuenta):
+        cuenta = self.banco.cuentas.get(numero_cuenta)
+        if cuenta is None:
+            raise ValueError(f"Cuenta {numero_cuenta} no encontrada")
+        return cuenta
+
+    def cerrar(self):
+        from .audit_service import AuditService
+        from .email_service import EmailService
+
+        AuditService.close()
+        EmailService.close()
+        self.store.cerrar()
+
+
+def _proceso_shard(directorio: str, conexion, nivel_log: int):
+    """Bucle del proceso trabajador: (id, método, args) -> (id, ok, resultado)"""
+    from .audit_service import AuditService
+    from .email_service import EmailService
+
+    # Base de auditoría y bandeja de salida propias del shard
+    AuditService.DB_PATH = os.path.join(directorio, "audit_log.db")
+    EmailService.OUTBOX_DB_PATH = os.path.join(directorio, "email_outbox.db")
+
+    configurar_logging(os.path.join(directorio, "banco_audit.log"), nivel=nivel_log)
+    shard = Shard(directorio)
+    try:
+        while True:
+            try:
+                mensaje = conexion.recv()
+            except EOFError:
+                break
+            if mensaje is None:
+                break
+            id_mensaje, metodo, args = mensaje
+            try:
+                respuesta = (id_mensaje, True, shard.ejecutar(metodo, args))
+            except Exception as e:
+                respuesta = (id_mensaje, False, e)
+            conexion.send(respuesta)
+    finally:
+        shard.cerrar()
+
+
+# ---- lado del router ----------------------------------------------------
+
+class ShardRemoto:
+    """Proceso trabajador y canal de solicitudes multiplexadas hacia él"""
+
+    def __init__(self, indice: int, directorio: str, contexto, nivel_log: int):
+        self.indice = indice
+        self.directorio = directorio
+        self._contexto = contexto
+        self._nivel_log = nivel_log
+        self._proceso = None
+        self._conexion = None
+        self._pendientes: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def vivo(self) -> bool:
+        return self._proceso is not None and self._proceso.is_alive()
+
+    def iniciar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        local, remota = self._contexto.Pipe()
+        self._proceso = self._contexto.Process(
+            target=_proceso_shard, args=(self.directorio, remota, self._nivel_log),
+            name=f"banco-shard-{self.indice}", daemon=True)
+        self._proceso.start()
+        remota.close()
+        self._conexion = local
+        threading.Thread(target=self._recibir, args=(local,), name=f"shard-{self.indice}-rx",
+                         daemon=True).start()
+
+    def llamar(self, metodo: str, *args) -> Future:
+        futuro: Future = Future()
+        with self._lock:
+            id_mensaje = next(self._ids)
+            self._pendientes[id_mensaje] = futuro
+            try:
+                self._conexion.send((id_mensaje, metodo, args))
+            except (OSError, ValueError) as e:
+                del self._pendientes[id_mensaje]
+                futuro.set_exception(ShardCaido(f"Shard {self.indice}: {e}"))
+        return futuro
+
+    def _recibir(self, conexion):
+        try:
+            while True:
+                id_mensaje, ok, resultado = conexion.recv()
+                with self._lock:
+                    futuro = self._pendientes.pop(id_mensaje)
+                if ok:
+                    futuro.set_result(resultado)
+                else:
+                    futuro.set_exception(resultado)
+        except (EOFError, OSError):
+            pass
+        # El proceso terminó: fallar lo que esperaba respuesta
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        for futuro in pendientes.values():
+            futuro.set_exception(ShardCaido(f"Shard {self.indice} terminó"))
+
+    def detener(self, timeout: Optional[float] = 10.0):
+        if self._conexion is not None:
+            try:
+                with self._lock:
+                    self._conexion.send(None)
+            except (OSError, ValueError):
+                pass
+        if self._proceso is not None:
+            self._proceso.join(timeout)
+            if self._proceso.is_alive():
+                self._proceso.terminate()
+        if self._conexion is not None:
+            self._conexion.close()
+
+    def matar(self):
+        """Terminar el proceso abruptamente (pruebas de recuperación)"""
+        self._proceso.kill()
+        self._proceso.join()
+
+
+class BancoDistribuido:
+    """Router con la API de Banco sobre N shards en procesos (ver módulo)"""
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS decisiones (
+            txid TEXT PRIMARY KEY,
+            shard_origen INTEGER NOT NULL,
+            shard_destino INTEGER NOT NULL,
+            creada REAL NOT NULL
+        )
+        ''',
+    )
+
+    def __init__(self, shards: Optional[int] = None, directorio: str = "shards",
+                 timeout: float = 30.0, nivel_log: int = logging.WARNING):
+        self.shards = shards or os.cpu_count() or 1
+        self.directorio = directorio
+        self.timeout = timeout
+        os.makedirs(directorio, exist_ok=True)
+
+        self._coordinador = ConnectionManager(os.path.join(directorio, "coordinador.db"), self.SCHEMA)
+        # Transacciones con la decisión aún pendiente en este router
+        self._en_curso: set = set()
+        self._en_curso_lock = threading.Lock()
+        self._reinicio_lock = threading.Lock()
+
+        contexto = multiprocessing.get_context("spawn")
+        self._remotos = [ShardRemoto(i, os.path.join(directorio, f"shard-{i}"), contexto, nivel_log)
+                         for i in range(self.shards)]
+        for remoto in self._remotos:
+            remoto.iniciar()
+        for remoto in self._remotos:
+            self._resolver_en_duda(remoto)
+
+    # ---- API de Banco ----------------------------------------------------
+
+    def crear_cliente(self, nombre, identificacion):
+        """Crear el cliente en todos los shards"""
+        for futuro in [self._llamar(r, 'crear_cliente', nombre, identificacion) for r in self._remotos]:
+            futuro.result(self.timeout)
+        return identificacion
+
+    def crear_cuenta(self, identificacion, numero_cuenta):
+        """Crear la cuenta en su shard; devuelve el número de cuenta"""
+        return self._ejecutar(self._remoto(numero_cuenta), 'crear_cuenta', identificacion, numero_cuenta)
+
+    def depositar(self, numero_cuenta, monto):
+        return self._ejecutar(self._remoto(numero_cuenta), 'depositar', numero_cuenta, monto)
+
+    def retirar(self, numero_cuenta, monto):
+        return self._ejecutar(self._remoto(numero_cuenta), 'retirar', numero_cuenta, monto)
+
+    def consultar_saldo(self, numero_cuenta):
+        return self._ejecutar(self._remoto(numero_cuenta), 'consultar_saldo', numero_cuenta)
+
+    def transferir(self, origen, destino, monto):
+        remoto_origen, remoto_destino = self._remoto(origen), self._remoto(destino)
+        if remoto_origen is remoto_destino:
+            return self._ejecutar(remoto_origen, 'transferir', origen, destino, monto)
+        return self._transferir_entre_shards(remoto_origen, remoto_destino, origen, destino, monto)
+
+    def total(self):
+        """Dinero total de todos los shards (para verificar conservación)"""
+        futuros = [self._llamar(r, 'total') for r in self._remotos]
+        return sum(f.result(self.timeout) for f in futuros)
+
+    def cerrar(self):
+        for remoto in self._remotos:
+            remoto.detener()
+        self._coordinador.close_all()
+
+    # ---- commit en dos fases -------------------------------------------
+
+    def _transferir_entre_shards(self, remoto_origen, remoto_destino, origen, destino, monto):
+        txid = uuid.uuid4().hex
+        with self._en_curso_lock:
+            self._en_curso.add(txid)
+        try:
+            votos = [self._llamar(remoto_origen, 'preparar_debito', txid, origen, destino, monto),
+                     self._llamar(remoto_destino, 'preparar_credito', txid, destino, origen, monto)]
+            error = None
+            for voto in votos:
+                try:
+                    voto.result(self.timeout)
+                except Exception as e:
+                    error = error or e
+
+            if error is not None:
+                # Presunción de aborto: no hace falta registrar la decisión
+                for remoto in (remoto_origen, remoto_destino):
+                    self._decidir(remoto, 'abortar', txid)
+                raise error
+
+            conn = self._coordinador.get_connection()
+            with conn:
+                conn.execute("INSERT INTO decisiones VALUES (?, ?, ?, ?)",
+                             (txid, remoto_origen.indice, remoto_destino.indice, time.time()))
+
+            entregadas = [self._decidir(remoto, 'confirmar', txid)
+                          for remoto in (remoto_origen, remoto_destino)]
+            if all(entregadas):
+                with conn:
+                    conn.execute("DELETE FROM decisiones WHERE txid = ?", (txid,))
+            # Si algún shard no respondió, confirmará al reiniciarse
+        finally:
+            with self._en_curso_lock:
+                self._en_curso.discard(txid)
+
+    def _decidir(self, remoto: ShardRemoto, decision: str, txid: str) -> bool:
+        try:
+            self._ejecutar(remoto, decision, txid)
+            return True
+        except ShardCaido as e:
+            logger.warning(f"Decisión '{decision}' de {txid} pendiente: {e}")
+            return False
+
+    def _resolver_en_duda(self, remoto: ShardRemoto):
+        """Resolver las transacciones preparadas de un shard recién iniciado"""
+        # Primero las preparadas y después lo que está en curso y lo
+        # decidido: una transacción que otro hilo preparó en el shard ya
+        # reiniciado figura en `en_curso` (o en decisiones, o ya terminó y
+        # abortarla no hace nada), nunca se aborta por una foto vieja
+        preparadas = remoto.llamar('preparadas').result(self.timeout)
+        with self._en_curso_lock:
+            en_curso = set(self._en_curso)
+        conn = self._coordinador.get_connection()
+        confirmadas = {txid for (txid,) in conn.execute("SELECT txid FROM decisiones")}
+
+        for txid in preparadas:
+            if txid in en_curso:
+                continue
+            decision = 'confirmar' if txid in confirmadas else 'abortar'
+            remoto.llamar(decision, txid).result(self.timeout)
+            logger.info("Shard %d: transacción en duda %s -> %s", remoto.indice, txid, decision)
+
+        # Decisiones cuyo otro participante ya no tiene nada pendiente
+        for txid, shard_origen, shard_destino in conn.execute(
+                "SELECT txid, shard_origen, shard_destino FROM decisiones").fetchall():
+            if txid in en_curso:
+                continue
+            pendientes = [self._remotos[i] for i in (shard_origen, shard_destino)]
+            if all(r.vivo for r in pendientes):
+                for r in pendientes:
+                    r.llamar('confirmar', txid).result(self.timeout)
+                with conn:
+                    conn.execute("DELETE FROM decisiones WHERE txid = ?", (txid,))
+
+    # ---- envío ------------------------------------------------------------
+
+    def _remoto(self, numero_cuenta) -> ShardRemoto:
+        return self._remotos[shard_de(numero_cuenta, self.shards)]
+
+    def _llamar(self, remoto: ShardRemoto, metodo: str, *args) -> Future:
+        if not remoto.vivo:
+            self._reiniciar(remoto)
+        return remoto.llamar(metodo, *args)
+
+    def _ejecutar(self, remoto: ShardRemoto, metodo: str, *args):
+        return self._llamar(remoto, metodo, *args).result(self.timeout)
+
+    def _reiniciar(self, remoto: ShardRemoto):
+        with self._reinicio_lock:
+            if remoto.vivo:
+                return
+            logger.warning(f"Reiniciando shard {remoto.indice}")
+            remoto.detener(timeout=0)
+            remoto.iniciar()
+            self._resolver_en_duda(remoto)
+
+
+def verificar_distribuido(banco: BancoDistribuido, cuentas: List[Any], hilos: int = 16,
+                          transferencias: int = 10000, monto_maximo: int = 50) -> Dict[str, Any]:
+    """Transferencias aleatorias concurrentes y verificación de conservación del dinero"""
+    import random
+
+    total_antes = banco.total()
+    fallidas = [0] * hilos
+
+    def trabajar(indice):
+        rng = random.Random(indice)
+        for _ in range(transferencias // hilos):
+            origen, destino = rng.sample(cuentas, 2)
+            try:
+                banco.transferir(origen, destino, rng.randint(1, monto_maximo))
+            except (ValueError, ShardCaido):
+                fallidas[indice] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    total_despues = banco.total()
+    return {
+        'total_antes': total_antes,
+        'total_despues': total_despues,
+        'conservado': total_antes == total_despues,
+        'transferencias': transferencias,
+        'fallidas': sum(fallidas),
+        'segundos': duracion,
+        'transferencias_por_segundo': transferencias / duracion if duracion else 0.0,
+    }
@@ -1,10 +1,20 @@
+import contextvars
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 class Transaccion:
-    def __init__(self, tipo, monto, cuenta_origen, cuenta_destino=None):
+    __slots__ = ('tipo', 'monto', 'fecha', 'cuenta_origen', 'cuenta_destino')
+
+    def __init__(self, tipo, monto, cuenta_origen, cuenta_destino=None, fecha=None):
         self.tipo = tipo  # 'deposito', 'retiro', 'transferencia'
         self.monto = monto
-        self.fecha = datetime.now()
+        self.fecha = fecha or datetime.now()
         self.cuenta_origen = cuenta_origen
         self.cuenta_destino = cuenta_destino
 
@@ -12,3 +22,265 @@ class Transaccion:
         if self.tipo == 'transferencia':
             return f"[{self.fecha}] Transferencia de {self.monto} de {self.cuenta_origen} a {self.cuenta_destino}"
         return f"[{self.fecha}] {self.tipo.capitalize()} de {self.monto} en cuenta {self.cuenta_origen}"
+
+
+Fecha = Union[datetime, float]
+Movimiento = Tuple[int, str, str, float, Optional[str], float, float]
+# (saldo_inicial, fechas, montos, saldos, tipos, contrapartes), ver Ledger.columnas
+Columnas = Tuple[int, array, array, array, array, List[Optional[str]]]
+
+
+def _as_epoch(fecha: Fecha) -> float:
+    return fecha.timestamp() if isinstance(fecha, datetime) else fecha
+
+
+def redondear_centavos(valor) -> int:
+    """Monto (int, float o Decimal) en centavos, redondeado al centavo"""
+    if type(valor) is int:
+        return valor * 100
+    if isinstance(valor, Decimal):
+        return int(valor.scaleb(2).to_integral_value())
+    return round(valor * 100)
+
+
+def texto_centavos(centavos: int, signo: bool = False) -> str:
+    """Centavos como texto con dos decimales, sin pasar por float"""
+    entero, resto = divmod(abs(centavos), 100)
+    prefijo = '-' if centavos < 0 else ('+' if signo else '')
+    return f"{prefijo}{entero}.{resto:02d}"
+
+
+def desde_centavos(centavos: int) -> Decimal:
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+class Ledger:
+    """
+    Libro de movimientos en memoria, solo de agregado.
+
+    Cada movimiento ocupa una posición en arreglos tipados paralelos
+    (monto con signo y saldo resultante en centavos enteros, fecha como
+    epoch, tipo y cuentas como enteros), unos 45 bytes por movimiento.
+    Los montos se redondean al centavo al registrarlos, así que un saldo
+    Decimal se lee sin el error de un float; `movimiento()` los devuelve
+    como Decimal. Cada cuenta guarda las
+    posiciones de sus movimientos; como las fechas no decrecen, las
+    consultas por rango de fechas son búsquedas binarias. Una transferencia
+    genera un movimiento por cuenta (negativo en el origen, positivo en el
+    destino).
+
+    Los suscriptores reciben cada movimiento como
+    (posicion, tipo, numero_cuenta, monto, contraparte, fecha, saldo)
+    antes de que la cuenta aplique el saldo; si un suscriptor lanza, la
+    operación falla. Dentro de `agrupar()` los movimientos del hilo (o
+    tarea asyncio) se entregan juntos al salir del bloque, y no se
+    entregan si el bloque lanza una excepción. Como para entonces las
+    cuentas ya aplicaron sus saldos, si el bloque o un suscriptor lanza se
+    ejecutan las funciones `deshacer` de sus movimientos (en orden
+    inverso), que restauran los saldos anteriores.
+    """
+
+    TIPOS = ('deposito', 'retiro', 'transferencia')
+
+    def __init__(self):
+        self._montos = array('q')  # centavos
+        self._saldos = array('q')
+        self._fechas = array('d')
+        self._tipos = array('b')
+        self._cuentas = array('i')
+        self._contrapartes = array('i')  # -1: sin contraparte
+
+        self._ids: Dict[str, int] = {}
+        self._numeros: List[str] = []
+        self._por_cuenta: List[array] = []
+        self._codigos = {tipo: i for i, tipo in enumerate(self.TIPOS)}
+        self._ultima_fecha = 0.0
+        # Desde cuándo (epoch) el libro tiene todos los movimientos de sus
+        # cuentas; None: desde siempre. Un banco cargado de un snapshot o
+        # reconstruido empieza con los saldos pero sin su historia
+        self.inicio: Optional[float] = None
+        self._lock = threading.Lock()
+        self._suscriptores: List[Callable[[List[Movimiento]], None]] = []
+        # Por contexto: cada hilo y cada tarea asyncio agrupa por separado
+        self._grupo: contextvars.ContextVar = contextvars.ContextVar(
+            f"ledger_grupo_{id(self)}", default=None)
+
+    def __len__(self):
+        return len(self._montos)
+
+    def _id_cuenta(self, numero_cuenta) -> int:
+        id_cuenta = self._ids.get(numero_cuenta)
+        if id_cuenta is None:
+            id_cuenta = len(self._numeros)
+            self._ids[numero_cuenta] = id_cuenta
+            self._numeros.append(numero_cuenta)
+            self._por_cuenta.append(array('q'))
+        return id_cuenta
+
+    def suscribir(self, callback: Callable[[List[Movimiento]], None]):
+        """Recibir los movimientos nuevos (ver docstring de la clase)"""
+        self._suscriptores.append(callback)
+
+    @contextmanager
+    def agrupar(self):
+        """Entregar juntos a los suscriptores los movimientos de este bloque"""
+        if self._grupo.get() is not None:
+            # Grupo anidado: se entrega con el exterior
+            yield
+            return
+        grupo: List[Movimiento] = []
+        deshacer: List[Callable[[], None]] = []
+        token = self._grupo.set((grupo, deshacer))
+        try:
+            try:
+                yield
+            finally:
+                self._grupo.reset(token)
+            if grupo:
+                self._notificar(grupo)
+        except BaseException:
+            for funcion in reversed(deshacer):
+                funcion()
+            raise
+
+    def _notificar(self, movimientos: List[Movimiento]):
+        for callback in self._suscriptores:
+            callback(movimientos)
+
+    def registrar(self, tipo: str, numero_cuenta, monto: float, contraparte=None,
+                  fecha: Optional[float] = None, saldo: float = 0.0,
+                  deshacer: Optional[Callable[[], None]] = None) -> int:
+        """
+        Agregar un movimiento (monto con signo: positivo entra, negativo
+        sale; `saldo` es el saldo de la cuenta después del movimiento).
+        Devuelve su posición en el libro. Una `fecha` explícita anterior
+        al último movimiento es un ValueError. `deshacer` revierte el
+        cambio de saldo si falla el `agrupar()` en curso.
+        """
+        codigo = self._codigos[tipo]
+        with self._lock:
+            # Fechas no decrecientes para poder buscar por rango
+            if fecha is None:
+                # Si el reloj retrocede se conserva la última fecha
+                fecha = max(time.time(), self._ultima_fecha)
+            elif fecha < self._ultima_fecha:
+                raise ValueError(f"Fecha {fecha} anterior al último movimiento del libro "
+                                 f"({self._ultima_fecha})")
+            self._ultima_fecha = fecha
+
+            id_cuenta = self._id_cuenta(numero_cuenta)
+            posicion = len(self._montos)
+            self._montos.append(redondear_centavos(monto))
+            self._saldos.append(redondear_centavos(saldo))
+            self._fechas.append(fecha)
+            self._tipos.append(codigo)
+            self._cuentas.append(id_cuenta)
+            self._contrapartes.append(-1 if contraparte is None else self._id_cuenta(contraparte))
+            self._por_cuenta[id_cuenta].append(posicion)
+
+        grupo = self._grupo.get()
+        if grupo is not None:
+            movimientos, deshaceres = grupo
+            if deshacer is not None:
+                deshaceres.append(deshacer)
+            if self._suscriptores:
+                movimientos.append((posicion, tipo, numero_cuenta, monto, contraparte, fecha, saldo))
+        elif self._suscriptores:
+            self._notificar([(posicion, tipo, numero_cuenta, monto, contraparte, fecha, saldo)])
+        return posicion
+
+    def posiciones(self, numero_cuenta, desde: Optional[Fecha] = None,
+                   hasta: Optional[Fecha] = None) -> array:
+        """Posiciones de los movimientos de una cuenta en [desde, hasta)"""
+        with self._lock:
+            id_cuenta = self._ids.get(numero_cuenta)
+            if id_cuenta is None:
+                return array('q')
+            indice = self._por_cuenta[id_cuenta]
+            inicio = 0 if desde is None else bisect_left(
+                indice, _as_epoch(desde), key=self._fechas.__getitem__)
+            fin = len(indice) if hasta is None else bisect_left(
+                indice, _as_epoch(hasta), key=self._fechas.__getitem__)
+            return indice[inicio:fin]
+
+    def columnas(self, numero_cuenta, desde: Optional[Fecha] = None,
+                 hasta: Optional[Fecha] = None) -> Optional[Columnas]:
+        """
+        Movimientos de una cuenta en [desde, hasta) como columnas
+        (fechas, montos, saldos, tipos, contrapartes) más el saldo de la
+        cuenta al inicio del rango; montos y saldos en centavos. None si la
+        cuenta no tiene movimientos.
+        """
+        with self._lock:
+            id_cuenta = self._ids.get(numero_cuenta)
+            if id_cuenta is None or not self._por_cuenta[id_cuenta]:
+                return None
+            indice = self._por_cuenta[id_cuenta]
+            inicio = 0 if desde is None else bisect_left(
+                indice, _as_epoch(desde), key=self._fechas.__getitem__)
+            fin = len(indice) if hasta is None else bisect_left(
+                indice, _as_epoch(hasta), key=self._fechas.__getitem__)
+
+            if inicio < len(indice):
+                primera = indice[inicio]
+                saldo_inicial = self._saldos[primera] - self._montos[primera]
+            else:
+                saldo_inicial = self._saldos[indice[-1]]
+
+            posiciones = indice[inicio:fin]
+            numeros = self._numeros
+            return (saldo_inicial,
+                    array('d', map(self._fechas.__getitem__, posiciones)),
+                    array('q', map(self._montos.__getitem__, posiciones)),
+                    array('q', map(self._saldos.__getitem__, posiciones)),
+                    array('b', map(self._tipos.__getitem__, posiciones)),
+                    [None if c < 0 else numeros[c]
+                     for c in map(self._contrapartes.__getitem__, posiciones)])
+
+    def movimiento(self, posicion: int) -> Transaccion:
+        """Materializar el movimiento de una posición como Transaccion"""
+        tipo = self.TIPOS[self._tipos[posicion]]
+        monto = desde_centavos(self._montos[posicion])
+        cuenta = self._numeros[self._cuentas[posicion]]
+        id_contraparte = self._contrapartes[posicion]
+        contraparte = None if id_contraparte < 0 else self._numeros[id_contraparte]
+        fecha = datetime.fromtimestamp(self._fechas[posicion])
+
+        if tipo == 'transferencia':
+            origen, destino = (cuenta, contraparte) if monto < 0 else (contraparte, cuenta)
+            return Transaccion(tipo, abs(monto), origen, destino, fecha=fecha)
+        return Transaccion(tipo, abs(monto), cuenta, fecha=fecha)
+
+    def movimientos(self, numero_cuenta, desde: Optional[Fecha] = None,
+                    hasta: Optional[Fecha] = None) -> Iterator[Transaccion]:
+        """Movimientos de una cuenta en [desde, hasta), en orden cronológico"""
+        for posicion in self.posiciones(numero_cuenta, desde, hasta):
+            yield self.movimiento(posicion)
+
+    def estado_de_cuenta(self, numero_cuenta, desde: Optional[Fecha] = None,
+                         hasta: Optional[Fecha] = None) -> List[str]:
+        """Líneas del estado de cuenta: una por movimiento y un resumen"""
+        lineas = []
+        neto = 0
+        ultimo_segundo, texto_fecha = None, ""
+        numeros = self._numeros
+
+        for posicion in self.posiciones(numero_cuenta, desde, hasta):
+            fecha = self._fechas[posicion]
+            # Formatear la fecha una vez por segundo, no por movimiento
+            segundo = int(fecha)
+            if segundo != ultimo_segundo:
+                ultimo_segundo = segundo
+                texto_fecha = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(segundo))
+
+            monto = self._montos[posicion]
+            neto += monto
+            tipo = self.TIPOS[self._tipos[posicion]]
+            id_contraparte = self._contrapartes[posicion]
+            detalle = "" if id_contraparte < 0 else (
+                f" {'a' if monto < 0 else 'de'} {numeros[id_contraparte]}")
+            lineas.append(f"{texto_fecha}  {tipo:<13} {texto_centavos(monto, True):>14} "
+                          f"{texto_centavos(self._saldos[posicion]):>14}{detalle}")
+
+        lineas.append(f"Movimientos: {len(lineas)}  Neto: {texto_centavos(neto, True)}")
+        return lineas
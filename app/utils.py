@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import weakref
+from decimal import Decimal
+from typing import Any, Callable, List, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Conexiones SQLite persistentes: una por hilo, en modo WAL.
+    El esquema se crea una sola vez por proceso.
+    """
+
+    def __init__(self, db_path: str, schema: Tuple[str, ...] = (),
+                 synchronous: str = "NORMAL", timeout: float = 5.0,
+                 on_schema: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = db_path
+        self.schema = schema
+        self.on_schema = on_schema
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._schema_ready = False
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Obtener la conexión del hilo actual (se crea la primera vez)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+
+        with self._lock:
+            if not self._schema_ready:
+                with conn:
+                    for statement in self.schema:
+                        conn.execute(statement)
+                    if self.on_schema is not None:
+                        self.on_schema(conn)
+                self._schema_ready = True
+            self._connections.append(conn)
+
+        return conn
+
+    def close_all(self):
+        """Cerrar todas las conexiones abiertas por este gestor"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"Error cerrando conexión a {self.db_path}: {e}")
+            self._connections.clear()
+            # Las conexiones de otros hilos quedan invalidadas; se generará
+            # un nuevo threading.local para forzar reconexión
+            self._local = threading.local()
+
+
+def monto_compatible(saldo, monto):
+    """
+    Con saldos exactos (Decimal), convertir un monto float por su texto
+    para poder operar sin mezclar tipos.
+    """
+    if isinstance(saldo, Decimal) and isinstance(monto, float):
+        return Decimal(str(monto))
+    return monto
+
+
+# Capas de decoradores: wrapper -> (aspecto, decorador que la vuelve a crear).
+# Permiten rearmar la cadena de un método sin alguna capa (ver AspectPolicy)
+_CAPAS = weakref.WeakKeyDictionary()
+
+
+def registrar_capa(wrapper: Callable, decorador: Callable[[Callable], Callable],
+                   aspecto: Optional[str] = None) -> Callable:
+    """Registrar `wrapper` como capa creada por `decorador` (sobre wrapper.__wrapped__)"""
+    _CAPAS[wrapper] = (aspecto, decorador)
+    return wrapper
+
+
+def capa_de(func: Any) -> Optional[Tuple[Optional[str], Callable]]:
+    """(aspecto, decorador) de una capa registrada, o None"""
+    try:
+        return _CAPAS.get(func)
+    except TypeError:
+        return None
@@ -0,0 +1,73 @@
+"""
+Auditoría: costo de registrar un cambio en cada backend y de consultar
+historial y resumen con 10k filas (1M con --completo).
+"""
+
+import pytest
+
+from app.audit_codec import BinaryCodec
+from app.audit_service import AuditService, SimpleAuditService
+
+CUENTAS = 1000
+REGISTRO = dict(
+    operation_type="deposito",
+    entity_type="Cuenta",
+    entity_id="0001",
+    estado_antes={'saldo': 100},
+    estado_despues={'saldo': 150},
+    usuario="sistema",
+    status="SUCCESS",
+    args=(50,),
+    kwargs={},
+)
+
+
+@pytest.mark.parametrize('backend', ('async', 'sync', 'sync_binary', 'jsonl'))
+def test_log_change(medir, entorno, monkeypatch, backend):
+    if backend == 'jsonl':
+        medir(lambda: SimpleAuditService.log_change(**REGISTRO))
+        return
+    monkeypatch.setattr(AuditService, "ASYNC_WRITES", backend == 'async')
+    if backend == 'sync_binary':
+        monkeypatch.setattr(AuditService, "PAYLOAD_CODEC", BinaryCodec())
+    medir(lambda: AuditService.log_change(**REGISTRO))
+    AuditService.flush()
+
+
+@pytest.fixture(scope="module", params=[10_000, pytest.param(1_000_000, marks=pytest.mark.grande)],
+                ids=lambda filas: f"{filas // 1000}k")
+def auditoria(request, tmp_path_factory):
+    """Base de auditoría con `filas` registros repartidos en CUENTAS cuentas"""
+    db_path = AuditService.DB_PATH
+    AuditService.DB_PATH = str(tmp_path_factory.mktemp("auditoria") / "audit_log.db")
+    try:
+        filas = request.param
+        operaciones = ("deposito", "retiro", "transferencia")
+        for inicio in range(0, filas, 10_000):
+            AuditService.log_batch([
+                AuditService.make_record(
+                    operation_type=operaciones[i % 3], entity_type="Cuenta",
+                    entity_id=f"{i % CUENTAS:04d}", estado_antes={'saldo': i},
+                    estado_despues={'saldo': i + 1}, usuario="sistema", status="SUCCESS",
+                    args=(1,), kwargs={})
+                for i in range(inicio, min(inicio + 10_000, filas))])
+        yield filas
+    finally:
+        AuditService.close()
+        AuditService.DB_PATH = db_path
+
+
+def test_historial_por_cuenta(medir, auditoria):
+    medir(lambda: AuditService.get_audit_history(entity_id="0042", limit=10))
+
+
+def test_historial_por_operacion(medir, auditoria):
+    medir(lambda: AuditService.get_audit_history(operation_type="retiro", limit=100))
+
+
+def test_resumen(medir, auditoria):
+    medir(lambda: AuditService.get_audit_summary())
+
+
+def test_resumen_por_hora(medir, auditoria):
+    medir(lambda: AuditService.get_audit_summary(by_hour=True))
@@ -0,0 +1,28 @@
+"""
+Notificaciones: armar el email (datos y template) y el envío completo de
+send_notification, encolado en la bandeja de salida o en línea con el
+transporte de log.
+"""
+
+import pytest
+
+from app.cuenta import Cuenta
+from app.email_service import EmailService
+
+
+@pytest.fixture
+def cuenta(entorno):
+    cuenta = Cuenta("0001", 1000)
+    return cuenta
+
+
+def test_componer_saldo_update(medir, cuenta):
+    medir(lambda: EmailService._compose_notification(
+        "saldo_update", cuenta, (50,), {}, None, "depositar"))
+
+
+@pytest.mark.parametrize('outbox', (True, False), ids=('outbox', 'en_linea'))
+def test_send_notification(medir, cuenta, monkeypatch, outbox):
+    monkeypatch.setattr(EmailService, "USE_OUTBOX", outbox)
+    medir(lambda: EmailService.send_notification(
+        "saldo_update", cuenta, "saldo_update", args=(50,), kwargs={}, operacion="depositar"))
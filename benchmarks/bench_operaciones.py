@@ -0,0 +1,70 @@
+"""
+Costo de las operaciones de Cuenta y Banco según sus decoradores.
+
+- sin_decoradores: solo el cuerpo de los métodos (inspect.unwrap)
+- sin_aspectos: locks e idempotencia, con auditoría y email desactivados
+  (AspectPolicy.disable)
+- decorado: la cadena completa, como la usa la aplicación
+"""
+
+import inspect
+import itertools
+
+import pytest
+
+from app.banco import Banco
+from app.cuenta import Cuenta
+from app.decorators import AspectPolicy
+
+VARIANTES = ('sin_decoradores', 'sin_aspectos', 'decorado')
+
+
+@pytest.fixture
+def banco(entorno):
+    banco = Banco()
+    banco.crear_cliente("Bench", "1")
+    for numero in ("0001", "0002"):
+        banco.crear_cuenta("1", numero)._aplicar_movimiento('deposito', 10 ** 12)
+    return banco
+
+
+@pytest.fixture
+def variante(request, monkeypatch):
+    nombre = request.param
+    if nombre == 'sin_decoradores':
+        for clase, metodo in ((Cuenta, 'depositar'), (Cuenta, 'retirar'), (Banco, 'transferir')):
+            monkeypatch.setattr(clase, metodo, inspect.unwrap(clase.__dict__[metodo]))
+    elif nombre == 'sin_aspectos':
+        AspectPolicy.disable(AspectPolicy.AUDIT)
+        AspectPolicy.disable(AspectPolicy.EMAIL)
+    yield nombre
+    if nombre == 'sin_aspectos':
+        AspectPolicy.enable(AspectPolicy.AUDIT)
+        AspectPolicy.enable(AspectPolicy.EMAIL)
+
+
+@pytest.mark.parametrize('variante', VARIANTES, indirect=True)
+def test_depositar(medir, banco, variante):
+    cuenta = banco.cuentas["0001"]
+    medir(lambda: cuenta.depositar(1))
+
+
+@pytest.mark.parametrize('variante', VARIANTES, indirect=True)
+def test_retirar(medir, banco, variante):
+    cuenta = banco.cuentas["0001"]
+    medir(lambda: cuenta.retirar(1))
+
+
+@pytest.mark.parametrize('variante', VARIANTES, indirect=True)
+def test_transferir(medir, banco, variante):
+    medir(lambda: banco.transferir("0001", "0002", 1))
+
+
+def test_transferir_clave_nueva(medir, banco):
+    claves = (f"bench-{i}" for i in itertools.count())
+    medir(lambda: banco.transferir("0001", "0002", 1, idempotency_key=next(claves)))
+
+
+def test_transferir_reintento(medir, banco):
+    banco.transferir("0001", "0002", 1, idempotency_key="bench-reintento")
+    medir(lambda: banco.transferir("0001", "0002", 1, idempotency_key="bench-reintento"))
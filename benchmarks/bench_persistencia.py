@@ -0,0 +1,51 @@
+"""
+Persistencia: arranque en frío (último snapshot + cola del WAL) con 10k
+cuentas (1M con --completo) y costo de un depósito según el modo de sync.
+"""
+
+import pytest
+
+from app.banco import Banco
+from app.persistencia import BancoStore, Snapshot, WriteAheadLog
+
+COLA_WAL = 1000
+
+
+@pytest.fixture(scope="module", params=[10_000, pytest.param(1_000_000, marks=pytest.mark.grande)],
+                ids=lambda cuentas: f"{cuentas // 1000}k")
+def datos(request, tmp_path_factory):
+    """Snapshot con `cuentas` cuentas (100 por cliente) y COLA_WAL registros de saldo"""
+    directorio = str(tmp_path_factory.mktemp("persistencia"))
+    cuentas = request.param
+    clientes = [(f"{i:07d}", f"Cliente {i}") for i in range(cuentas // 100)]
+    Snapshot.escribir(f"{directorio}/snapshot-{0:016d}.bin", 0, clientes,
+                      [(f"{i:08d}", f"{i // 100:07d}", i) for i in range(cuentas)])
+
+    wal = WriteAheadLog(directorio, sync="diferido")
+    wal.abrir(0)
+    for i in range(COLA_WAL):
+        wal.append('s', [[f"{i * 7 % cuentas:08d}", i]])
+    wal.cerrar()
+    return directorio
+
+
+def test_arranque(medir, datos):
+    def cargar():
+        store = BancoStore(datos)
+        store.cargar()
+        store.cerrar()
+
+    medir(cargar, tandas=3)
+
+
+@pytest.mark.parametrize('sync', ('grupo', 'siempre', 'diferido'))
+def test_depositar_con_wal(medir, entorno, sync):
+    store = BancoStore(str(entorno / "data"), sync=sync)
+    banco = Banco()
+    store.adjuntar(banco)
+    banco.crear_cliente("Bench", "1")
+    cuenta = banco.crear_cuenta("1", "0001")
+    try:
+        medir(lambda: cuenta.depositar(1))
+    finally:
+        store.cerrar()
@@ -0,0 +1,131 @@
+"""
+Escalado de BancoDistribuido con la cantidad de shards.
+
+    python -m benchmarks.bench_sharding --shards 1 2 4 8 --transferencias 40000
+
+Para cada configuración crea las cuentas, ejecuta transferencias
+aleatorias desde varios hilos cliente y mide transferencias por segundo.
+La línea base es un Banco en un solo proceso. Con --locales se controla
+qué fracción de transferencias queda dentro de un mismo shard (el resto
+usa commit en dos fases).
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.sharding import BancoDistribuido, shard_de
+
+
+def _pares(numeros, shards, cantidad, locales, semilla):
+    """Pares (origen, destino) con la fracción pedida dentro del mismo shard"""
+    rng = random.Random(semilla)
+    por_shard = {}
+    for numero in numeros:
+        por_shard.setdefault(shard_de(numero, shards), []).append(numero)
+    pares = []
+    for _ in range(cantidad):
+        origen = rng.choice(numeros)
+        grupo = por_shard[shard_de(origen, shards)]
+        if shards > 1 and rng.random() >= locales:
+            destino = rng.choice(numeros)
+            while shard_de(destino, shards) == shard_de(origen, shards):
+                destino = rng.choice(numeros)
+        else:
+            destino = rng.choice(grupo)
+            while destino == origen and len(grupo) > 1:
+                destino = rng.choice(grupo)
+        pares.append((origen, destino))
+    return pares
+
+
+def _ejecutar(transferir, pares, hilos):
+    errores = [0] * hilos
+
+    def trabajar(indice):
+        for origen, destino in pares[indice::hilos]:
+            try:
+                transferir(origen, destino, 1)
+            except ValueError:
+                errores[indice] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - inicio, sum(errores)
+
+
+def medir_local(cuentas, transferencias):
+    from app.audit_service import AuditService
+    from app.banco import Banco
+    from app.email_service import EmailService
+
+    with tempfile.TemporaryDirectory() as directorio:
+        AuditService.DB_PATH = os.path.join(directorio, "audit_log.db")
+        EmailService.OUTBOX_DB_PATH = os.path.join(directorio, "email_outbox.db")
+        banco = Banco()
+        numeros = [f"{i:06d}" for i in range(cuentas)]
+        for numero in numeros:
+            banco.crear_cliente(numero, numero)
+            banco.crear_cuenta(numero, numero).depositar(10 ** 9)
+        pares = _pares(numeros, 1, transferencias, 1.0, 0)
+        # Un solo proceso: más hilos solo compiten por el GIL
+        segundos, _ = _ejecutar(banco.transferir, pares, 1)
+        AuditService.close()
+        EmailService.close()
+    return transferencias / segundos
+
+
+def medir_distribuido(shards, cuentas, transferencias, hilos, locales):
+    with tempfile.TemporaryDirectory() as directorio:
+        banco = BancoDistribuido(shards=shards, directorio=directorio)
+        try:
+            numeros = [f"{i:06d}" for i in range(cuentas)]
+            for numero in numeros:
+                banco.crear_cliente(numero, numero)
+                banco.crear_cuenta(numero, numero)
+                banco.depositar(numero, 10 ** 9)
+            total = banco.total()
+            pares = _pares(numeros, shards, transferencias, locales, shards)
+            segundos, _ = _ejecutar(banco.transferir, pares, hilos)
+            if banco.total() != total:
+                raise SystemExit(f"❌ Dinero no conservado con {shards} shards")
+        finally:
+            banco.cerrar()
+    return transferencias / segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--cuentas', type=int, default=2000)
+    parser.add_argument('--transferencias', type=int, default=20000)
+    parser.add_argument('--hilos', type=int, default=32, help="hilos cliente del router")
+    parser.add_argument('--locales', type=float, default=0.9,
+                        help="fracción de transferencias dentro de un mismo shard")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"CPUs: {os.cpu_count()}  cuentas: {args.cuentas}  "
+          f"transferencias: {args.transferencias}  locales: {args.locales:.0%}")
+
+    base = medir_local(args.cuentas, args.transferencias)
+    print(f"{'Banco (1 proceso)':<20} {base:>10.0f} tx/s")
+
+    referencia = None
+    for shards in args.shards:
+        tps = medir_distribuido(shards, args.cuentas, args.transferencias, args.hilos, args.locales)
+        referencia = referencia or tps
+        print(f"{f'{shards} shards':<20} {tps:>10.0f} tx/s  x{tps / referencia:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Generador de carga y reproducción de operaciones contra Banco.
+
+    python -m benchmarks.carga --operaciones 50000 --hilos 8
+    python -m benchmarks.carga --tasa 2000 --duracion 30
+    python -m benchmarks.carga --generar carga.jsonl --operaciones 1000000
+    python -m benchmarks.carga --reproducir carga.jsonl --hilos 16
+
+Cada operación es un objeto JSON por línea:
+
+    {"op": "crear_cliente", "nombre": "Ana", "identificacion": "c1"}
+    {"op": "crear_cuenta", "identificacion": "c1", "cuenta": "000001"}
+    {"op": "depositar", "cuenta": "000001", "monto": 100}
+    {"op": "retirar", "cuenta": "000001", "monto": 20}
+    {"op": "transferir", "origen": "000001", "destino": "000002", "monto": 5}
+
+La carga sintética crea primero las cuentas iniciales y después elige
+cuentas con popularidad Zipf (pocas cuentas concentran la mayoría de las
+operaciones) según la mezcla de --mezcla. Los archivos se leen en
+streaming; las líneas que no son operaciones se cuentan y se saltean.
+
+- lazo cerrado (--hilos N): N hilos ejecutan operaciones sin pausa
+- tasa objetivo (--tasa R): la operación i está programada en i/R
+  segundos y su latencia se mide desde ese instante, así que la espera
+  por falta de capacidad también cuenta
+
+Reporta el throughput y la latencia p50/p95/p99/máxima por tipo de
+operación, de punta a punta (locks, auditoría, email, idempotencia).
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+MEZCLA = {
+    'crear_cliente': 1,
+    'crear_cuenta': 1,
+    'depositar': 30,
+    'retirar': 20,
+    'transferir': 48,
+}
+OPERACIONES = tuple(MEZCLA)
+CREACIONES = ('crear_cliente', 'crear_cuenta')
+
+
+def generar(cuentas: int = 1000, operaciones: int = 100000, mezcla: Dict[str, float] = MEZCLA,
+            zipf: float = 1.1, monto_maximo: int = 100, semilla: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Operaciones sintéticas: alta de `cuentas` cuentas con saldo inicial y
+    luego `operaciones` operaciones de la mezcla sobre cuentas Zipf
+    """
+    rng = random.Random(semilla)
+    tipos = [tipo for tipo in mezcla if mezcla[tipo] > 0]
+    pesos = list(itertools.accumulate(mezcla[tipo] for tipo in tipos))
+
+    # Pesos acumulados por rango de popularidad, con lugar para las cuentas
+    # que se creen durante la carga (la más nueva es la menos popular)
+    capacidad = cuentas + int(operaciones * mezcla.get('crear_cuenta', 0) / pesos[-1]) + 1
+    popularidad = list(itertools.accumulate(1.0 / rango ** zipf for rango in range(1, capacidad + 1)))
+    numeros: List[str] = []
+    clientes: List[str] = []
+
+    def nueva_cuenta():
+        numero = f"{len(numeros):06d}"
+        numeros.append(numero)
+        return {'op': 'crear_cuenta', 'identificacion': rng.choice(clientes), 'cuenta': numero}
+
+    def elegir() -> str:
+        n = min(len(numeros), capacidad)
+        return numeros[bisect_left(popularidad, rng.random() * popularidad[n - 1], 0, n - 1)]
+
+    for i in range(max(cuentas // 4, 1)):
+        clientes.append(f"c{i:06d}")
+        yield {'op': 'crear_cliente', 'nombre': f"Cliente {i}", 'identificacion': clientes[-1]}
+    for _ in range(cuentas):
+        operacion = nueva_cuenta()
+        yield operacion
+        yield {'op': 'depositar', 'cuenta': operacion['cuenta'], 'monto': monto_maximo * 100}
+
+    for _ in range(operaciones):
+        tipo = tipos[bisect_left(pesos, rng.random() * pesos[-1])]
+        if tipo == 'crear_cliente':
+            clientes.append(f"c{len(clientes):06d}")
+            yield {'op': tipo, 'nombre': f"Cliente {len(clientes)}", 'identificacion': clientes[-1]}
+        elif tipo == 'crear_cuenta':
+            yield nueva_cuenta()
+        elif tipo == 'transferir':
+            origen, destino = elegir(), elegir()
+            while destino == origen and len(numeros) > 1:
+                destino = elegir()
+            yield {'op': tipo, 'origen': origen, 'destino': destino,
+                   'monto': rng.randint(1, monto_maximo)}
+        else:
+            yield {'op': tipo, 'cuenta': elegir(), 'monto': rng.randint(1, monto_maximo)}
+
+
+def leer(ruta: str, invalidas: Optional[List[int]] = None) -> Iterator[Dict[str, Any]]:
+    """Operaciones de un archivo JSONL, en streaming"""
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                operacion = json.loads(linea)
+            except ValueError:
+                operacion = None
+            if isinstance(operacion, dict) and operacion.get('op') in OPERACIONES:
+                yield operacion
+            elif invalidas is not None and linea.strip():
+                invalidas[0] += 1
+
+
+def escribir(ruta: str, operaciones: Iterable[Dict[str, Any]]) -> int:
+    cantidad = 0
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for operacion in operaciones:
+            f.write(json.dumps(operacion, ensure_ascii=False))
+            f.write("\n")
+            cantidad += 1
+    return cantidad
+
+
+def ejecutor_banco(banco) -> Callable[[Dict[str, Any]], Any]:
+    """Traducir una operación a la llamada correspondiente de Banco"""
+    def ejecutar(operacion):
+        tipo = operacion['op']
+        if tipo == 'depositar':
+            return banco.cuentas[operacion['cuenta']].depositar(operacion['monto'])
+        if tipo == 'retirar':
+            return banco.cuentas[operacion['cuenta']].retirar(operacion['monto'])
+        if tipo == 'transferir':
+            return banco.transferir(operacion['origen'], operacion['destino'], operacion['monto'])
+        if tipo == 'crear_cuenta':
+            return banco.crear_cuenta(operacion['identificacion'], operacion['cuenta'])
+        return banco.crear_cliente(operacion['nombre'], operacion['identificacion'])
+    return ejecutar
+
+
+def ejecutor_distribuido(banco) -> Callable[[Dict[str, Any]], Any]:
+    """Lo mismo para BancoDistribuido, cuya API ya recibe números de cuenta"""
+    def ejecutar(operacion):
+        tipo = operacion['op']
+        if tipo in ('depositar', 'retirar'):
+            return getattr(banco, tipo)(operacion['cuenta'], operacion['monto'])
+        if tipo == 'transferir':
+            return banco.transferir(operacion['origen'], operacion['destino'], operacion['monto'])
+        if tipo == 'crear_cuenta':
+            return banco.crear_cuenta(operacion['identificacion'], operacion['cuenta'])
+        return banco.crear_cliente(operacion['nombre'], operacion['identificacion'])
+    return ejecutar
+
+
+class Latencias:
+    """Latencias por tipo de operación (segundos, en arreglos compactos)"""
+
+    def __init__(self):
+        self.muestras: Dict[str, array] = {}
+        self.errores: Dict[str, int] = {}
+
+    def agregar(self, otras: "Latencias"):
+        for tipo, muestras in otras.muestras.items():
+            self.muestras.setdefault(tipo, array('d')).extend(muestras)
+        for tipo, errores in otras.errores.items():
+            self.errores[tipo] = self.errores.get(tipo, 0) + errores
+
+    def resumen(self, segundos: float) -> Dict[str, Dict[str, float]]:
+        resumen = {}
+        for tipo, muestras in sorted(self.muestras.items()):
+            ordenadas = sorted(muestras)
+
+            def percentil(p):
+                return ordenadas[min(int(p / 100 * len(ordenadas)), len(ordenadas) - 1)] * 1000
+
+            resumen[tipo] = {
+                'operaciones': len(ordenadas),
+                'errores': self.errores.get(tipo, 0),
+                'por_segundo': len(ordenadas) / segundos if segundos else 0.0,
+                'p50_ms': percentil(50),
+                'p95_ms': percentil(95),
+                'p99_ms': percentil(99),
+                'max_ms': ordenadas[-1] * 1000,
+            }
+        return resumen
+
+
+def conducir(operaciones: Iterable[Dict[str, Any]], ejecutar: Callable[[Dict[str, Any]], Any],
+             hilos: int = 8, tasa: Optional[float] = None,
+             duracion: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Ejecutar las operaciones con `hilos` hilos, sin pausa o a `tasa`
+    operaciones por segundo, hasta agotarlas o hasta `duracion` segundos
+    """
+    fuente = enumerate(operaciones)
+    lock = threading.Lock()
+    por_hilo = [Latencias() for _ in range(hilos)]
+    inicio = time.perf_counter()
+    fin = None if duracion is None else inicio + duracion
+
+    def medir(latencias, operacion, programada):
+        tipo = operacion['op']
+        try:
+            ejecutar(operacion)
+        except (ValueError, KeyError):
+            latencias.errores[tipo] = latencias.errores.get(tipo, 0) + 1
+        muestras = latencias.muestras.get(tipo)
+        if muestras is None:
+            muestras = latencias.muestras[tipo] = array('d')
+        muestras.append(time.perf_counter() - programada)
+
+    def programar(numero):
+        if not tasa:
+            return time.perf_counter()
+        programada = inicio + numero / tasa
+        espera = programada - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        return programada
+
+    def trabajar(indice):
+        latencias = por_hilo[indice]
+        while True:
+            with lock:
+                siguiente = next(fuente, None)
+                if siguiente is None:
+                    return
+                numero, operacion = siguiente
+                if operacion['op'] in CREACIONES:
+                    # Las altas terminan antes de despachar lo que sigue, que
+                    # puede usar el cliente o la cuenta recién creados
+                    programada = programar(numero)
+                    if fin is not None and programada > fin:
+                        return
+                    medir(latencias, operacion, programada)
+                    continue
+            programada = programar(numero)
+            if fin is not None and programada > fin:
+                return
+            medir(latencias, operacion, programada)
+
+    threads = [threading.Thread(target=trabajar, args=(i,), name=f"carga-{i}") for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    segundos = time.perf_counter() - inicio
+
+    total = Latencias()
+    for latencias in por_hilo:
+        total.agregar(latencias)
+    cantidad = sum(len(muestras) for muestras in total.muestras.values())
+    return {
+        'segundos': segundos,
+        'operaciones': cantidad,
+        'por_segundo': cantidad / segundos if segundos else 0.0,
+        'por_tipo': total.resumen(segundos),
+    }
+
+
+def _mezcla(texto: str) -> Dict[str, float]:
+    mezcla = dict.fromkeys(OPERACIONES, 0.0)
+    for parte in texto.split(','):
+        tipo, _, peso = parte.partition('=')
+        if tipo.strip() not in mezcla:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {tipo}")
+        mezcla[tipo.strip()] = float(peso)
+    return mezcla
+
+
+def _imprimir(resultado: Dict[str, Any]):
+    print(f"{resultado['operaciones']} operaciones en {resultado['segundos']:.2f} s "
+          f"({resultado['por_segundo']:.0f} op/s)")
+    print(f"{'operación':<15} {'ops':>9} {'errores':>8} {'op/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for tipo, r in resultado['por_tipo'].items():
+        print(f"{tipo:<15} {r['operaciones']:>9} {r['errores']:>8} {r['por_segundo']:>9.0f} "
+              f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reproducir', metavar='JSONL', help="archivo de operaciones a reproducir")
+    parser.add_argument('--generar', metavar='JSONL',
+                        help="solo escribir la carga sintética en el archivo")
+    parser.add_argument('--cuentas', type=int, default=1000, help="cuentas iniciales")
+    parser.add_argument('--operaciones', type=int, default=20000)
+    parser.add_argument('--mezcla', type=_mezcla, default=MEZCLA,
+                        help="pesos, p. ej. depositar=30,retirar=20,transferir=50")
+    parser.add_argument('--zipf', type=float, default=1.1, help="exponente de popularidad")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--tasa', type=float, help="operaciones por segundo (lazo abierto)")
+    parser.add_argument('--duracion', type=float, help="cortar a los N segundos")
+    parser.add_argument('--shards', type=int, help="usar BancoDistribuido con N shards")
+    parser.add_argument('--json', action='store_true', help="imprimir el resultado como JSON")
+    args = parser.parse_args()
+
+    if args.generar:
+        cantidad = escribir(args.generar, generar(args.cuentas, args.operaciones, args.mezcla,
+                                                  args.zipf, semilla=args.semilla))
+        print(f"{cantidad} operaciones escritas en {args.generar}")
+        return
+
+    invalidas = [0]
+    if args.reproducir:
+        operaciones = leer(args.reproducir, invalidas)
+    else:
+        operaciones = generar(args.cuentas, args.operaciones, args.mezcla, args.zipf,
+                              semilla=args.semilla)
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directorio:
+        from app.audit_service import AuditService
+        from app.email_service import EmailService
+        from app.idempotencia import IdempotencyService
+
+        AuditService.DB_PATH = os.path.join(directorio, "audit_log.db")
+        EmailService.OUTBOX_DB_PATH = os.path.join(directorio, "email_outbox.db")
+        IdempotencyService.DB_PATH = os.path.join(directorio, "idempotency.db")
+
+        if args.shards:
+            from app.sharding import BancoDistribuido
+            banco = BancoDistribuido(shards=args.shards, directorio=os.path.join(directorio, "shards"))
+            ejecutar = ejecutor_distribuido(banco)
+        else:
+            from app.banco import Banco
+            banco = Banco()
+            ejecutar = ejecutor_banco(banco)
+
+        try:
+            resultado = conducir(operaciones, ejecutar, args.hilos, args.tasa, args.duracion)
+        finally:
+            if args.shards:
+                banco.cerrar()
+            AuditService.close()
+            EmailService.close()
+            IdempotencyService.close()
+
+    resultado['lineas_invalidas'] = invalidas[0]
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+    else:
+        _imprimir(resultado)
+        if invalidas[0]:
+            print(f"{invalidas[0]} líneas que no son operaciones se saltearon")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Micro-benchmarks con pytest, sin dependencias externas.
+
+    python -m pytest benchmarks -q                       # medir y comparar
+    python -m pytest benchmarks --guardar-baseline       # fijar la línea base
+    python -m pytest benchmarks --completo               # incluye 1M filas
+
+Cada prueba llama al fixture `medir(funcion)`: calibra cuántas llamadas
+entran en ~20 ms, mide varias tandas y registra la mediana y el mínimo
+por operación. Al terminar se escriben todos los resultados en
+benchmarks/resultados.json. Si hay línea base (benchmarks/baseline.json,
+o --baseline) y la mediana de una prueba supera la de la línea base en
+más de --umbral (25% por defecto), la prueba falla como regresión.
+
+Las líneas base dependen de la máquina: se generan y se comparan en el
+mismo equipo.
+"""
+
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+DIRECTORIO = Path(__file__).parent
+RESULTADOS = DIRECTORIO / "resultados.json"
+BASELINE = DIRECTORIO / "baseline.json"
+
+
+def pytest_addoption(parser):
+    grupo = parser.getgroup("benchmarks")
+    grupo.addoption("--baseline", default=str(BASELINE),
+                    help="línea base JSON contra la que se compara")
+    grupo.addoption("--guardar-baseline", action="store_true",
+                    help="guardar los resultados como nueva línea base")
+    grupo.addoption("--umbral", type=float, default=0.25,
+                    help="regresión tolerada sobre la mediana de la línea base (0.25 = 25%%)")
+    grupo.addoption("--completo", action="store_true",
+                    help="incluir los casos grandes (1M filas de auditoría)")
+
+
+def pytest_collect_file(file_path, parent):
+    # Los módulos bench_*.py también son pruebas
+    if (file_path.suffix == ".py" and file_path.name.startswith("bench_")
+            and not parent.session.isinitpath(file_path)):
+        return pytest.Module.from_parent(parent, path=file_path)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "grande: caso lento, solo con --completo")
+    config._benchmarks = {}
+    baseline = Path(config.getoption("--baseline", default=str(BASELINE)))
+    config._baseline = {}
+    if baseline.exists() and not config.getoption("--guardar-baseline", default=False):
+        config._baseline = json.loads(baseline.read_text(encoding='utf-8')).get('resultados', {})
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--completo", default=False):
+        return
+    saltar = pytest.mark.skip(reason="caso grande: usar --completo")
+    for item in items:
+        if "grande" in item.keywords:
+            item.add_marker(saltar)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    resultados = getattr(session.config, "_benchmarks", None)
+    if not resultados:
+        return
+    datos = {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'resultados': dict(sorted(resultados.items())),
+    }
+    texto = json.dumps(datos, indent=2, ensure_ascii=False)
+    RESULTADOS.write_text(texto, encoding='utf-8')
+    if session.config.getoption("--guardar-baseline", default=False):
+        Path(session.config.getoption("--baseline")).write_text(texto, encoding='utf-8')
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    resultados = getattr(config, "_benchmarks", None)
+    if not resultados:
+        return
+    terminalreporter.section("benchmarks (µs por operación)")
+    for nombre, r in sorted(resultados.items()):
+        base = config._baseline.get(nombre)
+        cambio = f"{r['mediana_us'] / base['mediana_us'] - 1:+7.1%}" if base else ""
+        terminalreporter.write_line(f"{nombre:<60} {r['mediana_us']:>12.2f} "
+                                    f"{r['min_us']:>12.2f}  {cambio}")
+
+
+@pytest.fixture(autouse=True)
+def _sin_logs_info():
+    """Los logs INFO por operación no son parte de lo que se mide"""
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def medir(request):
+    """medir(funcion, tandas=5): registra el costo por llamada de `funcion`"""
+    config = request.config
+
+    def medir(funcion, tandas: int = 5, objetivo: float = 0.02, nombre: str = None):
+        # Calibrar: cantidad de llamadas que tardan al menos `objetivo`
+        llamadas = 1
+        while True:
+            inicio = time.perf_counter()
+            for _ in range(llamadas):
+                funcion()
+            duracion = time.perf_counter() - inicio
+            if duracion >= objetivo or llamadas >= 1 << 20:
+                break
+            llamadas *= 2 if duracion <= 0 else min(max(int(objetivo / duracion * 1.2), 2), 10)
+
+        tiempos = []
+        for _ in range(tandas):
+            inicio = time.perf_counter()
+            for _ in range(llamadas):
+                funcion()
+            tiempos.append((time.perf_counter() - inicio) / llamadas)
+
+        nombre = nombre or request.node.name
+        resultado = {
+            'mediana_us': statistics.median(tiempos) * 1e6,
+            'min_us': min(tiempos) * 1e6,
+            'llamadas': llamadas,
+            'tandas': tandas,
+        }
+        config._benchmarks[nombre] = resultado
+
+        base = config._baseline.get(nombre)
+        if base is not None:
+            limite = base['mediana_us'] * (1 + config.getoption("--umbral", default=0.25))
+            if resultado['mediana_us'] > limite:
+                pytest.fail(f"Regresión en {nombre}: {resultado['mediana_us']:.2f} µs "
+                            f"(línea base {base['mediana_us']:.2f} µs, límite {limite:.2f} µs)")
+        return resultado
+
+    return medir
+
@@ -0,0 +1,99 @@
+"""
+Prueba de estrés de concurrencia: varios hilos hacen transferencias
+aleatorias entre las cuentas de un Banco y se verifica que el dinero
+total se conserve y que ningún saldo quede negativo.
+
+    python -m benchmarks.conservacion --hilos 8 --transferencias 10000
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+
+def verificar_conservacion(banco, hilos: int = 8, transferencias: int = 10000,
+                           monto_maximo: int = 50) -> Dict[str, Any]:
+    """
+    `hilos` hilos hacen transferencias aleatorias entre las cuentas del
+    banco; devuelve los totales antes y después y el throughput.
+    """
+    numeros = list(banco.cuentas)
+    if len(numeros) < 2:
+        raise ValueError("Se necesitan al menos dos cuentas")
+
+    total_antes = sum(c.saldo for c in banco.cuentas.values())
+    fallidas = [0] * hilos
+
+    def trabajar(indice):
+        rng = random.Random(indice)
+        for _ in range(transferencias // hilos):
+            origen, destino = rng.sample(numeros, 2)
+            try:
+                banco.transferir(origen, destino, rng.randint(1, monto_maximo))
+            except ValueError:
+                fallidas[indice] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    total_despues = sum(c.saldo for c in banco.cuentas.values())
+    negativas = [n for n, c in banco.cuentas.items() if c.saldo < 0]
+
+    return {
+        'total_antes': total_antes,
+        'total_despues': total_despues,
+        'conservado': total_antes == total_despues and not negativas,
+        'cuentas_negativas': negativas,
+        'transferencias': transferencias,
+        'fallidas': sum(fallidas),
+        'segundos': duracion,
+        'transferencias_por_segundo': transferencias / duracion if duracion else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--cuentas', type=int, default=100)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--transferencias', type=int, default=10000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directorio:
+        from app.audit_service import AuditService
+        from app.banco import Banco
+        from app.email_service import EmailService
+        from app.idempotencia import IdempotencyService
+
+        AuditService.DB_PATH = os.path.join(directorio, "audit_log.db")
+        EmailService.OUTBOX_DB_PATH = os.path.join(directorio, "email_outbox.db")
+        IdempotencyService.DB_PATH = os.path.join(directorio, "idempotency.db")
+        try:
+            banco = Banco()
+            for i in range(args.cuentas):
+                banco.crear_cliente(f"Cliente {i}", str(i))
+                banco.crear_cuenta(str(i), f"{i:04d}").depositar(1000)
+            resultado = verificar_conservacion(banco, args.hilos, args.transferencias)
+        finally:
+            AuditService.close()
+            EmailService.close()
+            IdempotencyService.close()
+
+    print(resultado)
+    if not resultado['conservado']:
+        raise SystemExit("El dinero total no se conservó")
+    print("Dinero total conservado")
+
+
+if __name__ == "__main__":
+    main()
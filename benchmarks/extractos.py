@@ -0,0 +1,50 @@
+"""
+Generación masiva de estados de cuenta sobre un Banco sintético: cuentas
+con un depósito inicial y transferencias aleatorias entre ellas.
+
+    python -m benchmarks.extractos extractos --cuentas 2000 --transferencias 100000
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('directorio', nargs='?', default="extractos")
+    parser.add_argument('--cuentas', type=int, default=2000)
+    parser.add_argument('--transferencias', type=int, default=100000)
+    parser.add_argument('--procesos', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directorio:
+        from app.audit_service import AuditService
+        from app.banco import Banco
+        from app.extractos import generar_extractos
+
+        AuditService.DB_PATH = os.path.join(directorio, "audit_log.db")
+        try:
+            banco = Banco()
+            banco.crear_cliente("Cliente", "1")
+            # Sin pasar por los métodos decorados: solo interesa el libro
+            for i in range(args.cuentas):
+                banco._crear_cuenta("1", f"{i:06d}")._aplicar_movimiento('deposito', 1000)
+            numeros = list(banco.cuentas)
+            rng = random.Random(1)
+            for _ in range(args.transferencias):
+                origen, destino = rng.sample(numeros, 2)
+                banco.cuentas[origen]._aplicar_movimiento('transferencia', -1, destino)
+                banco.cuentas[destino]._aplicar_movimiento('transferencia', 1, origen)
+
+            print(generar_extractos(banco, args.directorio, procesos=args.procesos,
+                                    reanudar=False))
+        finally:
+            AuditService.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Fixtures comunes a las pruebas (tests/) y los benchmarks (benchmarks/)"""
+
+import pytest
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    """Auditoría, outbox e idempotencia en un directorio temporal"""
+    from app.audit_service import AuditService, SimpleAuditService
+    from app.email_service import EmailService
+    from app.idempotencia import IdempotencyService
+
+    monkeypatch.setattr(AuditService, "DB_PATH", str(tmp_path / "audit_log.db"))
+    monkeypatch.setattr(SimpleAuditService, "DB_PATH", str(tmp_path / "simple_audit.log"))
+    monkeypatch.setattr(SimpleAuditService, "ECHO", False)
+    monkeypatch.setattr(EmailService, "OUTBOX_DB_PATH", str(tmp_path / "email_outbox.db"))
+    monkeypatch.setattr(IdempotencyService, "DB_PATH", str(tmp_path / "idempotency.db"))
+    IdempotencyService.clear()
+    yield tmp_path
+    AuditService.close()
+    SimpleAuditService.close()
+    EmailService.close()
+    IdempotencyService.close()
+    IdempotencyService.clear()
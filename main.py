@@ -1,3 +1,4 @@
+from app.logging_config import configurar_logging
 from app.banco import Banco
 from app.audit_service import AuditService
 import time
@@ -50,9 +51,9 @@ def main():
         
         # 7. Mostrar algunos logs de auditoría
         print("\n📜 Últimos registros de auditoría:")
-        audit_logs = AuditService.get_audit_history()
-        for i, log in enumerate(audit_logs[:3]):  # Mostrar solo los 3 más recientes
-            print(f"📝 Log {i+1}: {log[2]} en {log[3]} - {log[8]}")
+        audit_logs = AuditService.get_audit_history(limit=3)  # Solo los 3 más recientes
+        for i, log in enumerate(audit_logs):
+            print(f"📝 Log {i+1}: {log.operation_type} en {log.entity_type} - {log.campos_modificados}")
             
     except Exception as e:
         print(f"❌ Error en ejecución: {e}")
@@ -63,4 +64,5 @@ def main():
     print("   - audit_log.db (base de datos SQLite)")
 
 if __name__ == "__main__":
+    configurar_logging()
     main()
\ No newline at end of file
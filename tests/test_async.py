@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.async_banco import AsyncBanco
+
+
+@pytest.fixture
+def banco(entorno):
+    async def crear():
+        banco = AsyncBanco()
+        await banco.crear_cliente("Cliente", "1")
+        for numero in ("0001", "0002"):
+            await banco.crear_cuenta("1", numero)
+            await banco.depositar(numero, 100)
+        return banco
+
+    return asyncio.run(crear())
+
+
+def retener(lock, liberar: threading.Event) -> threading.Thread:
+    """Tomar `lock` en otro hilo hasta que se active `liberar`"""
+    tomado = threading.Event()
+
+    def retener():
+        with lock:
+            tomado.set()
+            liberar.wait(5)
+
+    hilo = threading.Thread(target=retener)
+    hilo.start()
+    tomado.wait(5)
+    return hilo
+
+
+@pytest.mark.parametrize('operacion', ['depositar', 'retirar', 'crear_cuenta'])
+def test_lock_ocupado_no_bloquea_el_loop(banco, operacion):
+    cuenta = banco.cuentas["0001"]
+    lock = banco._lock if operacion == 'crear_cuenta' else cuenta._lock
+
+    async def escenario():
+        liberar = threading.Event()
+        hilo = retener(lock, liberar)
+        if operacion == 'crear_cuenta':
+            tarea = asyncio.create_task(banco.crear_cuenta("1", "0003"))
+        else:
+            tarea = asyncio.create_task(getattr(banco, operacion)("0001", 10))
+
+        # Mientras otro hilo tiene el lock, el loop sigue atendiendo otras tareas
+        vueltas = 0
+        for _ in range(20):
+            await asyncio.sleep(0.001)
+            vueltas += 1
+        assert vueltas == 20 and not tarea.done()
+
+        liberar.set()
+        await asyncio.to_thread(hilo.join)
+        await tarea
+
+    asyncio.run(escenario())
+    assert cuenta.saldo == {'depositar': 110, 'retirar': 90, 'crear_cuenta': 100}[operacion]
+
+
+def test_transferencias_concurrentes(banco):
+    async def escenario():
+        await asyncio.gather(*(banco.transferir("0001", "0002", 1) for _ in range(50)),
+                             *(banco.transferir("0002", "0001", 2) for _ in range(20)))
+
+    asyncio.run(escenario())
+    assert banco.cuentas["0001"].saldo == 90
+    assert banco.cuentas["0002"].saldo == 110
@@ -0,0 +1,61 @@
+import json
+import threading
+
+from app.audit_writer import AuditWriter
+
+
+class Servicio:
+    """Servicio mínimo: guarda en memoria lo que el escritor confirma"""
+
+    def __init__(self, db_path, fallar_en=None):
+        self.DB_PATH = db_path
+        self.filas = []
+        self.inserciones = 0
+        self.fallar_en = fallar_en
+
+    def _encode_record(self, record):
+        return tuple(record)
+
+    def _write_records(self, records, log_each=True):
+        self._insert_rows([self._encode_record(r) for r in records])
+
+    def _insert_rows(self, rows):
+        self.inserciones += 1
+        if self.inserciones == self.fallar_en:
+            raise OSError("disco lleno")
+        self.filas.extend(rows)
+
+
+def _derramar(ruta, n):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for i in range(n):
+            f.write(json.dumps([i] * 13) + '\n')
+
+
+def test_reingreso_parcial_no_duplica(tmp_path):
+    servicio = Servicio(str(tmp_path / "audit.db"), fallar_en=3)
+    _derramar(servicio.DB_PATH + ".spill.jsonl", 10)
+
+    # Lotes de 3: el tercero falla al arrancar y el reingreso del flush
+    # retoma después de los dos lotes ya confirmados
+    writer = AuditWriter(servicio, batch_size=3)
+    writer.flush(5)
+    writer.close(5)
+    assert sorted(f[0] for f in servicio.filas) == list(range(10))
+    assert writer.stats()['written'] == 10
+    assert writer.stats()['errors'] == 1
+    assert not list(tmp_path.glob("*.ingesting*"))
+
+
+def test_block_no_espera_si_el_escritor_murio(tmp_path):
+    servicio = Servicio(str(tmp_path / "audit.db"))
+    writer = AuditWriter(servicio, max_queue=1)
+    writer.close(5)
+    writer._closed = False
+
+    writer.submit(('a',) * 13)
+    hecho = threading.Event()
+    hilo = threading.Thread(target=lambda: (writer.submit(('b',) * 13), hecho.set()))
+    hilo.start()
+    assert hecho.wait(5)
+    assert writer.stats()['spilled'] == 1
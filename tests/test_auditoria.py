@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+from app.audit_codec import BinaryCodec, JsonCodec, decode_columns
+from app.audit_service import AuditRecord, AuditService
+
+REGISTRO = dict(operation_type="deposito", entity_type="Cuenta", entity_id="0001",
+                estado_antes={'saldo': 100}, estado_despues={'saldo': 150},
+                usuario="sistema", status="SUCCESS", args=(50,), kwargs={'contraparte': None})
+
+
+@pytest.fixture(params=[JsonCodec(), BinaryCodec(), BinaryCodec(compress_min=1)],
+                ids=['json', 'binary', 'binary_zlib'])
+def codec(request, entorno, monkeypatch):
+    monkeypatch.setattr(AuditService, "PAYLOAD_CODEC", request.param)
+    monkeypatch.setattr(AuditService, "ASYNC_WRITES", False)
+    return request.param
+
+
+def test_codec_por_defecto_es_json():
+    assert isinstance(AuditService.PAYLOAD_CODEC, JsonCodec)
+
+
+def test_ida_y_vuelta(codec):
+    AuditService.log_change(**REGISTRO)
+    AuditService.log_change(**dict(REGISTRO, estado_despues={'saldo': Decimal("150.50")}))
+    exacto, registro = AuditService.get_audit_history()
+    assert registro.estado_antes == {'saldo': 100}
+    assert registro.estado_despues == {'saldo': 150}
+    assert registro.campos_modificados == {'saldo': {'antes': 100, 'despues': 150}}
+    assert registro.args == [50]
+    assert registro.kwargs == {'contraparte': None}
+    assert exacto.estado_despues == {'saldo': "150.50"}
+
+
+def test_blob_no_depende_de_marshal():
+    columnas = BinaryCodec().encode({'a': 1}, {'a': 2}, None, (1,), {},
+                                    AuditService._get_modified_fields)
+    blob = columnas[5]
+    assert blob[0] >> 4 == 2
+    assert blob[1:].decode('utf-8').startswith('[')
+
+
+def test_version_desconocida_es_error():
+    blob = bytes((0x10 | 0x04,)) + b'[{"a":1},{"a":2},null,[1],null]'
+    with pytest.raises(ValueError, match="Versión de payload"):
+        decode_columns((None, None, None, None, None, blob), AuditService._get_modified_fields)
+
+
+def test_registro_se_comporta_como_tupla(codec):
+    AuditService.log_change(**REGISTRO)
+    registro = AuditService.get_audit_history()[0]
+    (id_, timestamp, operation_type, entity_type, entity_id, usuario,
+     estado_antes, estado_despues, campos, status, error, args, kwargs) = registro
+    assert len(registro) == len(AuditRecord._fields) == 13
+    assert registro[2] == operation_type == "deposito"
+    assert registro[-1] == kwargs == {'contraparte': None}
+    assert registro[6:8] == ({'saldo': 100}, {'saldo': 150})
+    assert registro == tuple(registro)
+    assert registro._asdict()['status'] == status == "SUCCESS"
+
+
+def test_reconstruir_resumen_corrige_contadores(entorno):
+    for _ in range(3):
+        AuditService.log_change("deposito", "Cuenta", "0001", {}, {}, "sistema", "SUCCESS")
+    AuditService.flush()
+    conn = AuditService._get_connection()
+    with conn:
+        conn.execute("UPDATE audit_summary SET count = 1")
+
+    diferencias = AuditService.rebuild_audit_summary()
+    assert [(d[0], d[1], d[3], d[4]) for d in diferencias] == [("deposito", "SUCCESS", 1, 3)]
+    assert AuditService.rebuild_audit_summary() == []
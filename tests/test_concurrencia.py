@@ -0,0 +1,90 @@
+import random
+import threading
+
+import pytest
+
+from app.banco import Banco
+
+CUENTAS = 20
+HILOS = 8
+TRANSFERENCIAS = 400
+
+
+@pytest.fixture
+def banco(entorno):
+    banco = Banco()
+    for i in range(CUENTAS):
+        banco.crear_cliente(f"Cliente {i}", str(i))
+        banco.crear_cuenta(str(i), f"{i:04d}").depositar(100)
+    return banco
+
+
+def concurrentes(trabajo):
+    errores = []
+
+    def correr(indice):
+        try:
+            trabajo(random.Random(indice))
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=correr, args=(i,)) for i in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores
+
+
+def test_transferencias_conservan_el_dinero(banco):
+    numeros = list(banco.cuentas)
+
+    def trabajo(rng):
+        for _ in range(TRANSFERENCIAS // HILOS):
+            origen, destino = rng.sample(numeros, 2)
+            try:
+                # Montos grandes para que muchas fallen por fondos insuficientes
+                banco.transferir(origen, destino, rng.randint(1, 80))
+            except ValueError:
+                pass
+
+    concurrentes(trabajo)
+    assert sum(c.saldo for c in banco.cuentas.values()) == 100 * CUENTAS
+    assert all(c.saldo >= 0 for c in banco.cuentas.values())
+
+
+def test_lotes_y_transferencias_concurrentes(banco):
+    numeros = list(banco.cuentas)
+
+    def trabajo(rng):
+        for _ in range(TRANSFERENCIAS // HILOS // 4):
+            lote = [tuple(rng.sample(numeros, 2)) + (rng.randint(1, 40),) for _ in range(4)]
+            banco.transferir_lote(lote, atomico=False)
+            origen, destino = rng.sample(numeros, 2)
+            try:
+                banco.transferir(origen, destino, rng.randint(1, 40))
+            except ValueError:
+                pass
+
+    concurrentes(trabajo)
+    assert sum(c.saldo for c in banco.cuentas.values()) == 100 * CUENTAS
+    assert all(c.saldo >= 0 for c in banco.cuentas.values())
+
+
+def test_cuentas_nuevas_durante_transferencias(banco):
+    numeros = list(banco.cuentas)
+
+    def trabajo(rng):
+        for i in range(TRANSFERENCIAS // HILOS):
+            if i % 10 == 0:
+                identificacion = f"n{rng.random()}"
+                banco.crear_cliente("Nuevo", identificacion)
+                banco.crear_cuenta(identificacion, identificacion)
+            origen, destino = rng.sample(numeros, 2)
+            try:
+                banco.transferir(origen, destino, rng.randint(1, 40))
+            except ValueError:
+                pass
+
+    concurrentes(trabajo)
+    assert sum(c.saldo for c in banco.cuentas.values()) == 100 * CUENTAS
@@ -0,0 +1,19 @@
+from decimal import Decimal
+
+from app.email_digest import Digest
+
+
+def test_total_incluye_montos_decimal():
+    digest = Digest("cliente@prueba", "transferencia", {}, 0.0)
+    for monto in (Decimal("10.10"), Decimal("0.20"), 'N/A', True):
+        digest.add({'monto': monto, 'cuenta_destino': "0002"})
+    assert digest.total_monto == Decimal("10.30")
+    assert digest.count == 4
+    assert digest.destinos == ["0002"]
+
+
+def test_total_con_montos_float():
+    digest = Digest("cliente@prueba", "transferencia", {}, 0.0)
+    digest.add({'monto': 1.5})
+    digest.add({'monto': 2})
+    assert digest.total_monto == 3.5
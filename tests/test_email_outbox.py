@@ -0,0 +1,169 @@
+import socketserver
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.email_outbox import EmailOutbox, SMTPTransport
+
+
+class _Sesion(socketserver.StreamRequestHandler):
+    """Lo mínimo de SMTP que usa smtplib sin TLS ni login"""
+
+    def _responder(self, linea: str):
+        self.wfile.write(linea.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.conexiones += 1
+        self._responder("220 prueba")
+        destino = None
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode('ascii').strip().upper()
+            if comando.startswith(("EHLO", "HELO")):
+                self._responder("250 prueba")
+            elif comando.startswith("RCPT TO:"):
+                destino = linea.decode('ascii').strip()[8:].strip("<> ")
+                self._responder("250 OK")
+            elif comando == "DATA":
+                self._responder("354 fin con .")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(servidor.demora)
+                with servidor.lock:
+                    servidor.recibidos.append(destino)
+                self._responder("250 OK")
+            elif comando == "QUIT":
+                self._responder("221 chau")
+                return
+            else:
+                self._responder("250 OK")
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, demora: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Sesion)
+        self.demora = demora
+        self.lock = threading.Lock()
+        self.conexiones = 0
+        self.recibidos = []
+
+
+@pytest.fixture
+def smtp():
+    def crear(demora=0.0):
+        servidor = ServidorSMTP(demora)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        return servidor
+
+    servidores = []
+    yield crear
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def _outbox(tmp_path, servidor, **opciones):
+    host, puerto = servidor.server_address
+    transporte = lambda: SMTPTransport(host, puerto, "banco@prueba", use_tls=False, timeout=5)
+    return EmailOutbox(str(tmp_path / "outbox.db"), transporte, **opciones)
+
+
+def test_entrega_reutilizando_conexiones(tmp_path, smtp):
+    servidor = smtp()
+    outbox = _outbox(tmp_path, servidor, workers=2)
+    outbox.start()
+    for i in range(20):
+        outbox.enqueue(f"cliente{i}@prueba", "Asunto", "Cuerpo")
+    assert outbox.flush(10)
+    outbox.close()
+
+    assert sorted(servidor.recibidos) == sorted(f"cliente{i}@prueba" for i in range(20))
+    # Una sesión por worker, no una por mensaje
+    assert servidor.conexiones <= 2
+    assert outbox.metrics()['sent'] == 20
+
+
+def test_relay_lento_no_demora_el_encolado(tmp_path, smtp):
+    servidor = smtp(demora=0.2)
+    outbox = _outbox(tmp_path, servidor, workers=1)
+    outbox.start()
+
+    inicio = time.perf_counter()
+    for i in range(10):
+        outbox.enqueue(f"cliente{i}@prueba", "Asunto", "Cuerpo")
+    assert time.perf_counter() - inicio < 0.1
+    outbox.close(timeout=0.1)
+
+
+def test_pendientes_sobreviven_reinicio(tmp_path, smtp):
+    caido = smtp()
+    host, puerto = caido.server_address
+    caido.shutdown()
+    caido.server_close()
+
+    # Sin servidor: el envío falla y queda pendiente en la base
+    transporte = lambda: SMTPTransport(host, puerto, "banco@prueba", use_tls=False, timeout=1)
+    outbox = EmailOutbox(str(tmp_path / "outbox.db"), transporte, workers=1,
+                         backoff_base=0.01, max_attempts=100)
+    outbox.start()
+    outbox.enqueue("cliente@prueba", "Asunto", "Cuerpo")
+    outbox.close(timeout=0.2)
+
+    servidor = smtp()
+    outbox = _outbox(tmp_path, servidor, workers=1)
+    outbox.start()
+    assert outbox.flush(10)
+    outbox.close()
+    assert servidor.recibidos == ["cliente@prueba"]
+
+
+class _Transporte:
+    def __init__(self, enviados):
+        self.enviados = enviados
+
+    def send(self, to_email, subject, body):
+        self.enviados.append(to_email)
+
+    def close(self):
+        pass
+
+
+def _fallar_una_vez(outbox, nombre):
+    original = getattr(outbox, nombre)
+    fallas = []
+
+    def envoltura(*args):
+        if not fallas:
+            fallas.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return original(*args)
+
+    setattr(outbox, nombre, envoltura)
+    return fallas
+
+
+@pytest.mark.parametrize('metodo', ('_deliver', '_claim'))
+def test_hilos_sobreviven_errores_de_la_base(tmp_path, metodo):
+    enviados = []
+    outbox = EmailOutbox(str(tmp_path / "outbox.db"), lambda: _Transporte(enviados),
+                         workers=1, poll_interval=0.05)
+    fallas = _fallar_una_vez(outbox, metodo)
+    outbox.start()
+    outbox.enqueue("uno@prueba", "Asunto", "Cuerpo")
+    time.sleep(0.2)
+    outbox.enqueue("dos@prueba", "Asunto", "Cuerpo")
+    time.sleep(0.2)
+    outbox.close(timeout=1)
+
+    assert fallas == [1]
+    assert "dos@prueba" in enviados
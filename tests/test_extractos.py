@@ -0,0 +1,63 @@
+import logging
+import time
+
+from app.banco import Banco
+from app.extractos import generar_extractos
+from app.persistencia import BancoStore
+
+
+def _banco(numeros):
+    banco = Banco()
+    banco._crear_cliente("Cliente", "1")
+    for numero in numeros:
+        banco._crear_cuenta("1", numero)._aplicar_movimiento('deposito', 100)
+    return banco
+
+
+def test_reanudar_genera_cuentas_agregadas_a_un_lote_terminado(entorno):
+    directorio = entorno / "extractos"
+    banco = _banco(["0001", "0003", "0005", "0007"])
+    resultado = generar_extractos(banco, str(directorio), procesos=1, cuentas_por_lote=2)
+    assert resultado['lotes'] == 2
+
+    # 0002 cae en el rango del primer lote, que ya tiene su marca
+    banco._crear_cuenta("1", "0002")._aplicar_movimiento('deposito', 50)
+    resultado = generar_extractos(banco, str(directorio), procesos=1, cuentas_por_lote=2)
+
+    assert resultado['lotes'] == 1
+    assert resultado['lotes_previos'] == 1
+    assert (directorio / "lote-00000" / "0002.txt").exists()
+
+
+def test_banco_nuevo_tiene_el_periodo_completo(entorno):
+    banco = _banco(["0001"])
+    resultado = generar_extractos(banco, str(entorno / "extractos"), procesos=1)
+    assert resultado['incompleto'] is False
+    texto = (entorno / "extractos" / "lote-00000" / "0001.txt").read_text(encoding='utf-8')
+    assert "Período: - a -" in texto
+    assert "Movimientos: 1" in texto
+
+
+def test_banco_cargado_avisa_que_faltan_movimientos(entorno, caplog):
+    directorio = str(entorno / "data")
+    store = BancoStore(directorio)
+    banco = Banco()
+    store.adjuntar(banco)
+    banco.crear_cliente("Cliente", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    store.cerrar()
+
+    store = BancoStore(directorio)
+    cargado = store.cargar()
+    cargado.cuentas["0001"].depositar(5)
+    with caplog.at_level(logging.WARNING, logger="app.extractos"):
+        resultado = generar_extractos(cargado, str(entorno / "extractos"), procesos=1,
+                                      desde=time.time() - 3600)
+    store.cerrar()
+
+    assert resultado['incompleto'] is True
+    assert "El libro tiene movimientos desde" in caplog.text
+    texto = (entorno / "extractos" / "lote-00000" / "0001.txt").read_text(encoding='utf-8')
+    inicio = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cargado.ledger.inicio))
+    assert f"Período: {inicio} a -" in texto
+    assert "Saldo inicial: 100.00" in texto
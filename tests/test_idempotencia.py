@@ -0,0 +1,85 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from app.idempotencia import IdempotencyService
+
+
+def test_resultado_conserva_tipos_tras_reinicio(entorno):
+    resultado = {'saldo': Decimal('10.50'), 'cuentas': ('0001', '0002'), 'ok': True}
+    assert IdempotencyService.ejecutar("k1", "op", "h", lambda: resultado) == resultado
+
+    # Reinicio: sin caché en memoria ni conexiones abiertas
+    IdempotencyService.close()
+    IdempotencyService.clear()
+    repetido = IdempotencyService.ejecutar("k1", "op", "h", lambda: None)
+    assert repetido == resultado
+    assert isinstance(repetido['saldo'], Decimal)
+    assert isinstance(repetido['cuentas'], tuple)
+
+
+def _banco():
+    from app.banco import Banco
+
+    banco = Banco()
+    banco.crear_cliente("Ana", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    banco.crear_cuenta("1", "0002")
+    return banco
+
+
+def test_reintento_no_mueve_dinero_dos_veces(entorno):
+    banco = _banco()
+    banco.transferir("0001", "0002", 30, idempotency_key="pago-1")
+    banco.transferir("0001", "0002", 30, idempotency_key="pago-1")
+
+    # También después de perder el caché en memoria
+    IdempotencyService.clear()
+    banco.transferir("0001", "0002", 30, idempotency_key="pago-1")
+    assert banco.cuentas["0001"].saldo == 70
+    assert banco.cuentas["0002"].saldo == 30
+
+
+def test_error_se_repite_sin_reejecutar(entorno):
+    banco = _banco()
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Fondos insuficientes"):
+            banco.cuentas["0001"].retirar(500, idempotency_key="retiro-1")
+    # Aunque ahora alcance, la clave ya tiene su resultado
+    banco.cuentas["0001"].depositar(1000)
+    with pytest.raises(ValueError, match="Fondos insuficientes"):
+        banco.cuentas["0001"].retirar(500, idempotency_key="retiro-1")
+    assert banco.cuentas["0001"].saldo == 1100
+
+
+def test_clave_con_otros_argumentos_se_rechaza(entorno):
+    banco = _banco()
+    banco.cuentas["0001"].depositar(10, idempotency_key="dep-1")
+    with pytest.raises(ValueError, match="otra operación"):
+        banco.cuentas["0001"].depositar(20, idempotency_key="dep-1")
+    assert banco.cuentas["0001"].saldo == 110
+
+
+def test_duplicados_concurrentes_se_ejecutan_una_vez(entorno):
+    ejecuciones = []
+    liberar = threading.Event()
+
+    def operacion():
+        ejecuciones.append(1)
+        liberar.wait(5)
+        return "hecho"
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(
+        IdempotencyService.ejecutar("k-concurrente", "op", "h", operacion))) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.05)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert ejecuciones == [1]
+    assert resultados == ["hecho"] * 8
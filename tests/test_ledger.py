@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import pytest
+
+from app.cuenta import Cuenta
+from app.transaccion import Ledger
+
+
+def test_fecha_explicita_anterior_falla():
+    ledger = Ledger()
+    ledger.registrar('deposito', '0001', 10.0, fecha=2000.0, saldo=10.0)
+    with pytest.raises(ValueError):
+        ledger.registrar('deposito', '0001', 10.0, fecha=1000.0, saldo=20.0)
+    assert len(ledger) == 1
+    assert ledger.registrar('deposito', '0001', 10.0, fecha=2000.0, saldo=20.0) == 1
+
+
+def test_cuentas_sueltas_no_comparten_libro(entorno):
+    a, b = Cuenta("0001", 100), Cuenta("0002", 100)
+    a.depositar(10)
+    assert len(list(a.movimientos())) == 1
+    assert list(b.movimientos()) == []
+
+
+def test_transferencia_con_contraparte_falsa(entorno):
+    cuenta = Cuenta("0001", 100)
+    cuenta.depositar(10, contraparte=0)
+    assert next(cuenta.movimientos()).tipo == 'transferencia'
+
+
+def test_saldos_decimal_sin_error_de_float(entorno):
+    # 2**53 centavos no se representan exactos en un float
+    cuenta = Cuenta("0001", Decimal("90071992547409.91"))
+    cuenta.depositar(Decimal("0.01"))
+    movimiento = next(cuenta.movimientos())
+    assert movimiento.monto == Decimal("0.01")
+    linea = cuenta.estado_de_cuenta()[0]
+    assert linea.split()[-2:] == ["+0.01", "90071992547409.92"]
+
+
+def test_montos_se_redondean_al_centavo():
+    ledger = Ledger()
+    ledger.registrar('deposito', '0001', 0.1 + 0.2, saldo=0.1 + 0.2)
+    ledger.registrar('retiro', '0001', Decimal("-0.105"), saldo=Decimal("0.195"))
+    saldo_inicial, _, montos, saldos, _, _ = ledger.columnas('0001')
+    assert saldo_inicial == 0
+    assert list(montos) == [30, -10]
+    assert list(saldos) == [30, 20]
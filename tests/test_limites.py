@@ -0,0 +1,74 @@
+import pytest
+
+from app.banco import Banco
+from app.limites import LimiteExcedido, LimitesVelocidad, Regla
+
+
+@pytest.fixture
+def banco(entorno):
+    banco = Banco()
+    banco.crear_cliente("Cliente", "1")
+    for numero in ("0001", "0002"):
+        banco.crear_cuenta("1", numero).depositar(1000)
+    return banco
+
+
+def test_ventana_deslizante():
+    limites = LimitesVelocidad([Regla('cuenta', 60, max_operaciones=2)], buckets=6)
+    limites.consumir('retiro', "0001", 10, ahora=1000)
+    limites.consumir('retiro', "0001", 10, ahora=1010)
+    with pytest.raises(LimiteExcedido):
+        limites.consumir('retiro', "0001", 10, ahora=1020)
+    # Otra cuenta tiene su propia ventana
+    limites.consumir('retiro', "0002", 10, ahora=1020)
+    # Pasada la ventana el primer retiro deja de contar
+    limites.consumir('retiro', "0001", 10, ahora=1065)
+
+
+def test_limite_por_monto_y_cliente(banco):
+    LimitesVelocidad([Regla('cliente', 3600, max_monto=300)]).adjuntar(banco, reconstruir=False)
+    banco.cuentas["0001"].retirar(200)
+    with pytest.raises(LimiteExcedido):
+        banco.cuentas["0002"].retirar(150)
+    assert banco.cuentas["0002"].saldo == 1000
+
+
+def test_fallo_despues_de_consumir_devuelve_el_limite(banco, monkeypatch):
+    limites = LimitesVelocidad([Regla('cuenta', 60, max_operaciones=1)])
+    limites.adjuntar(banco, reconstruir=False)
+    cuenta = banco.cuentas["0001"]
+
+    def fallar(*args, **kwargs):
+        raise RuntimeError("libro no disponible")
+
+    with monkeypatch.context() as m:
+        m.setattr(cuenta, "_aplicar_movimiento", fallar)
+        with pytest.raises(RuntimeError):
+            cuenta.retirar(10)
+
+    cuenta.retirar(10)
+    assert cuenta.saldo == 990
+
+
+def test_limite_excedido_no_queda_en_la_clave(banco):
+    limites = LimitesVelocidad([Regla('cuenta', 60, max_operaciones=1)])
+    limites.adjuntar(banco, reconstruir=False)
+    banco.transferir("0001", "0002", 10)
+    with pytest.raises(LimiteExcedido):
+        banco.transferir("0001", "0002", 10, idempotency_key="pago-1")
+
+    # Al liberarse la ventana, el reintento con la misma clave se ejecuta
+    limites.reglas = [Regla('cuenta', 60, max_operaciones=5)]
+    banco.transferir("0001", "0002", 10, idempotency_key="pago-1")
+    banco.transferir("0001", "0002", 10, idempotency_key="pago-1")
+    assert banco.cuentas["0001"].saldo == 980
+
+
+def test_reconstruir_desde_auditoria(banco):
+    banco.cuentas["0001"].retirar(100)
+    banco.transferir("0001", "0002", 50)
+    limites = LimitesVelocidad([Regla('cuenta', 3600, max_monto=200)])
+    limites.adjuntar(banco)
+    with pytest.raises(LimiteExcedido):
+        banco.cuentas["0001"].retirar(60)
+    banco.cuentas["0001"].retirar(50)
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+import pytest
+
+from app.banco import Banco
+
+
+@pytest.fixture
+def banco(entorno):
+    banco = Banco()
+    banco.crear_cliente("Cliente", "1")
+    for numero in ("0001", "0002"):
+        banco.crear_cuenta("1", numero).depositar(100)
+    return banco
+
+
+@pytest.mark.parametrize('monto', [float('nan'), float('inf'), -5, 0, True, "10",
+                                   Decimal('NaN'), Decimal('Infinity')])
+def test_montos_invalidos(banco, monto):
+    resultados = banco.transferir_lote([("0001", "0002", monto)], atomico=False)
+    assert resultados[0]['status'] == 'ERROR'
+    assert resultados[0]['error'].startswith("Monto inválido")
+    assert banco.cuentas["0001"].saldo == 100
+
+
+def test_lote_atomico_rechaza_todo(banco):
+    with pytest.raises(ValueError):
+        banco.transferir_lote([("0001", "0002", 50), ("0002", "0001", float('nan'))])
+    assert banco.cuentas["0001"].saldo == 100
+    assert banco.cuentas["0002"].saldo == 100
+
+
+def test_lote_usa_fondos_recibidos(banco):
+    resultados = banco.transferir_lote([("0001", "0002", 100), ("0002", "0001", 150)])
+    assert [r['status'] for r in resultados] == ['SUCCESS', 'SUCCESS']
+    assert banco.cuentas["0001"].saldo == 150
+    assert banco.cuentas["0002"].saldo == 50
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from app.audit_service import AuditService
+
+
+@pytest.fixture
+def particionada(entorno, monkeypatch):
+    monkeypatch.setattr(AuditService, "PARTITION", "month")
+    monkeypatch.setattr(AuditService, "ARCHIVE_AFTER", None)
+    monkeypatch.setattr(AuditService, "ASYNC_WRITES", False)
+    return entorno
+
+
+def registrar(timestamp: str, cuenta: str = "0001", cantidad: int = 1):
+    AuditService.log_batch([
+        (timestamp,) + AuditService.make_record(
+            "deposito", "Cuenta", cuenta, {'saldo': i}, {'saldo': i + 1},
+            "sistema", "SUCCESS", args=(1,), kwargs={})[1:]
+        for i in range(cantidad)])
+
+
+def test_registros_por_particion(particionada):
+    registrar("2020-01-15T10:00:00", cantidad=3)
+    registrar("2020-02-15T10:00:00", cantidad=2)
+
+    nombres = sorted(os.listdir(particionada))
+    assert "audit_log.2020-01.db" in nombres and "audit_log.2020-02.db" in nombres
+    assert len(AuditService.get_audit_history(entity_id="0001")) == 5
+    # Solo se recorre la partición del rango pedido
+    assert len(AuditService.get_audit_history(since="2020-02-01", until="2020-03-01")) == 2
+
+
+def test_archivo_y_registros_tardios(particionada):
+    registrar("2020-01-15T10:00:00", cantidad=5)
+    assert AuditService.archive_partitions(conservar=1)
+    assert os.path.exists(particionada / "audit_log.2020-01.db.gz")
+    assert not os.path.exists(particionada / "audit_log.2020-01.db")
+    assert len(AuditService.get_audit_history()) == 5
+
+    # Un registro tardío del período archivado se lee junto al archivo...
+    registrar("2020-01-20T10:00:00")
+    assert len(AuditService.get_audit_history()) == 6
+
+    # ...y al volver a archivar se fusiona en él en lugar de reemplazarlo
+    assert AuditService.archive_partitions(conservar=1)
+    assert not os.path.exists(particionada / "audit_log.2020-01.db")
+    historial = AuditService.get_audit_history()
+    assert len(historial) == 6
+    assert historial[0].timestamp == "2020-01-20T10:00:00"
+    assert AuditService.get_audit_summary()['total_operations'] == 6
+
+
+def test_archivo_no_crea_bases_vacias(particionada):
+    registrar("2020-01-15T10:00:00", cantidad=2)
+    # Un lector en curso impide archivar la partición, sin perder nada
+    conexiones = AuditService._connections("2020-01-01", "2020-02-01")
+    cursor = next(conexiones).execute("SELECT id FROM audit_log")
+    cursor.fetchone()
+    assert AuditService.archive_partitions(conservar=1) == []
+    cursor.close()
+    conexiones.close()
+
+    assert AuditService.archive_partitions(conservar=1)
+    assert len(AuditService.get_audit_history(since="2020-01-01", until="2020-02-01")) == 2
+    assert not os.path.exists(particionada / "audit_log.2020-01.db")
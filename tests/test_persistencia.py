@@ -0,0 +1,135 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from app.banco import Banco
+from app.persistencia import BancoStore, WriteAheadLog
+
+
+@pytest.fixture
+def directorio(entorno):
+    return str(entorno / "data")
+
+
+def nuevo_banco(directorio, **opciones):
+    store = BancoStore(directorio, **opciones)
+    banco = Banco()
+    store.adjuntar(banco)
+    banco.crear_cliente("Cliente", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    banco.crear_cuenta("1", "0002").depositar(Decimal("50.25"))
+    return store, banco
+
+
+def test_reaplica_el_wal(directorio):
+    store, banco = nuevo_banco(directorio)
+    banco.transferir("0001", "0002", 30)
+    banco.cuentas["0001"].retirar(20)
+    store.cerrar()
+
+    store = BancoStore(directorio)
+    cargado = store.cargar()
+    assert cargado.cuentas["0001"].saldo == 50
+    assert cargado.cuentas["0002"].saldo == Decimal("80.25")
+    assert [c.numero_cuenta for c in cargado.clientes["1"].cuentas] == ["0001", "0002"]
+    store.cerrar()
+
+
+def test_snapshot_y_compactacion(directorio):
+    store, banco = nuevo_banco(directorio)
+    banco.transferir("0001", "0002", 10)
+    store.snapshot()
+    banco.cuentas["0001"].depositar(5)
+    store.cerrar()
+
+    assert len([n for n in os.listdir(directorio) if n.startswith("snapshot-")]) == 1
+    store = BancoStore(directorio)
+    cargado = store.cargar()
+    assert cargado.cuentas["0001"].saldo == 95
+    assert cargado.cuentas["0002"].saldo == Decimal("60.25")
+    store.cerrar()
+
+
+def test_snapshot_incluye_cuentas_sin_cliente(directorio):
+    store, banco = nuevo_banco(directorio)
+    suelta = banco._nueva_cuenta("0003", 7)
+    banco.cuentas["0003"] = suelta
+    store.snapshot()
+    store.cerrar()
+
+    store = BancoStore(directorio)
+    assert store.cargar().cuentas["0003"].saldo == 7
+    store.cerrar()
+
+
+def test_escritura_anticipada(directorio, monkeypatch):
+    store, banco = nuevo_banco(directorio)
+
+    def fallar(*args):
+        raise OSError("disco lleno")
+
+    with monkeypatch.context() as m:
+        m.setattr(store.wal, "append", fallar)
+        with pytest.raises(OSError):
+            banco.cuentas["0001"].depositar(10)
+    # Sin registro en el WAL el saldo no cambia
+    assert banco.cuentas["0001"].saldo == 100
+    store.cerrar()
+
+
+def test_transferencia_no_persistida_no_cambia_saldos(directorio, monkeypatch):
+    store, banco = nuevo_banco(directorio)
+
+    def fallar(*args):
+        raise OSError("disco lleno")
+
+    with monkeypatch.context() as m:
+        m.setattr(store, "_append", fallar)
+        with pytest.raises(OSError):
+            banco.transferir("0001", "0002", 40)
+    assert banco.cuentas["0001"].saldo == 100
+    assert banco.cuentas["0002"].saldo == Decimal("50.25")
+
+    # Y lo que quedó en memoria coincide con lo persistido
+    banco.transferir("0001", "0002", 10)
+    store.cerrar()
+    store = BancoStore(directorio)
+    cargado = store.cargar()
+    assert cargado.cuentas["0001"].saldo == banco.cuentas["0001"].saldo == 90
+    assert cargado.cuentas["0002"].saldo == banco.cuentas["0002"].saldo == Decimal("60.25")
+    store.cerrar()
+
+
+def test_grupo_fallido_no_se_persiste(directorio):
+    store, banco = nuevo_banco(directorio)
+    with pytest.raises(RuntimeError):
+        with banco.ledger.agrupar():
+            banco.cuentas["0001"]._aplicar_movimiento('transferencia', -40, "0002")
+            raise RuntimeError("a mitad de la transferencia")
+    assert banco.cuentas["0001"].saldo == 100
+    store.cerrar()
+
+    store = BancoStore(directorio)
+    assert store.cargar().cuentas["0001"].saldo == 100
+    store.cerrar()
+
+
+def test_cola_corrupta_se_ignora(directorio):
+    store, banco = nuevo_banco(directorio)
+    banco.cuentas["0001"].depositar(1)
+    store.cerrar()
+    _, ultimo = WriteAheadLog(directorio).segmentos()[-1]
+    with open(ultimo, 'ab') as f:
+        f.write(b'\x10\x00\x00\x00basura')
+
+    store = BancoStore(directorio)
+    assert store.cargar().cuentas["0001"].saldo == 101
+    store.cerrar()
+
+
+def test_sync_en_grupo_espera_el_disco(directorio):
+    store, banco = nuevo_banco(directorio)
+    seq = store.wal.append('c', "9", "Otro")
+    assert store.wal._sincronizado >= seq
+    store.cerrar()
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app.audit_service import AuditService
+from app.banco import Banco
+from app.reconstruccion import Reconstructor
+
+
+@pytest.fixture
+def reconstructor(entorno):
+    reconstructor = Reconstructor(str(entorno / "checkpoints.db"))
+    yield reconstructor
+    reconstructor.cerrar()
+
+
+def _instante():
+    time.sleep(0.01)
+    momento = datetime.now()
+    time.sleep(0.01)
+    return momento
+
+
+def test_saldo_en_un_instante_pasado(reconstructor):
+    banco = Banco()
+    banco.crear_cliente("Ana", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    banco.crear_cuenta("1", "0002")
+    antes = _instante()
+    banco.transferir("0001", "0002", 30)
+    banco.cuentas["0001"].retirar(20)
+    AuditService.flush()
+
+    assert reconstructor.saldo_en("0001", antes) == 100
+    assert reconstructor.saldos_en(antes) == {"0001": 100, "0002": 0}
+    assert reconstructor.saldos_en(datetime.now(), ["0001", "0002"], hilos=2) == {
+        "0001": 50, "0002": 30}
+
+
+def test_reconstruir_desde_checkpoint(reconstructor):
+    banco = Banco()
+    banco.crear_cliente("Ana", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    AuditService.flush()
+    reconstructor.checkpoint(banco)
+
+    banco.crear_cuenta("1", "0002").depositar(5)
+    banco.cuentas["0001"].depositar(1)
+    AuditService.flush()
+
+    reconstruido = reconstructor.reconstruir_banco(datetime.now())
+    assert {n: c.saldo for n, c in reconstruido.cuentas.items()} == {"0001": 101, "0002": 5}
+    assert sorted(c.numero_cuenta for c in reconstruido.clientes["1"].cuentas) == ["0001", "0002"]
+
+
+def test_generar_checkpoints_no_cambia_el_resultado(reconstructor):
+    banco = Banco()
+    banco.crear_cliente("Ana", "1")
+    banco.crear_cuenta("1", "0001").depositar(100)
+    medio = _instante()
+    banco.cuentas["0001"].retirar(40)
+    AuditService.flush()
+
+    sin_checkpoints = reconstructor.saldos_en(medio)
+    assert reconstructor.generar_checkpoints() > 0
+    assert reconstructor.saldos_en(medio) == sin_checkpoints == {"0001": 100}
+    assert reconstructor.saldo_en("0001", datetime.now()) == 60
@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from decimal import Decimal
+
+import pytest
+
+from app.sharding import BancoDistribuido, Shard, shard_de
+from app.utils import ConnectionManager
+
+
+@pytest.fixture
+def shard(entorno):
+    (entorno / "shard").mkdir()
+    directorio = str(entorno / "shard")
+    shard = Shard(directorio)
+    shard.ejecutar('crear_cliente', ("Ana", "1"))
+    for numero in ("0001", "0002"):
+        shard.ejecutar('crear_cuenta', ("1", numero))
+    shard.ejecutar('depositar', ("0001", 100))
+    return directorio, shard
+
+
+def _reiniciar(directorio, shard):
+    # Como un proceso nuevo: solo queda lo confirmado en shard.db
+    shard.store.cerrar()
+    return Shard(directorio)
+
+
+def test_preparada_sobrevive_reinicio_y_se_aborta(shard):
+    directorio, shard = shard
+    shard.ejecutar('preparar_debito', ("tx1", "0001", "0002", 30))
+    shard = _reiniciar(directorio, shard)
+
+    assert shard.ejecutar('preparadas', ()) == ["tx1"]
+    assert shard.ejecutar('consultar_saldo', ("0001",)) == 70
+    assert shard.ejecutar('total', ()) == 100
+
+    shard.ejecutar('abortar', ("tx1",))
+    shard.ejecutar('abortar', ("tx1",))
+    assert shard.ejecutar('consultar_saldo', ("0001",)) == 100
+    assert _reiniciar(directorio, shard).ejecutar('preparadas', ()) == []
+
+
+def test_credito_confirmado_una_sola_vez(shard):
+    directorio, shard = shard
+    shard.ejecutar('preparar_credito', ("tx2", "0002", "0009", 25))
+    shard = _reiniciar(directorio, shard)
+
+    shard.ejecutar('confirmar', ("tx2",))
+    shard.ejecutar('confirmar', ("tx2",))
+    shard = _reiniciar(directorio, shard)
+    assert shard.ejecutar('consultar_saldo', ("0002",)) == 25
+    assert shard.ejecutar('preparadas', ()) == []
+
+
+def test_preparacion_fallida_no_deja_rastro(shard):
+    directorio, shard = shard
+    with pytest.raises(ValueError):
+        shard.ejecutar('preparar_debito', ("tx3", "0001", "0002", 500))
+    shard = _reiniciar(directorio, shard)
+    assert shard.ejecutar('preparadas', ()) == []
+    assert shard.ejecutar('consultar_saldo', ("0001",)) == 100
+
+
+def test_fallo_al_guardar_la_preparada_no_toca_la_memoria(shard, monkeypatch):
+    _, shard = shard
+
+    def fallar(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(shard.store, "registrar_preparada", fallar)
+    with pytest.raises(sqlite3.OperationalError):
+        shard.ejecutar('preparar_debito', ("tx4", "0001", "0002", 30))
+    assert shard.ejecutar('consultar_saldo', ("0001",)) == 100
+    assert shard.ejecutar('total', ()) == 100
+
+
+def test_fallo_al_confirmar_no_toca_la_memoria(shard, monkeypatch):
+    _, shard = shard
+    shard.ejecutar('preparar_credito', ("tx5", "0002", "0009", 25))
+
+    def fallar(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(shard.store, "borrar_preparada", fallar)
+    with pytest.raises(sqlite3.OperationalError):
+        shard.ejecutar('confirmar', ("tx5",))
+    assert shard.ejecutar('consultar_saldo', ("0002",)) == 0
+    assert shard.ejecutar('preparadas', ()) == ["tx5"]
+
+
+def test_saldos_decimal_se_guardan_exactos(shard):
+    directorio, shard = shard
+    shard.ejecutar('depositar', ("0002", Decimal("0.10")))
+    shard.ejecutar('depositar', ("0002", Decimal("0.20")))
+    shard.ejecutar('preparar_credito', ("tx6", "0002", "0009", Decimal("1.05")))
+    shard = _reiniciar(directorio, shard)
+
+    assert shard.ejecutar('consultar_saldo', ("0002",)) == Decimal("0.30")
+    shard.ejecutar('confirmar', ("tx6",))
+    assert _reiniciar(directorio, shard).ejecutar('consultar_saldo', ("0002",)) == Decimal("1.35")
+
+
+def _cuentas_en_shards_distintos(shards):
+    numeros = [f"{i:04d}" for i in range(100)]
+    origen = numeros[0]
+    destino = next(n for n in numeros if shard_de(n, shards) != shard_de(origen, shards))
+    return origen, destino
+
+
+def test_shard_caido_resuelve_la_transaccion_en_duda(entorno):
+    banco = BancoDistribuido(shards=2, directorio=str(entorno / "shards"))
+    try:
+        origen, destino = _cuentas_en_shards_distintos(2)
+        banco.crear_cliente("Ana", "1")
+        banco.crear_cuenta("1", origen)
+        banco.crear_cuenta("1", destino)
+        banco.depositar(origen, 100)
+        banco.transferir(origen, destino, 10)
+
+        # Ambos votaron y la decisión quedó registrada, pero el destino
+        # muere antes de recibir la confirmación
+        remoto_origen, remoto_destino = banco._remoto(origen), banco._remoto(destino)
+        banco._ejecutar(remoto_origen, 'preparar_debito', "en-duda", origen, destino, 20)
+        banco._ejecutar(remoto_destino, 'preparar_credito', "en-duda", destino, origen, 20)
+        conn = banco._coordinador.get_connection()
+        with conn:
+            conn.execute("INSERT INTO decisiones VALUES (?, ?, ?, ?)",
+                         ("en-duda", remoto_origen.indice, remoto_destino.indice, time.time()))
+        remoto_destino.matar()
+
+        # La próxima llamada reinicia el shard y confirma en ambos
+        assert banco.consultar_saldo(destino) == 30
+        assert banco.consultar_saldo(origen) == 70
+        assert banco.total() == 100
+        assert conn.execute("SELECT COUNT(*) FROM decisiones").fetchone()[0] == 0
+    finally:
+        banco.cerrar()
+
+
+def test_sin_decision_se_presume_aborto(entorno):
+    banco = BancoDistribuido(shards=2, directorio=str(entorno / "shards"))
+    try:
+        origen, destino = _cuentas_en_shards_distintos(2)
+        banco.crear_cliente("Ana", "1")
+        banco.crear_cuenta("1", origen)
+        banco.crear_cuenta("1", destino)
+        banco.depositar(origen, 100)
+
+        remoto_origen = banco._remoto(origen)
+        banco._ejecutar(remoto_origen, 'preparar_debito', "sin-decision", origen, destino, 40)
+        remoto_origen.matar()
+
+        assert banco.consultar_saldo(origen) == 100
+        assert banco.total() == 100
+    finally:
+        banco.cerrar()
+
+
+class _RemotoFalso:
+    """Shard recién reiniciado: mientras responde 'preparadas' otro hilo prepara"""
+
+    indice = 0
+    vivo = True
+
+    def __init__(self, banco, txid):
+        self.banco = banco
+        self.txid = txid
+        self.llamadas = []
+
+    def llamar(self, metodo, *args):
+        self.llamadas.append((metodo,) + args)
+        resultado = None
+        if metodo == 'preparadas':
+            # Un transferir concurrente reservó el txid y ya preparó aquí
+            with self.banco._en_curso_lock:
+                self.banco._en_curso.add(self.txid)
+            resultado = [self.txid]
+        futuro = Future()
+        futuro.set_result(resultado)
+        return futuro
+
+
+def test_resolucion_no_aborta_una_preparacion_concurrente(entorno):
+    banco = object.__new__(BancoDistribuido)
+    banco.timeout = 5
+    banco._coordinador = ConnectionManager(str(entorno / "coordinador.db"), BancoDistribuido.SCHEMA)
+    banco._en_curso = set()
+    banco._en_curso_lock = threading.Lock()
+    banco._remotos = []
+    remoto = _RemotoFalso(banco, "concurrente")
+    try:
+        banco._resolver_en_duda(remoto)
+    finally:
+        banco._coordinador.close_all()
+    assert remoto.llamadas == [('preparadas',)]